@@ -0,0 +1,94 @@
+"""
+Asignación determinística de grupos A/B.
+
+Cada usuario cae en un bucket ``crc32("<salt>:<user_id>") % 10000`` y los
+buckets se reparten entre los grupos según el split del experimento. Como
+solo depende del ``user_id`` y del salt:
+
+- es una expresión por fila (narrow), sin ``rand()`` ni necesidad de
+  persistir el DataFrame para que la asignación no cambie,
+- da el mismo resultado en cada corrida, partición o modo incremental,
+- puede reproducirse fuera de Spark (dashboard, pandas) con ``assign``.
+
+Cada experimento usa su propio salt, así varios experimentos simultáneos
+asignan de forma independiente.
+"""
+import zlib
+
+BUCKETS = 10000
+
+
+class Experiment:
+    """
+    Experimento A/B con split configurable.
+
+    ``splits`` es una lista de (grupo, proporción) que debe sumar 1.
+    """
+
+    def __init__(self, name, splits, salt=None, column=None):
+        total = sum(weight for _, weight in splits)
+        if abs(total - 1.0) > 1e-9:
+            raise ValueError(f"El split del experimento {name} suma {total}, debe sumar 1")
+        self.name = name
+        self.splits = list(splits)
+        self.salt = salt or name
+        self.column = column or f"ab_{name}"
+
+        # Límite superior (exclusivo) de buckets de cada grupo
+        self.bounds = []
+        cumulative = 0.0
+        for group, weight in self.splits:
+            cumulative += weight
+            self.bounds.append((group, int(round(cumulative * BUCKETS))))
+
+    def bucket(self, user_id):
+        return zlib.crc32(f"{self.salt}:{user_id}".encode("utf-8")) % BUCKETS
+
+    def assign(self, user_id):
+        """
+        Grupo de un usuario (versión Python, idéntica a la de Spark)
+        """
+        bucket = self.bucket(user_id)
+        for group, upper in self.bounds:
+            if bucket < upper:
+                return group
+        return self.bounds[-1][0]
+
+    def spark_column(self, user_col="user_id"):
+        """
+        Expresión de Spark equivalente a ``assign``
+        """
+        from pyspark.sql.functions import col, concat, crc32, lit, pmod, when
+
+        bucket = pmod(
+            crc32(concat(lit(f"{self.salt}:"), col(user_col).cast("string")).cast("binary")),
+            lit(BUCKETS),
+        )
+        expr = None
+        for group, upper in self.bounds[:-1]:
+            expr = when(bucket < upper, group) if expr is None else expr.when(bucket < upper, group)
+        last_group = self.bounds[-1][0]
+        return lit(last_group) if expr is None else expr.otherwise(last_group)
+
+    def describe(self):
+        return ", ".join(f"{group} {weight:.0%}" for group, weight in self.splits)
+
+
+# Experimento principal del onboarding: 5% control, 95% tratamiento
+ONBOARDING_EXPERIMENT = Experiment(
+    "onboarding_v1",
+    [("control", 0.05), ("treatment", 0.95)],
+    column="ab_group",
+)
+
+# Experimentos activos (cada uno agrega su columna al DataFrame)
+EXPERIMENTS = [ONBOARDING_EXPERIMENT]
+
+
+def assign_groups(df, experiments=EXPERIMENTS, user_col="user_id"):
+    """
+    Agrega una columna de grupo por experimento activo
+    """
+    for experiment in experiments:
+        df = df.withColumn(experiment.column, experiment.spark_column(user_col))
+    return df
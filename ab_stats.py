@@ -0,0 +1,167 @@
+"""
+Significancia estadística del experimento A/B.
+
+Trabaja sobre conteos por grupo (usuarios y éxitos por métrica), no sobre
+filas por usuario, y calcula todas las comparaciones tratamiento vs control
+(cada métrica × cada segmento, más el total) de una sola vez con arrays de
+NumPy:
+
+- test z de dos proporciones (varianza combinada) y su p-valor bilateral,
+- intervalo de confianza de Newcombe para la diferencia de tasas (combina
+  los intervalos de Wilson de cada grupo; a diferencia del de Wald no
+  colapsa cuando una tasa es 0 o 1),
+- intervalo bootstrap paramétrico: ``n_resamples`` muestras binomiales por
+  grupo y celda, generadas en una sola llamada a ``rng.binomial``. Las
+  muestras usan la tasa con un éxito y un fracaso agregados (ajuste de
+  Agresti-Caffo): con la tasa observada, un grupo en 0 o 1 daría siempre la
+  misma muestra.
+
+Con el split 5%/95% el grupo control es chico: los intervalos muestran
+cuánto de la diferencia observada puede ser ruido.
+"""
+import numpy as np
+import pandas as pd
+
+# Métrica -> columna de conteo en el rollup / cubo
+METRICS = {
+    'activacion': 'activated_users',
+    'setup': 'setup_users',
+    'habito': 'habit_users',
+    'drop': 'drop_users',
+}
+
+Z_95 = 1.959963984540054
+ALPHA = 0.05
+N_RESAMPLES = 10000
+
+
+def _erfc(x):
+    # Aproximación de Abramowitz y Stegun 7.1.26 (error < 1.5e-7), vectorizada
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * z)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    result = poly * np.exp(-z * z)
+    return np.where(x >= 0, result, 2.0 - result)
+
+
+def two_sided_p_value(z):
+    return _erfc(np.abs(z) / np.sqrt(2.0))
+
+
+def wilson_interval(x, n, z_crit=Z_95):
+    """
+    Intervalo de Wilson (score) de la proporción ``x / n``, sobre arrays.
+    Devuelve (límite inferior, límite superior).
+    """
+    x, n = np.asarray(x, dtype=float), np.asarray(n, dtype=float)
+    z2 = z_crit * z_crit
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = x / n
+        denominator = 1 + z2 / n
+        center = (p + z2 / (2 * n)) / denominator
+        half_width = z_crit / denominator * np.sqrt(p * (1 - p) / n + z2 / (4 * n * n))
+    return center - half_width, center + half_width
+
+
+def two_proportion_test(x_control, n_control, x_treatment, n_treatment, z_crit=Z_95):
+    """
+    Test z de dos proporciones sobre arrays (se hace broadcasting).
+    Devuelve un dict de arrays: tasas, diferencia (tratamiento - control),
+    intervalo de Newcombe (híbrido de Wilson), estadístico z y p-valor.
+    """
+    x_c, n_c = np.asarray(x_control, dtype=float), np.asarray(n_control, dtype=float)
+    x_t, n_t = np.asarray(x_treatment, dtype=float), np.asarray(n_treatment, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_c = x_c / n_c
+        p_t = x_t / n_t
+        diff = p_t - p_c
+
+        pooled = (x_c + x_t) / (n_c + n_t)
+        se_pooled = np.sqrt(pooled * (1 - pooled) * (1 / n_c + 1 / n_t))
+        z = np.where(se_pooled > 0, diff / se_pooled, 0.0)
+
+    # Newcombe (1998), método 10: cada extremo combina la distancia de cada
+    # tasa al extremo de su intervalo de Wilson que la acerca a ese lado
+    low_c, high_c = wilson_interval(x_c, n_c, z_crit)
+    low_t, high_t = wilson_interval(x_t, n_t, z_crit)
+    ci_low = diff - np.sqrt((p_t - low_t) ** 2 + (high_c - p_c) ** 2)
+    ci_high = diff + np.sqrt((high_t - p_t) ** 2 + (p_c - low_c) ** 2)
+
+    return {
+        'control_rate': p_c,
+        'treatment_rate': p_t,
+        'diff': diff,
+        'ci_low': ci_low,
+        'ci_high': ci_high,
+        'z': z,
+        'p_value': two_sided_p_value(z),
+    }
+
+
+def bootstrap_diff_ci(x_control, n_control, x_treatment, n_treatment,
+                      n_resamples=N_RESAMPLES, alpha=ALPHA, seed=0):
+    """
+    Intervalo bootstrap paramétrico de la diferencia de tasas para cada
+    celda: las muestras de cada grupo son binomiales con la tasa ajustada
+    ``(x + 1) / (n + 2)``. Devuelve (límite inferior, límite superior) como
+    arrays.
+    """
+    n_c = np.asarray(n_control, dtype=np.int64)
+    n_t = np.asarray(n_treatment, dtype=np.int64)
+    p_c = (np.asarray(x_control) + 1) / (n_c + 2)
+    p_t = (np.asarray(x_treatment) + 1) / (n_t + 2)
+
+    rng = np.random.default_rng(seed)
+    shape = (n_resamples,) + np.broadcast(n_c, p_c, n_t, p_t).shape
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates_c = rng.binomial(n_c, p_c, size=shape) / n_c
+        rates_t = rng.binomial(n_t, p_t, size=shape) / n_t
+    low, high = np.percentile(rates_t - rates_c, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    return low, high
+
+
+def ab_significance(counts, by=('segment',), control='control', treatment='treatment',
+                    n_resamples=N_RESAMPLES, seed=0):
+    """
+    Comparación tratamiento vs control para cada métrica de ``METRICS``,
+    por cada combinación de ``by`` y en total (``by`` = 'Total').
+
+    ``counts`` tiene ``ab_group``, ``total_users``, las columnas de conteo
+    de ``METRICS`` y las columnas de ``by`` (por ejemplo el rollup o el cubo
+    del dashboard). Devuelve un DataFrame con una fila por (grupo de ``by``,
+    métrica); las tasas y diferencias están en proporciones (0-1).
+    """
+    by = list(by)
+    groups = set(counts['ab_group'])
+    if control not in groups or treatment not in groups:
+        raise ValueError(f"Faltan los grupos {control}/{treatment} en los conteos")
+    value_columns = ['total_users'] + list(METRICS.values())
+    totals = counts.groupby('ab_group', observed=True)[value_columns].sum()
+    per_group = counts.groupby(by + ['ab_group'], observed=True)[value_columns].sum().unstack('ab_group')
+
+    # Una fila por celda: el total primero, después cada combinación de ``by``
+    control_counts = np.vstack([totals.loc[[control]].to_numpy(),
+                                per_group.xs(control, axis=1, level='ab_group')[value_columns].to_numpy()])
+    treatment_counts = np.vstack([totals.loc[[treatment]].to_numpy(),
+                                  per_group.xs(treatment, axis=1, level='ab_group')[value_columns].to_numpy()])
+    labels = ['Total'] + list(per_group.index)
+
+    # Columnas: (celda, métrica); n se repite para cada métrica
+    n_c = np.nan_to_num(control_counts[:, :1]).astype(np.int64)
+    n_t = np.nan_to_num(treatment_counts[:, :1]).astype(np.int64)
+    x_c = np.nan_to_num(control_counts[:, 1:]).astype(np.int64)
+    x_t = np.nan_to_num(treatment_counts[:, 1:]).astype(np.int64)
+
+    result = two_proportion_test(x_c, n_c, x_t, n_t)
+    result['boot_low'], result['boot_high'] = bootstrap_diff_ci(
+        x_c, n_c, x_t, n_t, n_resamples=n_resamples, seed=seed
+    )
+    result['control_users'] = np.broadcast_to(n_c, x_c.shape)
+    result['treatment_users'] = np.broadcast_to(n_t, x_t.shape)
+
+    table = pd.DataFrame({name: values.ravel() for name, values in result.items()})
+    table.insert(0, 'metric', np.tile(list(METRICS), len(labels)))
+    table.insert(0, '/'.join(by), [label for label in labels for _ in METRICS])
+    table['significant'] = table['p_value'] < ALPHA
+    return table
@@ -0,0 +1,119 @@
+"""
+Shuffle de los joins por user_id: Parquet plano vs tablas bucketizadas.
+
+Corre el núcleo del ETL (fechas, A/B, segmento + hábito con ventanas y el
+LEFT JOIN onboarding ⨝ métricas por usuario) dos veces sobre los mismos
+archivos de staging:
+
+- ``parquet``: leyendo los archivos por path (Spark ignora los buckets y
+  cada join/agregación por user_id necesita un Exchange),
+- ``bucketed``: leyendo las tablas registradas por ``staging.load_dataset``
+  (bucket i contra bucket i, sin Exchange).
+
+Para cada variante informa los Exchange del plan ejecutado y el shuffle
+leído/escrito (``StageProfiler``, desde el status store de Spark). Los
+broadcast joins se desactivan: con los volúmenes del repo Spark broadcastearía
+todo y la comparación sería la de los datos a escala.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_bucketed_joins.py
+    FINTECH_DATA_DIR=synthetic/x100 python benchmarks/bench_bucketed_joins.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import col, to_date, when
+
+from ab_assignment import assign_groups
+from habit_engine import compute_user_metrics, habit_window_ranges
+from stage_profiler import StageProfiler
+from staging import BUCKETS, load_dataset, staged_path
+
+ONBOARDING_COLUMNS = ["user_id", "first_login_dt", "week_year", "activacion", "setup", "return"]
+TRANSACTIONS_COLUMNS = ["user_id", "type", "segment", "transaction_date"]
+METRIC_COLUMNS = ["user_id", "segment", "ab_group", "drop", "activacion", "setup", "habito_calc", "week_year"]
+
+
+def load(spark, variant):
+    if variant == "bucketed":
+        return (load_dataset(spark, "onboarding", ONBOARDING_COLUMNS),
+                load_dataset(spark, "transactions", TRANSACTIONS_COLUMNS))
+    return (spark.read.parquet(staged_path("onboarding")).select(*ONBOARDING_COLUMNS),
+            spark.read.parquet(staged_path("transactions")).select(*TRANSACTIONS_COLUMNS))
+
+
+def build_metrics(df_onboarding, df_transactions):
+    """
+    Mismos pasos que el ETL entre la carga y ``user_onboarding_metrics_clean``
+    """
+    df_onboarding = assign_groups(
+        df_onboarding.withColumn("first_login_dt", to_date(col("first_login_dt"), "yyyy-MM-dd"))
+    )
+    df_transactions = df_transactions.withColumn("transaction_dt", col("transaction_date")) \
+        .drop("transaction_date")
+    user_metrics = compute_user_metrics(
+        df_onboarding, df_transactions, date_ranges=habit_window_ranges(df_onboarding)
+    )
+    return df_onboarding.join(user_metrics, on="user_id", how="left") \
+        .filter(col("segment").isNotNull()) \
+        .withColumn("drop", when(col("return") == 0, 1).otherwise(0)) \
+        .select(*METRIC_COLUMNS) \
+        .dropDuplicates(["user_id"])
+
+
+def count_exchanges(df):
+    # Plan físico final (con AQE, el ya re-optimizado después de ejecutar)
+    plan = df._jdf.queryExecution().executedPlan().toString()
+    return plan.count("Exchange hashpartitioning")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shuffle de los joins por user_id con y sin buckets")
+    parser.add_argument("--repeat", type=int, default=3, help="corridas por variante (se reporta la mejor)")
+    args = parser.parse_args()
+
+    spark = SparkSession.builder \
+        .appName("Fintech Bucketed Joins Benchmark") \
+        .config("spark.sql.autoBroadcastJoinThreshold", -1) \
+        .getOrCreate()
+    spark.sparkContext.setLogLevel("WARN")
+
+    # Genera (si hace falta) el staging bucketizado que leen las dos variantes
+    load(spark, "bucketed")
+
+    profiler = StageProfiler(spark)
+    exchanges = {}
+    for variant in ("parquet", "bucketed"):
+        for run in range(args.repeat):
+            df_onboarding, df_transactions = load(spark, variant)
+            # Las ventanas de hábito se calculan fuera de la etapa medida
+            df_metrics = build_metrics(df_onboarding, df_transactions)
+            profiler.start(f"{variant}#{run}")
+            df_metrics.write.format("noop").mode("overwrite").save()
+            profiler.stop()
+            exchanges[variant] = count_exchanges(df_metrics)
+
+    stages = profiler.collect()
+    print(f"\n🪣 Joins por user_id ({BUCKETS} buckets, broadcast desactivado)")
+    print(f"{'variante':<10} {'exchanges':>9} {'shuffle leído':>14} {'shuffle escrito':>16} {'tiempo':>8}")
+    best = {}
+    for variant in ("parquet", "bucketed"):
+        runs = [stages[f"{variant}#{run}"] for run in range(args.repeat)]
+        best[variant] = min(runs, key=lambda entry: entry["wall_s"])
+        entry = best[variant]
+        print(f"{variant:<10} {exchanges[variant]:>9} "
+              f"{entry.get('shuffle_read_bytes', 0) / 1024 ** 2:>11.1f} MB "
+              f"{entry.get('shuffle_write_bytes', 0) / 1024 ** 2:>13.1f} MB "
+              f"{entry['wall_s']:>7.2f}s")
+
+    saved = best["parquet"].get("shuffle_write_bytes", 0) - best["bucketed"].get("shuffle_write_bytes", 0)
+    print(f"\n✅ Shuffle evitado: {saved / 1024 ** 2:.1f} MB por corrida")
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
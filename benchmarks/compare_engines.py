@@ -0,0 +1,138 @@
+"""
+Verificación del motor pandas contra el camino de Spark.
+
+Corre los mismos pasos del ETL (fechas, A/B, segmento + hábito, métricas
+finales y rollup) con los dos motores sobre los mismos CSV
+(``FINTECH_DATA_DIR``, por defecto los del repo) y compara:
+
+- ``user_onboarding_metrics_clean``: el multiconjunto de filas (una por
+  usuario, después de descartar los duplicados de onboarding),
+- el rollup por segmento × grupo A/B × cohorte.
+
+También mide el tiempo de punta a punta de cada motor, incluido el arranque
+de la SparkSession. Termina con código 1 si hay diferencias.
+
+Uso (desde la raíz del repo):
+    python benchmarks/compare_engines.py
+    FINTECH_DATA_DIR=synthetic/x10 python benchmarks/compare_engines.py
+"""
+import math
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas_engine
+from pandas_engine import METRIC_COLUMNS
+
+ONBOARDING_COLUMNS = ["user_id", "first_login_dt", "week_year", "activacion", "setup", "return"]
+TRANSACTIONS_COLUMNS = ["user_id", "transaction_dt", "type", "segment"]
+ROLLUP_COLUMNS = ["segment", "ab_group", "week_year", "total_users", "activated_users",
+                  "setup_users", "habit_users", "drop_users"]
+
+
+def _normalize(value):
+    # NaN/None -> None y numéricos enteros -> int, para comparar tipos de ambos motores
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _rows(records):
+    return Counter(tuple(_normalize(v) for v in row) for row in records)
+
+
+def run_spark():
+    from pyspark.sql import SparkSession
+    from pyspark.sql.functions import col, count, sum as F_sum, to_date, when
+
+    from ab_assignment import assign_groups
+    from habit_engine import compute_user_metrics
+    from staging import load_dataset
+
+    spark = SparkSession.builder.appName("Fintech Engine Check").getOrCreate()
+    df_onboarding = load_dataset(spark, "onboarding", ONBOARDING_COLUMNS)
+    df_transactions = load_dataset(spark, "transactions", TRANSACTIONS_COLUMNS)
+
+    df_onboarding = assign_groups(
+        df_onboarding.withColumn("first_login_dt", to_date(col("first_login_dt"), "yyyy-MM-dd"))
+    )
+    df_transactions = df_transactions.withColumn("transaction_dt", to_date(col("transaction_dt"), "yyyy-MM-dd"))
+    user_metrics = compute_user_metrics(df_onboarding, df_transactions)
+
+    df_metrics = df_onboarding.join(user_metrics, on="user_id", how="left") \
+        .filter(col("segment").isNotNull()) \
+        .withColumn("drop", when(col("return") == 0, 1).otherwise(0)) \
+        .select(*METRIC_COLUMNS, "week_year") \
+        .dropDuplicates(["user_id"]) \
+        .persist()
+
+    metrics = df_metrics.select(*METRIC_COLUMNS).collect()
+    rollup = df_metrics.groupBy("segment", "ab_group", "week_year").agg(
+        count("*").alias("total_users"),
+        F_sum("activacion").alias("activated_users"),
+        F_sum("setup").alias("setup_users"),
+        F_sum("habito_calc").alias("habit_users"),
+        F_sum("drop").alias("drop_users")
+    ).select(*ROLLUP_COLUMNS).collect()
+    spark.stop()
+    return metrics, rollup
+
+
+def run_pandas():
+    df_onboarding = pandas_engine.read_dataset("onboarding", ONBOARDING_COLUMNS)
+    df_transactions = pandas_engine.read_dataset("transactions", TRANSACTIONS_COLUMNS)
+    df_onboarding, df_transactions = pandas_engine.format_dates(df_onboarding, df_transactions)
+    df_onboarding = pandas_engine.assign_groups(df_onboarding)
+    user_metrics = pandas_engine.compute_user_metrics(df_onboarding, df_transactions)
+    df_metrics, _, _ = pandas_engine.final_metrics(df_onboarding, user_metrics)
+
+    metrics = df_metrics[METRIC_COLUMNS].itertuples(index=False, name=None)
+    rollup = pandas_engine.rollup(df_metrics, ROLLUP_COLUMNS)
+    return list(metrics), rollup
+
+
+def compare(name, spark_rows, pandas_rows):
+    spark_counts, pandas_counts = _rows(spark_rows), _rows(pandas_rows)
+    only_spark = spark_counts - pandas_counts
+    only_pandas = pandas_counts - spark_counts
+    if not only_spark and not only_pandas:
+        print(f"✅ {name}: {sum(spark_counts.values()):,} filas idénticas")
+        return True
+    print(f"❌ {name}: {sum(only_spark.values()):,} filas solo en Spark, "
+          f"{sum(only_pandas.values()):,} solo en pandas")
+    for row in list(only_spark)[:5]:
+        print(f"   spark:  {row}")
+    for row in list(only_pandas)[:5]:
+        print(f"   pandas: {row}")
+    return False
+
+
+def main():
+    print(f"📂 Datos: {pandas_engine.input_size_bytes() / 1024 ** 2:.1f} MB de CSV")
+
+    start = time.perf_counter()
+    spark_metrics, spark_rollup = run_spark()
+    spark_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pandas_metrics, pandas_rollup = run_pandas()
+    pandas_seconds = time.perf_counter() - start
+
+    print(f"⏱️ Spark: {spark_seconds:.2f}s (incluye arranque de la SparkSession y staging)")
+    print(f"⏱️ pandas: {pandas_seconds:.2f}s")
+
+    ok = compare("user_onboarding_metrics_clean", spark_metrics, pandas_metrics)
+    ok = compare("rollup", spark_rollup, pandas_rollup) and ok
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Generador de datasets sintéticos a escala (10×, 100×, 1000×...).
+
+Produce ``lk_onboarding.csv``, ``dim_users.csv`` y ``bt_users_transactions.csv``
+con el mismo formato que los del repo y distribuciones estimadas a partir de
+ellos:
+
+- onboarding: filas remuestreadas de las reales (flags, fechas, cohortes y
+  formatos de fecha mezclados) con user_id nuevos, más la misma proporción
+  de usuarios duplicados,
+- dim_users: un registro por usuario, remuestreado de los reales
+  (incluye las direcciones entre comillas de varias líneas),
+- transacciones: la misma proporción de usuarios con transacciones (el
+  resto queda sin transacciones), el par (cantidad de transacciones, días
+  distintos con transacciones) de un usuario real, un día desde
+  ``first_login_dt`` por cada uno de esos días (cada transacción cae en uno
+  de ellos, así los hábitos por días distintos salen como en los datos
+  reales), tipo por segmento según los datos reales, y una fracción
+  configurable de usuarios con segmentos inconsistentes.
+
+Se genera por bloques de usuarios, así la memoria no depende de la escala.
+
+Uso (desde la raíz del repo):
+    python benchmarks/generate_synthetic_data.py --scale 100 --output-dir synthetic/x100
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+SOURCE_FILES = {
+    "onboarding": "lk_onboarding.csv",
+    "users": "dim_users.csv",
+    "transactions": "bt_users_transactions.csv",
+}
+
+# Módulo de los ids sintéticos: ``MLB`` + 11 dígitos, biyección sobre el índice
+ID_MODULUS = 10 ** 11
+ID_MULTIPLIER = 6364136223846793  # impar y no múltiplo de 5: coprimo con 10^11
+
+
+def fit_profile(source_dir="."):
+    """
+    Estima las distribuciones de los datasets reales
+    """
+    onboarding = pd.read_csv(os.path.join(source_dir, SOURCE_FILES["onboarding"]), index_col=0, dtype=str)
+    users = pd.read_csv(os.path.join(source_dir, SOURCE_FILES["users"]), index_col=0, dtype=str)
+    transactions = pd.read_csv(os.path.join(source_dir, SOURCE_FILES["transactions"]), index_col=0)
+
+    first_login = onboarding.drop_duplicates("user_id").set_index("user_id")["first_login_dt"]
+    tx = transactions.join(pd.to_datetime(first_login, format="mixed").rename("first_login"), on="user_id")
+    offsets = (pd.to_datetime(tx["transaction_dt"], format="mixed").dt.normalize() - tx["first_login"]).dt.days
+
+    per_user = transactions.groupby("user_id")
+    user_segment = per_user["segment"].agg(lambda s: s.mode().iloc[0])
+    # Cantidad de transacciones y días distintos se muestrean juntos (días <= transacciones)
+    tx_days = pd.to_datetime(transactions["transaction_dt"], format="mixed").dt.normalize()
+    activity = pd.DataFrame({
+        "transactions": per_user.size(),
+        "days": tx_days.groupby(transactions["user_id"]).nunique().clip(lower=1),
+    })
+
+    return {
+        "onboarding": onboarding.drop_duplicates("user_id").reset_index(drop=True),
+        "users": users.drop(columns="user_id").reset_index(drop=True),
+        "duplicate_rate": onboarding["user_id"].duplicated().mean(),
+        "tx_user_rate": onboarding["user_id"].drop_duplicates().isin(transactions["user_id"]).mean(),
+        "activity": activity.reset_index(drop=True),
+        "offset_days": offsets.dropna().astype(int).to_numpy(),
+        "segments": user_segment.value_counts(normalize=True).sort_index(),
+        "types_by_segment": {
+            segment: group["type"].value_counts(normalize=True).sort_index()
+            for segment, group in transactions.groupby("segment")
+        },
+    }
+
+
+def synthetic_ids(start, count):
+    index = np.arange(start, start + count, dtype=np.int64)
+    numbers = (index * ID_MULTIPLIER) % ID_MODULUS
+    return pd.Series(numbers).map("MLB{:011d}".format).to_numpy()
+
+
+def _sample(rng, distribution, size):
+    return rng.choice(distribution.index.to_numpy(), size=size, p=distribution.to_numpy())
+
+
+def _with_time_format(dates):
+    # Formato alternativo de los duplicados reales: "yyyy-MM-dd 00:00:00"
+    return dates.where(dates.isna() | (dates.str.len() > 10), dates + " 00:00:00")
+
+
+def generate_block(rng, profile, start, count, inconsistent_rate):
+    """
+    Genera ``count`` usuarios (con ids desde ``start``): devuelve los
+    DataFrames de onboarding, users y transacciones del bloque
+    """
+    user_ids = synthetic_ids(start, count)
+
+    # Onboarding: filas reales remuestreadas con ids nuevos
+    onboarding = profile["onboarding"].sample(count, replace=True, random_state=rng).reset_index(drop=True)
+    onboarding["user_id"] = user_ids
+    duplicates = onboarding.sample(frac=profile["duplicate_rate"], random_state=rng)
+    date_columns = [c for c in onboarding.columns if c.endswith("_dt")]
+    duplicates[date_columns] = duplicates[date_columns].apply(_with_time_format)
+    onboarding = pd.concat([onboarding, duplicates]).sample(frac=1.0, random_state=rng)
+
+    # dim_users: un registro por usuario
+    users = profile["users"].sample(count, replace=True, random_state=rng).reset_index(drop=True)
+    users.insert(0, "user_id", user_ids)
+
+    # Transacciones solo para una parte de los usuarios
+    has_tx = rng.random(count) < profile["tx_user_rate"]
+    tx_users = np.flatnonzero(has_tx)
+    activity = profile["activity"].sample(len(tx_users), replace=True, random_state=rng)
+    tx_counts = activity["transactions"].to_numpy()
+    tx_days = activity["days"].to_numpy()
+    segments = _sample(rng, profile["segments"], len(tx_users))
+
+    rows = np.repeat(tx_users, tx_counts)
+    tx_segment = np.repeat(segments, tx_counts)
+
+    # Usuarios con segmento inconsistente: una de sus transacciones cae en otro segmento
+    inconsistent = rng.random(len(tx_users)) < inconsistent_rate
+    first_tx = np.cumsum(tx_counts) - tx_counts
+    flip = first_tx[inconsistent]
+    all_segments = profile["segments"].index.to_numpy()
+    if len(all_segments) > 1 and len(flip):
+        tx_segment[flip] = [rng.choice(all_segments[all_segments != s]) for s in tx_segment[flip]]
+
+    tx_type = np.empty(len(rows), dtype=np.int64)
+    for segment, types in profile["types_by_segment"].items():
+        mask = tx_segment == segment
+        tx_type[mask] = _sample(rng, types, int(mask.sum()))
+
+    first_login = pd.to_datetime(
+        onboarding.drop_duplicates("user_id").set_index("user_id")["first_login_dt"].reindex(user_ids[rows]),
+        format="mixed",
+    ).to_numpy()
+    # Un offset por día de cada usuario; las primeras transacciones cubren
+    # todos sus días y el resto cae en uno de ellos al azar
+    day_offsets = rng.choice(profile["offset_days"], size=int(tx_days.sum()))
+    row_days = np.repeat(tx_days, tx_counts)
+    position = np.arange(len(rows)) - np.repeat(first_tx, tx_counts)
+    day = np.where(position < row_days, position, (rng.random(len(rows)) * row_days).astype(np.int64))
+    offsets = day_offsets[np.repeat(np.cumsum(tx_days) - tx_days, tx_counts) + day].astype("timedelta64[D]")
+    time_of_day = rng.integers(0, 24 * 3600 * 10 ** 9, size=len(rows)).astype("timedelta64[ns]")
+    transaction_dt = pd.Series(first_login + offsets + time_of_day).astype(str)
+
+    transactions = pd.DataFrame({
+        "user_id": user_ids[rows],
+        "transaction_dt": transaction_dt.to_numpy(),
+        "type": tx_type,
+        "segment": tx_segment,
+    }).sample(frac=1.0, random_state=rng)
+
+    return onboarding, users, transactions
+
+
+def _append_csv(df, path, offset, first):
+    df.index = pd.RangeIndex(offset, offset + len(df))
+    df.to_csv(path, mode="w" if first else "a", header=first)
+    return offset + len(df)
+
+
+def generate(scale, output_dir, source_dir=".", block_users=200000, inconsistent_rate=0.02, seed=42):
+    """
+    Genera los tres CSV a ``scale`` veces el tamaño de los reales en
+    ``output_dir``. Devuelve la cantidad de filas escritas por archivo.
+    """
+    rng = np.random.default_rng(seed)
+    profile = fit_profile(source_dir)
+    total_users = int(round(len(profile["onboarding"]) * scale))
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {name: os.path.join(output_dir, file) for name, file in SOURCE_FILES.items()}
+    offsets = dict.fromkeys(SOURCE_FILES, 0)
+
+    for start in range(0, total_users, block_users):
+        count = min(block_users, total_users - start)
+        blocks = generate_block(rng, profile, start, count, inconsistent_rate)
+        for name, block in zip(("onboarding", "users", "transactions"), blocks):
+            offsets[name] = _append_csv(block, paths[name], offsets[name], first=start == 0)
+
+    return offsets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generador de datasets sintéticos")
+    parser.add_argument("--scale", type=float, default=10, help="factor respecto de los CSV del repo")
+    parser.add_argument("--output-dir", default=None, help="por defecto synthetic/x<scale>")
+    parser.add_argument("--source-dir", default=".", help="directorio con los CSV reales")
+    parser.add_argument("--block-users", type=int, default=200000, help="usuarios por bloque")
+    parser.add_argument("--inconsistent-rate", type=float, default=0.02,
+                        help="fracción de usuarios con transacciones en más de un segmento")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or os.path.join("synthetic", f"x{args.scale:g}")
+    start = time.perf_counter()
+    rows = generate(args.scale, output_dir, args.source_dir, args.block_users,
+                    args.inconsistent_rate, args.seed)
+    print(f"✅ Datos x{args.scale:g} en {output_dir} ({time.perf_counter() - start:.1f}s)")
+    for name, count in rows.items():
+        print(f"- {SOURCE_FILES[name]}: {count:,} filas")
+
+
+if __name__ == "__main__":
+    main()
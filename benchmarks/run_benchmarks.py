@@ -0,0 +1,320 @@
+"""
+Benchmark de punta a punta del ETL y del dashboard sobre datos sintéticos.
+
+Para cada escala genera los datos (si no existen, con
+``generate_synthetic_data.py``) y corre un proceso aparte con
+``FINTECH_DATA_DIR`` apuntando a esos datos. Ese proceso mide:
+
+- ETL: corre ``etl_pipeline_clean.py`` tal cual (``--engine spark --mode full
+  --profile-stages``, con el staging desde cero) en un directorio de trabajo
+  dentro de los datos, así sus artefactos no pisan los del repo, y toma el
+  tiempo de cada etapa de su ``run_report.json`` (``StageProfiler``). Lo que
+  cambie en el ETL (ventanas de fechas, deduplicación, ...) se mide sin
+  tocar este script,
+- escritura: con ``--cassandra local`` es la etapa ``cassandra_write`` del
+  ETL, contra el keyspace ``fintech_benchmarks``; con ``--cassandra stub``
+  (por defecto) el ETL no tiene dónde escribir y se mide ``CassandraWriter``
+  sobre las métricas que dejó el ETL contra una sesión stub con latencia
+  simulada,
+- dashboard: decodificación columnar de páginas (``to_compact_frame``),
+  rollup desde filas y cubo con significancia (``dashboard_metrics``) sobre
+  esas mismas métricas.
+
+Los resultados se guardan en JSON en ``benchmarks/results/`` y, con
+``--baseline``, se comparan etapa por etapa con una corrida anterior.
+
+Uso (desde la raíz del repo):
+    python benchmarks/run_benchmarks.py --scales 10 100 1000
+    python benchmarks/run_benchmarks.py --scales 10 --baseline benchmarks/results/<corrida>.json
+"""
+import argparse
+import glob
+import heapq
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+ETL_SCRIPT = os.path.join(ROOT, "etl_pipeline_clean.py")
+ETL_COMMAND = ["--engine", "spark", "--mode", "full", "--profile-stages"]
+BENCH_KEYSPACE = "fintech_benchmarks"
+BENCH_TABLE = "user_onboarding_metrics_bench"
+
+# Una etapa se marca como regresión si tarda más que esto respecto de la base
+REGRESSION_THRESHOLD = 0.20
+
+
+class StubSession:
+    """
+    Sesión falsa para medir el escritor sin Cassandra: cada request se
+    completa ``latency_ms`` después de enviado. Un solo thread atiende una
+    cola ordenada por vencimiento (sin un Timer por fila).
+    """
+
+    def __init__(self, latency_ms=1.0):
+        self.latency = latency_ms / 1000
+        self._queue = []
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        threading.Thread(target=self._run, name="stub-session", daemon=True).start()
+
+    def prepare(self, query):
+        return query
+
+    def execute_async(self, statement, parameters=None):
+        return _StubFuture(self)
+
+    def _schedule(self, callback, args):
+        with self._cond:
+            due = time.perf_counter() + self.latency
+            heapq.heappush(self._queue, (due, next(self._sequence), callback, args))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                due, _, callback, args = self._queue[0]
+                remaining = due - time.perf_counter()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._queue)
+            callback(None, *args)
+
+
+class _StubFuture:
+    def __init__(self, session):
+        self._session = session
+
+    def add_callbacks(self, callback, callback_args=(), errback=None, errback_args=()):
+        self._session._schedule(callback, callback_args)
+
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 3)
+            print(f"   ⏱️ {name}: {self.stages[name]:.2f}s", flush=True)
+
+
+def _create_keyspace(host, port):
+    from cassandra_writer import build_cluster
+
+    cluster = build_cluster(host, port)
+    try:
+        cluster.connect().execute(
+            f"CREATE KEYSPACE IF NOT EXISTS {BENCH_KEYSPACE} "
+            "WITH replication = {'class': 'SimpleStrategy', 'replication_factor': 1}"
+        )
+    finally:
+        cluster.shutdown()
+
+
+def _read_metrics(directory):
+    """
+    Métricas del respaldo CSV por cohorte del ETL (un directorio por
+    week_year con los part-*.csv de Spark)
+    """
+    import pandas as pd
+
+    frames = []
+    for cohort_dir in sorted(glob.glob(os.path.join(directory, "week_year=*"))):
+        value = os.path.basename(cohort_dir).split("=", 1)[1]
+        for path in sorted(glob.glob(os.path.join(cohort_dir, "part-*.csv"))):
+            frame = pd.read_csv(path, dtype={"user_id": str, "ab_group": str})
+            frame["week_year"] = pd.to_numeric(value, errors="coerce")
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def run_etl(args, workdir):
+    """
+    Corre el ETL en ``workdir`` y devuelve su reporte de corrida
+    """
+    from staging import STAGING_DIR
+
+    # Staging desde cero: la etapa de carga incluye la conversión CSV -> Parquet
+    shutil.rmtree(STAGING_DIR, ignore_errors=True)
+    shutil.rmtree(workdir, ignore_errors=True)
+    os.makedirs(workdir)
+
+    env = dict(os.environ, FINTECH_CASSANDRA_HOST=args.cassandra_host,
+               FINTECH_CASSANDRA_PORT=str(args.cassandra_port), FINTECH_CASSANDRA_KEYSPACE=BENCH_KEYSPACE)
+    subprocess.run([sys.executable, ETL_SCRIPT, *ETL_COMMAND], env=env, cwd=workdir, check=True)
+    with open(os.path.join(workdir, "artifacts", "run_report.json")) as f:
+        return json.load(f)
+
+
+def run_worker(args):
+    """
+    Mide todas las etapas para los datos de ``FINTECH_DATA_DIR`` y escribe
+    el resultado en ``args.result_path``
+    """
+    import pandas as pd
+
+    from cassandra_loader import FETCH_SIZE, METRIC_COLUMNS, to_compact_frame
+    from cassandra_writer import CassandraWriter
+    from dashboard_metrics import ROLLUP_COLUMNS, compute_cube, rollup_from_rows
+    from pandas_engine import rollup
+    from staging import DATA_DIR
+
+    timer = StageTimer()
+    workdir = os.path.join(DATA_DIR, "_etl_run")
+
+    if args.cassandra == "local":
+        _create_keyspace(args.cassandra_host, args.cassandra_port)
+
+    with timer.stage("etl_total"):
+        report = run_etl(args, workdir)
+    for name, entry in report["stages"].items():
+        timer.stages[f"etl_{name}"] = entry["wall_s"]
+    if args.cassandra == "stub":
+        # El ETL no llegó a escribir: su etapa solo mide el intento de conexión
+        timer.stages.pop("etl_cassandra_write", None)
+    rows = {
+        "onboarding": report["onboarding"]["rows"],
+        "transactions": report["transactions"]["rows"],
+        "metrics": report["metrics"]["rows"],
+    }
+
+    metrics = _read_metrics(os.path.join(workdir, "artifacts", "user_onboarding_metrics_clean_by_cohort"))
+    pandas_df = metrics[METRIC_COLUMNS]
+
+    result = {}
+    if args.cassandra == "stub":
+        with timer.stage("cassandra_write"):
+            writer = CassandraWriter(StubSession(args.stub_latency_ms), BENCH_TABLE, METRIC_COLUMNS)
+            write_stats = writer.write_rows(pandas_df.itertuples(index=False, name=None))
+        result["cassandra_write"] = write_stats.as_dict()
+    else:
+        result["cassandra_write"] = report.get("cassandra_write")
+
+    # Dashboard: páginas como las devuelve la sesión columnar (tuple_factory)
+    records = list(pandas_df.itertuples(index=False, name=None))
+    chunks = {c: [] for c in METRIC_COLUMNS}
+    for start in range(0, len(records), FETCH_SIZE):
+        for c, values in zip(METRIC_COLUMNS, zip(*records[start:start + FETCH_SIZE])):
+            chunks[c].append(values)
+    del records
+    rollup_df = rollup(metrics, ROLLUP_COLUMNS)
+
+    with timer.stage("dashboard_decode"):
+        frame = to_compact_frame(chunks)
+    with timer.stage("dashboard_rollup_from_rows"):
+        rollup_from_rows(frame)
+    with timer.stage("dashboard_cube"):
+        compute_cube(pd.DataFrame(rollup_df, columns=ROLLUP_COLUMNS))
+
+    result = {
+        "rows": rows,
+        "stages": timer.stages,
+        **result,
+        "dashboard_frame_mb": round(frame.memory_usage(deep=True).sum() / 1024 ** 2, 2),
+    }
+    with open(args.result_path, "w") as f:
+        json.dump(result, f, indent=2)
+
+
+def compare(results, baseline):
+    """
+    Imprime la diferencia por etapa contra una corrida anterior
+    """
+    print("\n📊 COMPARACIÓN CONTRA LA BASE")
+    regressions = 0
+    for scale, result in results["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if base is None:
+            print(f"- x{scale}: sin datos en la base")
+            continue
+        print(f"- x{scale}:")
+        for stage, seconds in result["stages"].items():
+            before = base["stages"].get(stage)
+            if not before:
+                continue
+            change = (seconds - before) / before
+            flag = " ⚠️ regresión" if change > REGRESSION_THRESHOLD else ""
+            regressions += bool(flag)
+            print(f"   {stage}: {before:.2f}s -> {seconds:.2f}s ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del ETL y del dashboard")
+    parser.add_argument("--scales", type=float, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--data-root", default="synthetic", help="directorio de los datos sintéticos")
+    parser.add_argument("--cassandra", choices=["stub", "local"], default="stub")
+    parser.add_argument("--cassandra-host", default="localhost")
+    parser.add_argument("--cassandra-port", type=int, default=9042)
+    parser.add_argument("--stub-latency-ms", type=float, default=1.0, help="latencia simulada por escritura")
+    parser.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    parser.add_argument("--output", help="ruta del JSON de resultados")
+    # Uso interno: proceso que mide una escala
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from generate_synthetic_data import generate
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "cassandra": args.cassandra,
+        "stub_latency_ms": args.stub_latency_ms if args.cassandra == "stub" else None,
+        "scales": {},
+    }
+
+    for scale in args.scales:
+        data_dir = os.path.join(args.data_root, f"x{scale:g}")
+        if not os.path.exists(os.path.join(data_dir, "lk_onboarding.csv")):
+            print(f"🧪 Generando datos x{scale:g} en {data_dir}...")
+            generate(scale, data_dir, source_dir=ROOT)
+
+        print(f"\n🚀 BENCHMARK x{scale:g}")
+        result_path = os.path.join(data_dir, "_benchmark_result.json")
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--result-path", result_path,
+                   "--cassandra", args.cassandra, "--cassandra-host", args.cassandra_host,
+                   "--cassandra-port", str(args.cassandra_port), "--stub-latency-ms", str(args.stub_latency_ms)]
+        env = dict(os.environ, FINTECH_DATA_DIR=os.path.abspath(data_dir))
+        subprocess.run(command, env=env, cwd=ROOT, check=True)
+        with open(result_path) as f:
+            results["scales"][f"{scale:g}"] = json.load(f)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Resultados guardados en {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"⚠️ {regressions} etapas más lentas que la base (>{REGRESSION_THRESHOLD:.0%})")
+
+
+if __name__ == "__main__":
+    main()
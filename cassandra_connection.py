@@ -0,0 +1,87 @@
+"""
+Conexión compartida a Cassandra para el dashboard.
+
+Streamlit re-ejecuta el script en cada interacción; crear un ``Cluster``
+por llamada paga cada vez el handshake, la negociación de protocolo y el
+descubrimiento de metadatos. ``CassandraConnection`` mantiene el cluster y
+las sesiones abiertas (el dashboard la guarda con ``st.cache_resource``
+por host/puerto/keyspace), cachea los statements preparados y expone un
+health check y un cierre ordenado.
+"""
+import threading
+
+from cassandra_loader import configure_columnar
+from cassandra_writer import build_cluster
+
+
+class CassandraConnection:
+    """
+    Cluster + sesiones reutilizables para un (host, port, keyspace)
+    """
+
+    def __init__(self, host, port, keyspace):
+        self.host = host
+        self.port = port
+        self.keyspace = keyspace
+        self._lock = threading.Lock()
+        self._prepared = {}
+        self._columnar_session = None
+
+        self.cluster = build_cluster(host, port)
+        self.session = self.cluster.connect(keyspace)
+
+    @property
+    def columnar_session(self):
+        """
+        Sesión aparte para lecturas masivas: filas como tuplas (o páginas como
+        arrays de NumPy si el driver lo soporta). Es una sesión distinta para
+        no cambiar el formato de resultados de la sesión principal.
+        """
+        with self._lock:
+            if self._columnar_session is None:
+                self._columnar_session = configure_columnar(self.cluster.connect(self.keyspace))
+            return self._columnar_session
+
+    def prepare(self, query):
+        """
+        Prepara ``query`` una sola vez por conexión
+        """
+        with self._lock:
+            prepared = self._prepared.get(query)
+            if prepared is None:
+                prepared = self.session.prepare(query)
+                self._prepared[query] = prepared
+            return prepared
+
+    def execute(self, query, parameters=None, **kwargs):
+        if isinstance(query, str) and parameters is not None:
+            query = self.prepare(query)
+        return self.session.execute(query, parameters, **kwargs)
+
+    def is_open(self):
+        """
+        Chequeo local (sin round trip): la sesión sigue abierta y hay algún
+        nodo disponible
+        """
+        if self.session.is_shutdown:
+            return False
+        return any(host.is_up for host in self.cluster.metadata.all_hosts())
+
+    def health_check(self):
+        """
+        Consulta liviana al nodo coordinador. Devuelve (ok, mensaje).
+        """
+        try:
+            row = self.session.execute("SELECT release_version FROM system.local").one()
+            return True, f"Cassandra {row.release_version}"
+        except Exception as e:
+            return False, str(e)
+
+    def shutdown(self):
+        with self._lock:
+            if self._columnar_session is not None:
+                self._columnar_session.shutdown()
+                self._columnar_session = None
+            self._prepared.clear()
+        self.session.shutdown()
+        self.cluster.shutdown()
@@ -0,0 +1,264 @@
+"""
+Lectura columnar de la tabla de métricas desde Cassandra para el dashboard.
+
+En lugar de construir un dict de Python por fila y después un DataFrame
+(doble copia en memoria), se pagina con ``fetch_size`` y cada página se
+acumula directamente por columna:
+
+- si la sesión usa ``NumpyProtocolHandler`` (driver compilado con soporte
+  NumPy) cada página llega como arrays de NumPy por columna,
+- si no, la sesión debe usar ``tuple_factory`` y cada página se transpone
+  con ``zip``.
+
+``configure_columnar`` deja una sesión en ese modo (el dashboard usa la
+sesión columnar de ``CassandraConnection``, que ya viene configurada).
+
+El DataFrame final usa tipos compactos: int8 para los flags y categorías
+para ``segment`` y ``ab_group``.
+
+Para tablas grandes, ``load_metrics_frame_parallel`` divide el anillo de
+tokens en rangos y los lee en paralelo con un pool acotado de threads, así
+la carga usa varios coordinadores y conexiones en lugar de un único stream.
+
+La vista "Datos Raw" no carga la tabla: ``group_page_query`` filtra en
+Cassandra sobre la tabla particionada por (segment, ab_group) y
+``fetch_page`` trae una página por vez, devolviendo el ``paging_state``
+para pedir la siguiente.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from cassandra.query import SimpleStatement, tuple_factory
+
+try:
+    from cassandra.protocol import NumpyProtocolHandler
+except ImportError:  # driver sin extensiones Cython/NumPy
+    NumpyProtocolHandler = None
+
+METRIC_COLUMNS = ['user_id', 'segment', 'ab_group', 'drop', 'activacion', 'setup', 'habito_calc']
+FLAG_COLUMNS = ['drop', 'activacion', 'setup', 'habito_calc']
+CATEGORY_COLUMNS = ['segment', 'ab_group']
+
+FETCH_SIZE = 5000
+PAGE_SIZE = 500
+
+# Rango de tokens del Murmur3Partitioner (el default de Cassandra)
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+
+def metrics_query(table):
+    column_list = ", ".join(f'"{c}"' for c in METRIC_COLUMNS)
+    return f"SELECT {column_list} FROM {table}"
+
+
+def configure_columnar(session):
+    """
+    Configura una sesión (dedicada) para lecturas columnares
+    """
+    session.row_factory = tuple_factory
+    if NumpyProtocolHandler is not None:
+        session.client_protocol_handler = NumpyProtocolHandler
+    return session
+
+
+def fetch_columns(session, statement, columns, fetch_size=FETCH_SIZE, parameters=None):
+    """
+    Ejecuta ``statement`` (texto CQL o statement preparado) paginando de a
+    ``fetch_size`` filas y devuelve (dict columna -> lista de bloques,
+    cantidad de páginas). La sesión debe estar en modo columnar.
+    """
+    use_numpy = _uses_numpy(session)
+
+    if isinstance(statement, str):
+        statement = SimpleStatement(statement, fetch_size=fetch_size)
+        result = session.execute(statement, parameters)
+    else:
+        bound = statement.bind(parameters or ())
+        bound.fetch_size = fetch_size
+        result = session.execute(bound)
+
+    chunks = {c: [] for c in columns}
+    pages = 0
+    while True:
+        pages += 1
+        _append_page(chunks, result.current_rows, columns, use_numpy)
+        if not result.has_more_pages:
+            break
+        result.fetch_next_page()
+
+    return chunks, pages
+
+
+def _uses_numpy(session):
+    return NumpyProtocolHandler is not None and \
+        session.client_protocol_handler is NumpyProtocolHandler
+
+
+def _append_page(chunks, page, columns, use_numpy):
+    """
+    Agrega una página (``ResultSet.current_rows``) a los bloques por columna
+    """
+    if use_numpy:
+        # ``current_rows`` envuelve la página en una lista: [dict columna -> array]
+        for block in page:
+            for c in columns:
+                chunks[c].append(_unmask(block[c]))
+    elif page:
+        for c, values in zip(columns, zip(*page)):
+            chunks[c].append(values)
+
+
+def _unmask(values):
+    # Las celdas null llegan como array enmascarado: NaN en columnas
+    # numéricas, None en el resto (como en el camino de tuplas)
+    if not np.ma.isMaskedArray(values):
+        return np.asarray(values)
+    mask = np.ma.getmaskarray(values)
+    if values.dtype.kind in "biuf":
+        return values.astype(np.float64).filled(np.nan)
+    filled = np.asarray(values.data, dtype=object)
+    filled[mask] = None
+    return filled
+
+
+def _concat(blocks):
+    arrays = [np.asarray(b) for b in blocks]
+    if not arrays:
+        return np.array([])
+    return np.concatenate(arrays)
+
+
+def _flag_array(values):
+    # None/NaN -> 0; la conversión es vectorizada (sin bucle en Python)
+    return np.nan_to_num(np.asarray(values, dtype=np.float32)).astype(np.int8)
+
+
+def to_compact_frame(chunks):
+    """
+    Arma el DataFrame de métricas con tipos compactos a partir de bloques
+    por columna
+    """
+    data = {}
+    for c, blocks in chunks.items():
+        values = _concat(blocks)
+        if c in FLAG_COLUMNS:
+            data[c] = _flag_array(values)
+        elif c in CATEGORY_COLUMNS:
+            data[c] = pd.Categorical(values)
+        else:
+            data[c] = values.astype(object)
+    return pd.DataFrame(data, columns=list(chunks))
+
+
+def load_metrics_frame(session, table, fetch_size=FETCH_SIZE, statement=None):
+    """
+    Carga la tabla de métricas completa (``statement`` permite pasar la
+    consulta ya preparada). El DataFrame devuelto incluye en ``attrs`` el
+    tiempo de carga, la cantidad de páginas y la memoria usada.
+    """
+    start = time.perf_counter()
+    statement = statement if statement is not None else metrics_query(table)
+    chunks, pages = fetch_columns(session, statement, METRIC_COLUMNS, fetch_size)
+    df = to_compact_frame(chunks)
+    df.attrs['load_seconds'] = time.perf_counter() - start
+    df.attrs['pages'] = pages
+    df.attrs['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+    return df
+
+
+def token_ranges(splits):
+    """
+    Divide el anillo (MIN_TOKEN, MAX_TOKEN] en ``splits`` rangos contiguos
+    (start, end], pensados para ``token(pk) > start AND token(pk) <= end``
+    """
+    step = (MAX_TOKEN - MIN_TOKEN) // splits
+    bounds = [MIN_TOKEN + i * step for i in range(splits)] + [MAX_TOKEN]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def token_range_query(table, partition_key="user_id"):
+    column_list = ", ".join(f'"{c}"' for c in METRIC_COLUMNS)
+    return (
+        f"SELECT {column_list} FROM {table} "
+        f"WHERE token({partition_key}) > ? AND token({partition_key}) <= ?"
+    )
+
+
+def load_metrics_frame_parallel(session, table, workers=8, splits_per_worker=4,
+                                fetch_size=FETCH_SIZE, statement=None):
+    """
+    Carga la tabla de métricas completa leyendo rangos de tokens en paralelo
+    (``workers`` consultas simultáneas como máximo). ``statement`` permite
+    pasar ``token_range_query`` ya preparada. Los bloques de cada rango se
+    concatenan por columna, sin objetos de Python por fila.
+    """
+    start = time.perf_counter()
+    if statement is None:
+        statement = session.prepare(token_range_query(table))
+    ranges = token_ranges(workers * splits_per_worker)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(
+            lambda r: fetch_columns(session, statement, METRIC_COLUMNS, fetch_size, r),
+            ranges,
+        ))
+
+    chunks = {c: [] for c in METRIC_COLUMNS}
+    pages = 0
+    for range_chunks, range_pages in results:
+        pages += range_pages
+        for c in METRIC_COLUMNS:
+            chunks[c].extend(range_chunks[c])
+
+    df = to_compact_frame(chunks)
+    df.attrs['load_seconds'] = time.perf_counter() - start
+    df.attrs['pages'] = pages
+    df.attrs['token_ranges'] = len(ranges)
+    df.attrs['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+    return df
+
+
+def group_page_query(table, filter_column=None):
+    """
+    Consulta sobre la tabla con PRIMARY KEY ((segment, ab_group), user_id):
+    ``segment IN ?`` y ``ab_group IN ?`` acotan las particiones y el filtro
+    opcional por métrica (``filter_column = ?``) se evalúa en Cassandra solo
+    dentro de esas particiones.
+    """
+    column_list = ", ".join(f'"{c}"' for c in METRIC_COLUMNS)
+    query = f"SELECT {column_list} FROM {table} WHERE segment IN ? AND ab_group IN ?"
+    if filter_column:
+        query += f' AND "{filter_column}" = ? ALLOW FILTERING'
+    return query
+
+
+def fetch_page(session, statement, parameters, page_size=PAGE_SIZE, paging_state=None):
+    """
+    Trae una sola página de ``statement`` (preparado) desde ``paging_state``
+    (None = primera página). Devuelve (DataFrame compacto, paging_state de
+    la página siguiente o None si no hay más).
+    """
+    bound = statement.bind(parameters)
+    bound.fetch_size = page_size
+    result = session.execute(bound, paging_state=paging_state)
+
+    chunks = {c: [] for c in METRIC_COLUMNS}
+    _append_page(chunks, result.current_rows, METRIC_COLUMNS, _uses_numpy(session))
+    next_state = result.paging_state if result.has_more_pages else None
+    return to_compact_frame(chunks), next_state
+
+
+def iter_pages(session, statement, parameters, page_size=FETCH_SIZE):
+    """
+    Recorre todas las páginas de ``statement`` sin acumularlas: genera un
+    DataFrame compacto por página (para exportar con memoria acotada)
+    """
+    paging_state = None
+    while True:
+        page, paging_state = fetch_page(session, statement, parameters, page_size, paging_state)
+        yield page
+        if paging_state is None:
+            break
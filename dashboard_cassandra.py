@@ -3,11 +3,23 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from cassandra.cluster import Cluster
-from cassandra.auth import PlainTextAuthProvider
+import atexit
+import os
 import numpy as np
 from datetime import datetime
-import time
+from ab_assignment import ONBOARDING_EXPERIMENT
+from dashboard_metrics import ROLLUP_COLUMNS, SEGMENT_NAMES, compute_cube, rollup_from_rows
+from cassandra_loader import (
+    PAGE_SIZE,
+    fetch_page,
+    group_page_query,
+    iter_pages,
+    load_metrics_frame_parallel,
+    token_range_query,
+)
+from data_export import available_formats, export_chunks, remove_expired
+from cassandra_connection import CassandraConnection
+from snapshot_cache import SnapshotCache
 
 # Configuración de la página
 st.set_page_config(
@@ -29,181 +41,260 @@ cassandra_host = st.sidebar.text_input("Host de Cassandra", value="localhost")
 cassandra_port = st.sidebar.number_input("Puerto", value=9042, min_value=1, max_value=65535)
 keyspace_name = st.sidebar.text_input("Keyspace", value="fintech_analytics")
 table_name = st.sidebar.text_input("Tabla", value="user_onboarding_metrics_clean")
+rollup_table_name = st.sidebar.text_input("Tabla de rollup", value="user_onboarding_rollup")
+by_group_table_name = st.sidebar.text_input("Tabla por segmento/grupo (Datos Raw)", value="user_onboarding_metrics_by_group")
+scan_workers = st.sidebar.number_input("Lecturas en paralelo (rangos de tokens)", value=8, min_value=1, max_value=64)
+
+# Tabla donde el ETL registra cada corrida (conteos y fecha de finalización)
+RUN_METADATA_TABLE = "etl_run_metadata"
+
+# Exportaciones de "Datos Raw": Streamlit las sirve desde disco como archivos
+# estáticos (server.enableStaticServing en .streamlit/config.toml). Cualquiera
+# con la URL puede leerlas, así que duran como máximo EXPORT_TTL_SECONDS.
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "exports")
+EXPORT_URL = "app/static/exports"
+EXPORT_TTL_SECONDS = 15 * 60
+
+# Mapeo de segmentos a nombres
+segment_mapping = SEGMENT_NAMES
+
+# Filtros por métrica de "Datos Raw": (columna, valor, columna del cubo con
+# la cantidad de usuarios que cumplen el filtro)
+METRIC_FILTERS = {
+    'Con Activación': ('activacion', 1, 'Activados'),
+    'Con Setup': ('setup', 1, 'Setup'),
+    'Con Hábito': ('habito_calc', 1, 'Hábito'),
+    'Sin Drop': ('drop', 0, None),
+}
+
+# Conexión compartida entre reruns y usuarios del dashboard (una por
+# host/puerto/keyspace). Si la sesión se cerró o no quedan nodos disponibles,
+# Streamlit la vuelve a crear.
+@st.cache_resource(validate=lambda conn: conn.is_open())
+def get_connection(host, port, keyspace):
+    """
+    Devuelve la conexión a Cassandra reutilizable para (host, port, keyspace)
+    """
+    conn = CassandraConnection(host, port, keyspace)
+    atexit.register(conn.shutdown)
+    return conn
 
-# Botón para probar conexión
-if st.sidebar.button("🔍 Probar Conexión"):
-    try:
-        cluster = Cluster([cassandra_host], port=cassandra_port)
-        session = cluster.connect()
-        session.execute(f"USE {keyspace_name}")
-        
-        # Verificar que la tabla existe con una consulta simple
-        rows = session.execute(f"SELECT COUNT(*) FROM {table_name}")
-        count = rows.one()[0]
-        
-        # Verificar que hay datos
-        if count > 0:
-            st.sidebar.success(f"✅ Conexión exitosa! {count:,} registros encontrados")
-        else:
-            st.sidebar.warning(f"⚠️ Conexión exitosa pero no hay datos en la tabla")
-        
-        session.shutdown()
-        cluster.shutdown()
-        
-    except Exception as e:
-        st.sidebar.error(f"❌ Error de conexión: {str(e)}")
+def read_run_stats(conn, table):
+    """
+    Estadísticas de la última corrida del ETL desde la tabla de metadatos
+    (una sola partición, sin recorrer la tabla de métricas)
+    """
+    query = conn.prepare(
+        f"SELECT run_id, completed_at, mode, row_count, ab_group_counts, segment_counts "
+        f"FROM {RUN_METADATA_TABLE} WHERE table_name = ? LIMIT 1"
+    )
+    row = conn.execute(query, (table,)).one()
+    if row is None:
+        return None
+
+    return {
+        'total_rows': row.row_count,
+        'run_id': row.run_id,
+        'completed_at': row.completed_at,
+        'mode': row.mode,
+        'ab_group_counts': dict(row.ab_group_counts or {}),
+        'segment_counts': dict(row.segment_counts or {})
+    }
 
-# Función para cargar datos desde Cassandra con cache inteligente
-@st.cache_data(ttl=300)  # Cache por 5 minutos
-def load_data_from_cassandra(host, port, keyspace, table):
+def read_run_version(conn, table):
     """
-    Carga datos desde Cassandra con manejo de errores mejorado
+    run_id de la última corrida (None si todavía no hay metadatos). Un error
+    de lectura se propaga: el cache sigue sirviendo el snapshot que tiene en
+    lugar de tomarlo como una versión nueva
+    """
+    stats = read_run_stats(conn, table)
+    return stats['run_id'] if stats else None
+
+def read_rollup(conn, table):
+    """
+    Lee la tabla de rollup (pocas filas) que alimenta las vistas agregadas
+    """
+    rows = conn.execute(conn.prepare(f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM {table}"))
+    return pd.DataFrame([tuple(row) for row in rows], columns=ROLLUP_COLUMNS)
+
+def load_snapshot(conn, table, rollup_table, workers):
+    """
+    Carga los datos de las vistas agregadas: estadísticas de la corrida y
+    rollup. Si el rollup no existe o está vacío se arma desde la tabla por
+    usuario (rangos de tokens en paralelo). Corre también en el refresco en
+    segundo plano, por eso no usa funciones ``st.*``.
     """
     try:
-        # Mostrar progreso
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        status_text.text("Conectando a Cassandra...")
-        progress_bar.progress(25)
-        
-        # Conectar a Cassandra
-        cluster = Cluster([host], port=port)
-        session = cluster.connect()
-        
-        status_text.text("Ejecutando consulta...")
-        progress_bar.progress(50)
-        
-        # Usar keyspace
-        session.execute(f"USE {keyspace}")
-        
-        # Cargar datos con consulta optimizada
-        query = f"""
-        SELECT user_id, segment, ab_group, "drop", activacion, setup, habito_calc 
-        FROM {table}
-        """
-        
-        rows = session.execute(query)
-        
-        status_text.text("Procesando datos...")
-        progress_bar.progress(75)
-        
-        # Convertir a DataFrame
-        data = []
-        for row in rows:
-            data.append({
-                'user_id': row.user_id,
-                'segment': row.segment,
-                'ab_group': row.ab_group,
-                'drop': row.drop,
-                'activacion': row.activacion,
-                'setup': row.setup,
-                'habito_calc': row.habito_calc
-            })
-        
-        df = pd.DataFrame(data)
-        
-        status_text.text("Completado!")
-        progress_bar.progress(100)
-        time.sleep(0.5)
-        progress_bar.empty()
-        status_text.empty()
-        
-        # Cerrar conexión
-        session.shutdown()
-        cluster.shutdown()
-        
-        return df
-        
+        stats = read_run_stats(conn, table)
+    except Exception:
+        stats = None
+
+    rollup_error = None
+    try:
+        rollup = read_rollup(conn, rollup_table)
     except Exception as e:
-        st.error(f"❌ Error al cargar datos desde Cassandra: {str(e)}")
-        return None
+        rollup, rollup_error = None, str(e)
+
+    if rollup is None or rollup.empty:
+        df = load_metrics_frame_parallel(conn.columnar_session, table, workers=workers,
+                                         statement=conn.prepare(token_range_query(table)))
+        rollup = rollup_from_rows(df) if not df.empty else None
+
+    return {'stats': stats, 'rollup': rollup, 'rollup_error': rollup_error}
+
+# Cache stale-while-revalidate compartido entre reruns y usuarios: se sirve
+# el último snapshot y un thread en segundo plano lo recarga solo cuando
+# cambia el run_id del ETL. Se recrea junto con la conexión si ésta se cerró.
+@st.cache_resource(validate=lambda entry: entry[0].is_open())
+def get_data_cache(host, port, keyspace, table, rollup_table, workers):
+    conn = get_connection(host, port, keyspace)
+    data_cache = SnapshotCache(
+        loader=lambda: load_snapshot(conn, table, rollup_table, workers),
+        version_fn=lambda: read_run_version(conn, table),
+    )
+    return conn, data_cache
+
+@st.cache_data(max_entries=8)
+def build_cube(data_version, _rollup):
+    """
+    Cubo segmento × grupo A/B y todas las tablas que usan las vistas,
+    calculados una sola vez por versión de los datos. ``data_version`` es el
+    run_id del ETL; ``_rollup`` no se hashea.
+    """
+    return compute_cube(_rollup, segment_mapping)
+
+def data_version(rollup, stats):
+    """
+    Versión de los datos para memoizar el cubo: el run_id de la última
+    corrida o, si no hay metadatos, un hash del rollup
+    """
+    if stats:
+        return str(stats['run_id'])
+    return str(pd.util.hash_pandas_object(rollup, index=False).sum())
 
 # Función para obtener estadísticas de la base de datos
 def get_database_stats(host, port, keyspace, table):
     """
-    Obtiene estadísticas de la base de datos usando pandas
+    Obtiene las estadísticas de la última corrida del ETL (lectura directa,
+    sin pasar por el cache)
     """
     try:
-        cluster = Cluster([host], port=port)
-        session = cluster.connect()
-        session.execute(f"USE {keyspace}")
+        conn = get_connection(host, port, keyspace)
+        return read_run_stats(conn, table)
         
-        # Contar registros
-        count_query = f"SELECT COUNT(*) FROM {table}"
-        total_rows = session.execute(count_query).one()[0]
+    except Exception as e:
+        st.error(f"Error al obtener estadísticas: {str(e)}")
+        return None
+
+# Botón para probar conexión
+if st.sidebar.button("🔍 Probar Conexión"):
+    try:
+        conn = get_connection(cassandra_host, cassandra_port, keyspace_name)
+        healthy, message = conn.health_check()
+        if not healthy:
+            raise RuntimeError(message)
         
-        # Cerrar conexión
-        session.shutdown()
-        cluster.shutdown()
+        # Conteo mantenido por el ETL (sin SELECT COUNT(*) sobre toda la tabla)
+        stats = get_database_stats(cassandra_host, cassandra_port, keyspace_name, table_name)
         
-        return {
-            'total_rows': total_rows
-        }
+        # Verificar que hay datos
+        if stats and stats['total_rows'] > 0:
+            st.sidebar.success(f"✅ Conexión exitosa ({message})! {stats['total_rows']:,} registros encontrados")
+        else:
+            st.sidebar.warning(f"⚠️ Conexión exitosa ({message}) pero no hay datos de la tabla (¿se ejecutó el ETL?)")
         
     except Exception as e:
-        st.error(f"Error al obtener estadísticas: {str(e)}")
-        return None
+        st.sidebar.error(f"❌ Error de conexión: {str(e)}")
+
+# Selector de vista en sidebar
+st.sidebar.header("🎯 Navegación")
+view_option = st.sidebar.selectbox(
+    "Selecciona la vista:",
+    ["📈 Dashboard Completo", "🔄 Funnel", "👥 Segmentos", "🔬 A/B Testing", "📊 Datos Raw"]
+)
 
-# Cargar datos
+# Cargar datos: las vistas agregadas leen solo el rollup; la tabla por
+# usuario se carga únicamente si falta el rollup ("Datos Raw" pagina en
+# Cassandra)
 st.header("📊 Carga de Datos")
 
+snapshot = None
+data_cache = None
 with st.spinner("Cargando datos desde Cassandra..."):
-    df = load_data_from_cassandra(cassandra_host, cassandra_port, keyspace_name, table_name)
-    
-    if df is not None:
+    # Solo la primera carga bloquea; después se sirve el último snapshot
+    try:
+        _, data_cache = get_data_cache(cassandra_host, cassandra_port, keyspace_name, table_name,
+                                       rollup_table_name, int(scan_workers))
+        snapshot = data_cache.get()
+    except Exception as e:
+        st.error(f"❌ Error al cargar datos desde Cassandra: {str(e)}")
+
+    rollup = snapshot['rollup'] if snapshot else None
+    stats = snapshot['stats'] if snapshot else None
+    if snapshot and snapshot['rollup_error']:
+        st.warning(f"⚠️ No se pudo leer el rollup desde Cassandra: {snapshot['rollup_error']}")
+
+    if rollup is not None and not rollup.empty:
         # Mostrar estadísticas de la base de datos
-        stats = get_database_stats(cassandra_host, cassandra_port, keyspace_name, table_name)
         if stats:
             col1, col2, col3 = st.columns(3)
             with col1:
                 st.metric("Total Registros", f"{stats['total_rows']:,}")
             with col2:
-                st.metric("Última Actualización", datetime.now().strftime("%H:%M:%S"))
+                # Frescura real de los datos: fin de la última corrida del ETL (UTC)
+                st.metric("Última Actualización", stats['completed_at'].strftime("%Y-%m-%d %H:%M UTC"))
             with col3:
-                st.metric("Fuente", "Cassandra")
+                st.metric("Fuente", f"Cassandra (ETL {stats['mode']})")
+        else:
+            st.info("ℹ️ No hay metadatos de corridas del ETL para esta tabla")
         
-        # Calcular estadísticas adicionales usando pandas
-        if not df.empty:
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Usuarios Individuals", f"{len(df[df['segment'] == 1]):,}")
-            with col2:
-                st.metric("Usuarios Sellers", f"{len(df[df['segment'] == 2]):,}")
-            with col3:
-                st.metric("Grupo Control", f"{len(df[df['ab_group'] == 'control']):,}")
-            with col4:
-                st.metric("Grupo Treatment", f"{len(df[df['ab_group'] == 'treatment']):,}")
+        # Cubo segmento × grupo A/B: se arma una vez por corrida del ETL y
+        # todas las vistas leen de él
+        cube = build_cube(data_version(rollup, stats), rollup)
+        users_by_segment = cube['by_segment'].set_index('Segmento')['Total_Usuarios']
+        users_by_group = cube['by_group'].set_index('Grupo')['Total_Usuarios']
+
+        # Estadísticas adicionales desde el cubo
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Usuarios Individuals", f"{users_by_segment.get('Individuals', 0):,}")
+        with col2:
+            st.metric("Usuarios Sellers", f"{users_by_segment.get('Sellers', 0):,}")
+        with col3:
+            st.metric("Grupo Control", f"{users_by_group.get('control', 0):,}")
+        with col4:
+            st.metric("Grupo Treatment", f"{users_by_group.get('treatment', 0):,}")
 
-if df is None or df.empty:
+if rollup is None or rollup.empty:
     st.error("❌ No se pudieron cargar los datos desde Cassandra. Verifica la conexión y ejecuta el ETL primero.")
     st.stop()
 
-# Mapear segmentos a nombres
-segment_mapping = {1: 'Individuals', 2: 'Sellers'}
-df['segment_nombre'] = df['segment'].map(segment_mapping)
+totals = cube['totals']
 
 # Mostrar información básica
 st.sidebar.header("📊 Información General")
-st.sidebar.metric("Total Usuarios", f"{len(df):,}")
-st.sidebar.metric("Usuarios Únicos", f"{df['user_id'].nunique():,}")
-
-# Selector de vista en sidebar
-st.sidebar.header("🎯 Navegación")
-view_option = st.sidebar.selectbox(
-    "Selecciona la vista:",
-    ["📈 Dashboard Completo", "🔄 Funnel", "👥 Segmentos", "🔬 A/B Testing", "📊 Datos Raw"]
-)
+st.sidebar.metric("Total Usuarios", f"{totals['total_users']:,}")
+st.sidebar.metric("Cohortes (week_year)", f"{cube['cohorts']:,}")
+
+# Estado del cache de datos
+st.sidebar.header("🗄️ Cache de Datos")
+st.sidebar.metric("Antigüedad del snapshot", f"{data_cache.age:.0f}s")
+st.sidebar.caption(f"Hits: {data_cache.hits:,} · Misses: {data_cache.misses:,} · "
+                   f"Recargas: {data_cache.refreshes:,}")
+if data_cache.refreshing:
+    st.sidebar.caption("🔄 Verificando si hay una corrida nueva del ETL...")
+if data_cache.last_error:
+    st.sidebar.warning(f"⚠️ Falló el último refresco ({data_cache.last_error}); se muestran los datos anteriores")
 
 # 1. ANÁLISIS DEL FUNNEL DE ONBOARDING
 if view_option in ["📈 Dashboard Completo", "🔄 Funnel"]:
     st.header("🔄 Funnel de Onboarding")
 
-    # Calcular métricas del funnel
-    total_users = len(df)
-    activated_users = df['activacion'].sum()
-    setup_users = df['setup'].sum()
-    habit_users = df['habito_calc'].sum()
+    # Métricas del funnel desde los totales del cubo
+    total_users = totals['total_users']
+    activated_users = totals['activated_users']
+    setup_users = totals['setup_users']
+    habit_users = totals['habit_users']
 
     # Crear gráfico de funnel
     fig_funnel = go.Figure(go.Funnel(
@@ -243,21 +334,7 @@ if view_option in ["📈 Dashboard Completo", "👥 Segmentos"]:
     st.header("👥 Análisis por Segmento")
 
     # Métricas por segmento usando nombres
-    segment_metrics = df.groupby('segment_nombre').agg({
-        'user_id': 'count',
-        'activacion': 'sum',
-        'setup': 'sum',
-        'habito_calc': 'sum',
-        'drop': 'sum'
-    }).reset_index()
-
-    segment_metrics.columns = ['Segmento', 'Total_Usuarios', 'Activados', 'Setup', 'Hábito', 'Drop']
-
-    # Calcular tasas
-    segment_metrics['Tasa_Activacion'] = (segment_metrics['Activados'] / segment_metrics['Total_Usuarios']) * 100
-    segment_metrics['Tasa_Setup'] = (segment_metrics['Setup'] / segment_metrics['Total_Usuarios']) * 100
-    segment_metrics['Tasa_Habito'] = (segment_metrics['Hábito'] / segment_metrics['Total_Usuarios']) * 100
-    segment_metrics['Tasa_Drop'] = (segment_metrics['Drop'] / segment_metrics['Total_Usuarios']) * 100
+    segment_metrics = cube['by_segment']
 
     # Mostrar tabla
     st.subheader("Métricas por Segmento")
@@ -278,23 +355,13 @@ if view_option in ["📈 Dashboard Completo", "👥 Segmentos"]:
 # 3. ANÁLISIS A/B TESTING
 if view_option in ["📈 Dashboard Completo", "🔬 A/B Testing"]:
     st.header("🔬 Análisis A/B Testing")
+    st.caption(
+        f"Experimento {ONBOARDING_EXPERIMENT.name}: asignación determinística por hash del "
+        f"user_id ({ONBOARDING_EXPERIMENT.describe()})"
+    )
 
     # Métricas por grupo
-    ab_metrics = df.groupby('ab_group').agg({
-        'user_id': 'count',
-        'activacion': 'sum',
-        'setup': 'sum',
-        'habito_calc': 'sum',
-        'drop': 'sum'
-    }).reset_index()
-
-    ab_metrics.columns = ['Grupo', 'Total_Usuarios', 'Activados', 'Setup', 'Hábito', 'Drop']
-
-    # Calcular tasas
-    ab_metrics['Tasa_Activacion'] = (ab_metrics['Activados'] / ab_metrics['Total_Usuarios']) * 100
-    ab_metrics['Tasa_Setup'] = (ab_metrics['Setup'] / ab_metrics['Total_Usuarios']) * 100
-    ab_metrics['Tasa_Habito'] = (ab_metrics['Hábito'] / ab_metrics['Total_Usuarios']) * 100
-    ab_metrics['Tasa_Drop'] = (ab_metrics['Drop'] / ab_metrics['Total_Usuarios']) * 100
+    ab_metrics = cube['by_group']
 
     # Mostrar tabla de métricas
     st.subheader("Métricas por Grupo")
@@ -336,51 +403,62 @@ if view_option in ["📈 Dashboard Completo", "🔬 A/B Testing"]:
     st.plotly_chart(fig_ab, use_container_width=True)
 
     # Análisis detallado de diferencias
-    if len(ab_metrics) == 2:
+    if cube['ab_diff'] is not None:
         st.subheader("🔍 Análisis de Diferencias")
         
-        control = ab_metrics[ab_metrics['Grupo'] == 'control'].iloc[0]
-        treatment = ab_metrics[ab_metrics['Grupo'] == 'treatment'].iloc[0]
-        
-        activation_diff = treatment['Tasa_Activacion'] - control['Tasa_Activacion']
-        setup_diff = treatment['Tasa_Setup'] - control['Tasa_Setup']
-        habit_diff = treatment['Tasa_Habito'] - control['Tasa_Habito']
-        drop_diff = treatment['Tasa_Drop'] - control['Tasa_Drop']
+        activation_diff = cube['ab_diff']['Tasa_Activacion']
+        setup_diff = cube['ab_diff']['Tasa_Setup']
+        habit_diff = cube['ab_diff']['Tasa_Habito']
+        drop_diff = cube['ab_diff']['Tasa_Drop']
+
+        # Intervalo y p-valor de cada diferencia (fila "Total" de la significancia)
+        significance = cube['significance']
+        overall = significance[significance['segment_nombre'] == 'Total'].set_index('metric')
+
+        def significance_label(metric):
+            r = overall.loc[metric]
+            return (f"IC 95%: [{r['ci_low'] * 100:+.2f}, {r['ci_high'] * 100:+.2f}] pp · "
+                    f"bootstrap: [{r['boot_low'] * 100:+.2f}, {r['boot_high'] * 100:+.2f}] pp · "
+                    f"p = {r['p_value']:.3f}")
         
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             st.metric("Activación (Tratamiento - Control)", f"{activation_diff:+.2f}%")
+            st.caption(significance_label('activacion'))
             
         with col2:
             st.metric("Setup (Tratamiento - Control)", f"{setup_diff:+.2f}%")
+            st.caption(significance_label('setup'))
             
         with col3:
             st.metric("Hábito (Tratamiento - Control)", f"{habit_diff:+.2f}%")
+            st.caption(significance_label('habito'))
             
         with col4:
             st.metric("Drop (Tratamiento - Control)", f"{drop_diff:+.2f}%")
+            st.caption(significance_label('drop'))
+
+        # Detalle por segmento (diferencias e intervalos en puntos porcentuales)
+        st.subheader("📐 Significancia por Segmento")
+        significance_table = significance.rename(columns={'segment_nombre': 'Segmento', 'metric': 'Métrica'})
+        for column in ['control_rate', 'treatment_rate', 'diff', 'ci_low', 'ci_high', 'boot_low', 'boot_high']:
+            significance_table[column] = significance_table[column] * 100
+        st.dataframe(
+            significance_table[['Segmento', 'Métrica', 'control_users', 'treatment_users', 'control_rate',
+                                'treatment_rate', 'diff', 'ci_low', 'ci_high', 'boot_low', 'boot_high',
+                                'p_value', 'significant']].round(3),
+            use_container_width=True
+        )
+        st.caption("Test z de dos proporciones (α = 0.05), IC de Newcombe (Wilson) y bootstrap paramétrico con "
+                   "10.000 remuestreos. Con el split 5%/95% el grupo control es chico y los intervalos son amplios.")
 
 # 4. ANÁLISIS POR SEGMENTO Y A/B TESTING
 if view_option in ["📈 Dashboard Completo", "👥 Segmentos", "🔬 A/B Testing"]:
     st.header("👥 Análisis por Segmento y A/B Testing")
 
     # Métricas por segmento y grupo A/B
-    segment_ab_metrics = df.groupby(['segment_nombre', 'ab_group']).agg({
-        'user_id': 'count',
-        'activacion': 'sum',
-        'setup': 'sum',
-        'habito_calc': 'sum',
-        'drop': 'sum'
-    }).reset_index()
-
-    segment_ab_metrics.columns = ['Segmento', 'Grupo', 'Total_Usuarios', 'Activados', 'Setup', 'Hábito', 'Drop']
-
-    # Calcular tasas
-    segment_ab_metrics['Tasa_Activacion'] = (segment_ab_metrics['Activados'] / segment_ab_metrics['Total_Usuarios']) * 100
-    segment_ab_metrics['Tasa_Setup'] = (segment_ab_metrics['Setup'] / segment_ab_metrics['Total_Usuarios']) * 100
-    segment_ab_metrics['Tasa_Habito'] = (segment_ab_metrics['Hábito'] / segment_ab_metrics['Total_Usuarios']) * 100
-    segment_ab_metrics['Tasa_Drop'] = (segment_ab_metrics['Drop'] / segment_ab_metrics['Total_Usuarios']) * 100
+    segment_ab_metrics = cube['by_segment_group']
 
     # Mostrar tabla
     st.subheader("Métricas por Segmento y Grupo A/B")
@@ -404,15 +482,15 @@ if view_option in ["📈 Dashboard Completo", "🔬 A/B Testing"]:
     st.header("📈 Análisis Detallado del Hábito")
 
     # Distribución del hábito
-    habit_distribution = df['habito_calc'].value_counts()
-    habit_distribution_pct = df['habito_calc'].value_counts(normalize=True) * 100
+    habit_users = totals['habit_users']
+    total_users = totals['total_users']
 
     col1, col2 = st.columns(2)
 
     with col1:
         st.subheader("Distribución del Hábito")
         fig_habit_dist = px.pie(
-            values=habit_distribution.values,
+            values=[total_users - habit_users, habit_users],
             names=['Sin Hábito', 'Con Hábito'],
             title="Distribución de Usuarios por Hábito"
         )
@@ -420,73 +498,127 @@ if view_option in ["📈 Dashboard Completo", "🔬 A/B Testing"]:
 
     with col2:
         st.subheader("Estadísticas del Hábito")
-        habit_users = df['habito_calc'].sum()
-        total_users = len(df)
         habit_rate = (habit_users / total_users) * 100
         
         st.metric("Usuarios con Hábito", f"{habit_users:,}", f"{habit_rate:.1f}%")
         st.metric("Usuarios sin Hábito", f"{total_users - habit_users:,}", f"{100-habit_rate:.1f}%")
         
         # Hábito por grupo A/B
-        habit_by_group = df.groupby('ab_group')['habito_calc'].agg(['sum', 'count']).reset_index()
-        habit_by_group['rate'] = (habit_by_group['sum'] / habit_by_group['count']) * 100
-        
         st.write("**Tasa de Hábito por Grupo A/B:**")
-        for _, row in habit_by_group.iterrows():
-            st.write(f"- {row['ab_group']}: {row['rate']:.1f}%")
+        for group, rate in zip(cube['by_group']['Grupo'], cube['by_group']['Tasa_Habito']):
+            st.write(f"- {group}: {rate:.1f}%")
 
 # 6. DATOS RAW
 if view_option == "📊 Datos Raw":
     st.header("📋 Datos Raw")
 
-    # Filtros
+    # Filtros (las opciones salen del cubo, sin leer la tabla por usuario)
+    groups = list(cube['by_group']['Grupo'])
     col1, col2, col3 = st.columns(3)
 
     with col1:
-        selected_group = st.selectbox("Filtrar por Grupo A/B", ['Todos'] + list(df['ab_group'].unique()))
+        selected_group = st.selectbox("Filtrar por Grupo A/B", ['Todos'] + groups)
 
     with col2:
-        selected_segment = st.selectbox("Filtrar por Segmento", ['Todos'] + list(df['segment_nombre'].unique()))
+        selected_segment = st.selectbox("Filtrar por Segmento", ['Todos'] + list(cube['by_segment']['Segmento']))
 
     with col3:
-        selected_metric = st.selectbox("Filtrar por Métrica", ['Todos', 'Con Activación', 'Con Setup', 'Con Hábito', 'Sin Drop'])
+        selected_metric = st.selectbox("Filtrar por Métrica", ['Todos'] + list(METRIC_FILTERS))
+
+    # Los filtros se resuelven en Cassandra: grupo y segmento eligen las
+    # particiones, la métrica se filtra dentro de ellas
+    query_groups = groups if selected_group == 'Todos' else [selected_group]
+    query_segments = [segment for segment, name in segment_mapping.items()
+                      if selected_segment in ('Todos', name)]
+    filter_column, filter_value, count_column = METRIC_FILTERS.get(selected_metric, (None, None, None))
+    parameters = [query_segments, query_groups] + ([filter_value] if filter_column else [])
+
+    # Cantidad de registros que cumplen los filtros, desde el cubo
+    matching = cube['by_segment_group']
+    matching = matching[matching['Grupo'].isin(query_groups) &
+                        matching['Segmento'].isin([segment_mapping[s] for s in query_segments])]
+    if filter_column == 'drop':
+        matching_rows = int((matching['Total_Usuarios'] - matching['Drop']).sum())
+    else:
+        matching_rows = int(matching[count_column or 'Total_Usuarios'].sum())
+
+    # Pila de paging_state de las páginas visitadas (se reinicia al cambiar
+    # los filtros); la primera página arranca sin paging_state
+    filter_key = (selected_group, selected_segment, selected_metric, by_group_table_name)
+    if st.session_state.get('raw_filter_key') != filter_key:
+        st.session_state['raw_filter_key'] = filter_key
+        st.session_state['raw_page_states'] = [None]
+        st.session_state['raw_next_state'] = None
 
-    # Aplicar filtros
-    filtered_df = df.copy()
+    try:
+        conn = get_connection(cassandra_host, cassandra_port, keyspace_name)
+        statement = conn.prepare(group_page_query(by_group_table_name, filter_column))
+        page_df, next_state = fetch_page(conn.columnar_session, statement, parameters,
+                                         paging_state=st.session_state['raw_page_states'][-1])
+    except Exception as e:
+        st.error(f"❌ No se pudieron leer los datos por usuario desde Cassandra: {str(e)}")
+        st.stop()
+    st.session_state['raw_next_state'] = next_state
 
-    if selected_group != 'Todos':
-        filtered_df = filtered_df[filtered_df['ab_group'] == selected_group]
+    def next_page():
+        st.session_state['raw_page_states'].append(st.session_state['raw_next_state'])
 
-    if selected_segment != 'Todos':
-        filtered_df = filtered_df[filtered_df['segment_nombre'] == selected_segment]
+    def previous_page():
+        st.session_state['raw_page_states'].pop()
 
-    if selected_metric == 'Con Activación':
-        filtered_df = filtered_df[filtered_df['activacion'] == 1]
-    elif selected_metric == 'Con Setup':
-        filtered_df = filtered_df[filtered_df['setup'] == 1]
-    elif selected_metric == 'Con Hábito':
-        filtered_df = filtered_df[filtered_df['habito_calc'] == 1]
-    elif selected_metric == 'Sin Drop':
-        filtered_df = filtered_df[filtered_df['drop'] == 0]
+    page_number = len(st.session_state['raw_page_states'])
+    first_row = (page_number - 1) * PAGE_SIZE
 
     # Mostrar estadísticas de filtros
-    st.info(f"📊 Mostrando {len(filtered_df):,} de {len(df):,} registros")
+    st.info(f"📊 Mostrando {first_row + 1 if len(page_df) else 0:,}–{first_row + len(page_df):,} "
+            f"de {matching_rows:,} registros (página {page_number})")
 
     # Mostrar solo columnas relevantes en datos raw
+    page_df['segment_nombre'] = page_df['segment'].map(segment_mapping)
     display_columns = ['user_id', 'segment_nombre', 'ab_group', 'drop', 'activacion', 'setup', 'habito_calc']
-    st.dataframe(filtered_df[display_columns], use_container_width=True)
+    st.dataframe(page_df[display_columns], use_container_width=True)
 
-    # Botón para descargar datos filtrados
+    col1, col2 = st.columns(2)
+    with col1:
+        st.button("⬅️ Anterior", on_click=previous_page, disabled=page_number == 1)
+    with col2:
+        st.button("Siguiente ➡️", on_click=next_page, disabled=next_state is None)
+
+    # Exportación de los datos filtrados (todas las páginas): cada página
+    # leída de Cassandra se escribe al archivo temporal apenas llega. Por
+    # defecto el formato más compacto (Parquet, o CSV con gzip sin pyarrow).
+    export_format = st.radio("Formato de exportación", available_formats(), horizontal=True)
+    # Las exportaciones vencidas (de cualquier sesión) se borran en cada
+    # ejecución de la página, no solo al terminar el proceso
+    remove_expired(EXPORT_DIR, EXPORT_TTL_SECONDS)
     if st.button("📥 Descargar Datos Filtrados"):
-        csv = filtered_df[display_columns].to_csv(index=False)
-        st.download_button(
-            label="💾 Descargar CSV",
-            data=csv,
-            file_name=f"fintech_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-            mime="text/csv"
+        # Borrar la exportación anterior de esta sesión
+        previous_export = st.session_state.pop('raw_export_path', None)
+        if previous_export and os.path.exists(previous_export):
+            os.remove(previous_export)
+
+        with st.spinner("Exportando..."):
+            pages = (page.assign(segment_nombre=page['segment'].map(segment_mapping))
+                     for page in iter_pages(conn.columnar_session, statement, parameters))
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            export_path, exported_rows = export_chunks(pages, display_columns, export_format, EXPORT_DIR)
+        st.session_state['raw_export_path'] = export_path
+        atexit.register(lambda path=export_path: os.path.exists(path) and os.remove(path))
+
+        st.caption(f"{exported_rows:,} registros, {os.path.getsize(export_path) / 1024 ** 2:.1f} MB "
+                   f"(el enlace vence en {EXPORT_TTL_SECONDS // 60} minutos)")
+        # El archivo se descarga desde disco (ruta estática): el proceso de
+        # Streamlit no lo lee ni lo manda por el websocket
+        file_name = f"fintech_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        st.markdown(
+            f'<a href="{EXPORT_URL}/{os.path.basename(export_path)}" download="{file_name}">'
+            f'💾 Descargar {export_format.upper()}</a>',
+            unsafe_allow_html=True
         )
 
 # Footer
 st.markdown("---")
 st.markdown("*Dashboard conectado a Cassandra - Fintech Analytics*")
-st.markdown(f"*Última actualización: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}*") 
\ No newline at end of file
+if stats:
+    st.markdown(f"*Última actualización de los datos: {stats['completed_at'].strftime('%Y-%m-%d %H:%M:%S')} UTC "
+                f"(corrida {stats['run_id']})*") 
\ No newline at end of file
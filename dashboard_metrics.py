@@ -0,0 +1,74 @@
+"""
+Agregaciones del dashboard sobre el rollup del ETL.
+
+Funciones puras de pandas (sin Streamlit), así el dashboard las memoiza y
+los benchmarks pueden medirlas directamente.
+"""
+from ab_stats import ab_significance
+
+# Columnas del rollup que publica el ETL (segmento × grupo A/B × cohorte)
+ROLLUP_COLUMNS = ['segment', 'ab_group', 'week_year', 'total_users', 'activated_users',
+                  'setup_users', 'habit_users', 'drop_users']
+COUNT_COLUMNS = ROLLUP_COLUMNS[3:]
+
+# Mapeo de segmentos a nombres
+SEGMENT_NAMES = {1: 'Individuals', 2: 'Sellers'}
+
+
+def rollup_from_rows(df):
+    """
+    Construye el rollup a partir de la tabla por usuario (fallback cuando el
+    ETL todavía no publicó la tabla de rollup). Sin week_year se agrupa todo
+    en una única cohorte.
+    """
+    rollup = df.assign(week_year=0).groupby(['segment', 'ab_group', 'week_year'], observed=True).agg(
+        total_users=('user_id', 'count'),
+        activated_users=('activacion', 'sum'),
+        setup_users=('setup', 'sum'),
+        habit_users=('habito_calc', 'sum'),
+        drop_users=('drop', 'sum')
+    ).reset_index()
+    return rollup[ROLLUP_COLUMNS]
+
+
+def group_metrics(rollup, by, labels):
+    """
+    Suma el rollup por las columnas ``by`` y calcula las tasas de cada grupo
+    """
+    metrics = rollup.groupby(by, observed=True)[COUNT_COLUMNS].sum().reset_index()
+    metrics.columns = labels + ['Total_Usuarios', 'Activados', 'Setup', 'Hábito', 'Drop']
+
+    metrics['Tasa_Activacion'] = (metrics['Activados'] / metrics['Total_Usuarios']) * 100
+    metrics['Tasa_Setup'] = (metrics['Setup'] / metrics['Total_Usuarios']) * 100
+    metrics['Tasa_Habito'] = (metrics['Hábito'] / metrics['Total_Usuarios']) * 100
+    metrics['Tasa_Drop'] = (metrics['Drop'] / metrics['Total_Usuarios']) * 100
+    return metrics
+
+
+def compute_cube(rollup, segment_names=SEGMENT_NAMES):
+    """
+    Cubo segmento × grupo A/B (el rollup sumado sobre cohortes) y las tablas
+    derivadas: totales, métricas por segmento, por grupo y por segmento ×
+    grupo, diferencias tratamiento - control y su significancia.
+    """
+    cube = rollup.groupby(['segment', 'ab_group'], observed=True)[COUNT_COLUMNS].sum().reset_index()
+    cube['segment_nombre'] = cube['segment'].map(segment_names)
+
+    by_group = group_metrics(cube, ['ab_group'], ['Grupo'])
+    rates = by_group.set_index('Grupo')[['Tasa_Activacion', 'Tasa_Setup', 'Tasa_Habito', 'Tasa_Drop']]
+    ab_diff = None
+    significance = None
+    if {'control', 'treatment'} <= set(rates.index):
+        ab_diff = (rates.loc['treatment'] - rates.loc['control']).to_dict()
+        # Test z, IC de Newcombe y bootstrap por segmento y en total (sobre conteos)
+        significance = ab_significance(cube, by=('segment_nombre',))
+
+    return {
+        'totals': {c: int(v) for c, v in cube[COUNT_COLUMNS].sum().items()},
+        'cohorts': int(rollup['week_year'].nunique()),
+        'by_segment': group_metrics(cube, ['segment_nombre'], ['Segmento']),
+        'by_group': by_group,
+        'by_segment_group': group_metrics(cube, ['segment_nombre', 'ab_group'], ['Segmento', 'Grupo']),
+        'ab_diff': ab_diff,
+        'significance': significance,
+    }
@@ -0,0 +1,128 @@
+"""
+Exportación por bloques de los datos filtrados del dashboard.
+
+En lugar de armar el CSV completo como string en memoria, cada bloque (por
+ejemplo una página leída de Cassandra) se escribe a un
+archivo temporal apenas llega, así la memoria usada depende del tamaño del
+bloque y no del resultado. Formatos: Parquet (solo si ``pyarrow`` está
+instalado; no es una dependencia obligatoria), CSV comprimido con gzip y
+CSV. ``available_formats()`` los devuelve del más compacto al menos
+compacto: el primero es el formato por defecto.
+
+Los archivos exportados se nombran con ``EXPORT_PREFIX``;
+``remove_expired`` borra los que superan una antigüedad máxima.
+"""
+import gzip
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet opcional
+    pa = None
+    pq = None
+
+CSV = "csv"
+CSV_GZIP = "csv.gz"
+PARQUET = "parquet"
+
+EXPORT_PREFIX = "fintech_export_"
+
+MIME_TYPES = {
+    CSV: "text/csv",
+    CSV_GZIP: "application/gzip",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def available_formats():
+    return ([PARQUET] if pq is not None else []) + [CSV_GZIP, CSV]
+
+
+def _plain(chunk):
+    # Las categorías de cada página pueden diferir: se exportan los valores
+    categorical = [c for c in chunk.columns if isinstance(chunk[c].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return chunk
+    return chunk.assign(**{c: chunk[c].astype(chunk[c].cat.categories.dtype) for c in categorical})
+
+
+def _write_csv(chunks, path, columns, compress):
+    opener = gzip.open if compress else open
+    rows = 0
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        pd.DataFrame(columns=columns).to_csv(f, index=False)
+        for chunk in chunks:
+            chunk[columns].to_csv(f, header=False, index=False)
+            rows += len(chunk)
+    return rows
+
+
+def _write_parquet(chunks, path, columns):
+    writer = None
+    rows = 0
+    try:
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            table = pa.Table.from_pandas(_plain(chunk[columns]), preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression="snappy")
+            writer.write_table(table.cast(writer.schema))
+            rows += len(chunk)
+        if writer is None:
+            pq.write_table(pa.table({c: pa.array([], pa.string()) for c in columns}), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def export_chunks(chunks, columns, fmt=CSV_GZIP, directory=None):
+    """
+    Escribe los bloques ``chunks`` (iterable de DataFrames) en un archivo
+    temporal con formato ``fmt``. Devuelve (ruta, filas exportadas); quien
+    llama es responsable de borrar el archivo.
+    """
+    if fmt == PARQUET and pq is None:
+        raise ValueError("La exportación a Parquet requiere pyarrow")
+    if fmt not in MIME_TYPES:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}", prefix=EXPORT_PREFIX, dir=directory)
+    os.close(fd)
+    try:
+        if fmt == PARQUET:
+            rows = _write_parquet(chunks, path, columns)
+        else:
+            rows = _write_csv(chunks, path, columns, compress=fmt == CSV_GZIP)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, rows
+
+
+def remove_expired(directory, max_age_seconds, now=None):
+    """
+    Borra las exportaciones de ``directory`` modificadas hace más de
+    ``max_age_seconds`` segundos. Devuelve cuántas borró.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    now = time.time() if now is None else now
+    removed = 0
+    for entry in os.scandir(directory):
+        if not entry.is_file() or not entry.name.startswith(EXPORT_PREFIX):
+            continue
+        try:
+            if now - entry.stat().st_mtime > max_age_seconds:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            # Otra sesión la borró al mismo tiempo
+            pass
+    return removed
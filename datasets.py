@@ -0,0 +1,87 @@
+"""
+Registro de los datasets de entrada del ETL.
+
+Cada input se declara una sola vez en ``staging.SOURCES`` (CSV fuente,
+esquema y opciones del lector). Acá se declara qué columnas de cada input
+necesita cada salida del ETL (``OUTPUTS``). El registro se arma con las
+salidas pedidas y materializa un dataset recién cuando se lo pide por
+primera vez:
+
+- un input que ninguna salida pedida usa no se lee, no se convierte a
+  Parquet y no se cuenta (``dim_users`` sin ``--enrich-users``),
+- cada input se lee una sola vez, con la unión de las columnas de las
+  salidas pedidas.
+
+Con Spark el dataset sale del staging (``staging.load_dataset``, con las
+columnas de partición, que se leen de los directorios): el CSV se convierte
+a Parquet recién en el primer ``get`` del dataset, si cambió desde la
+última corrida. Con el motor pandas se lee el CSV
+(``pandas_engine.read_dataset``).
+"""
+import pandas_engine
+from staging import load_dataset, partition_column, stage_dataset, staged_path
+
+# salida -> dataset -> columnas que usa
+OUTPUTS = {
+    # user_onboarding_metrics_clean, rollup, análisis A/B y respaldo CSV
+    "metrics": {
+        "onboarding": ["user_id", "first_login_dt", "week_year", "activacion", "setup", "return"],
+        "transactions": ["user_id", "transaction_dt", "type", "segment"],
+    },
+    # Métricas con el tipo y rubro del usuario (broadcast de dim_users)
+    "user_enrichment": {
+        "users": ["user_id", "type", "rubro"],
+    },
+}
+
+
+def required_columns(outputs):
+    """
+    Datasets que necesitan ``outputs`` y sus columnas (dataset -> columnas)
+    """
+    columns = {}
+    for output in outputs:
+        for name, output_columns in OUTPUTS[output].items():
+            merged = columns.setdefault(name, [])
+            merged.extend(column for column in output_columns if column not in merged)
+    return columns
+
+
+class DatasetRegistry:
+    def __init__(self, outputs, spark=None):
+        unknown = sorted(set(outputs) - set(OUTPUTS))
+        if unknown:
+            raise ValueError(f"Salidas desconocidas: {', '.join(unknown)}")
+        self.outputs = tuple(outputs)
+        self.spark = spark
+        self.columns = required_columns(self.outputs)
+        self._loaded = {}
+
+    @property
+    def datasets(self):
+        return list(self.columns)
+
+    def requires(self, name):
+        return name in self.columns
+
+    def get(self, name):
+        """
+        DataFrame del dataset ``name`` (Spark o pandas según el motor). Se
+        carga la primera vez que se pide.
+        """
+        if not self.requires(name):
+            raise KeyError(f"Ninguna de las salidas pedidas ({', '.join(self.outputs)}) usa {name}")
+        if name not in self._loaded:
+            columns = self.columns[name]
+            if self.spark is not None:
+                if stage_dataset(self.spark, name):
+                    print(f"- {name}: CSV convertido a Parquet en {staged_path(name)}")
+                else:
+                    print(f"- {name}: usando Parquet de staging")
+                partition = partition_column(name)
+                if partition:
+                    columns = columns + [partition]
+                self._loaded[name] = load_dataset(self.spark, name, columns)
+            else:
+                self._loaded[name] = pandas_engine.read_dataset(name, columns)
+        return self._loaded[name]
@@ -1,44 +1,177 @@
+import argparse
+import os
+from collections import Counter
+from datetime import datetime, timezone
+
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, to_date, countDistinct, count, when, rand, lit, sum as F_sum
-from pyspark.sql.types import DateType
+from pyspark.sql.functions import col, to_date, count, when, lit, sum as F_sum, \
+    max as F_max, broadcast
 import pandas as pd
-from cassandra.cluster import Cluster
-
-# Configurar Spark
-spark = SparkSession.builder \
-    .appName("Fintech ETL Clean") \
-    .getOrCreate()
+from cassandra_writer import CassandraWriter, build_cluster, write_dataframe_by_partition
+from datasets import DatasetRegistry
+from incremental import affected_cohorts, load_checkpoint, save_checkpoint, transaction_watermark
+from run_report import RunReport
+from stage_profiler import StageProfiler
+from ab_assignment import EXPERIMENTS, assign_groups
+from habit_engine import compute_user_metrics, habit_window_ranges
+from ab_stats import ab_significance
+import pandas_engine
+from pandas_engine import DEFAULT_MAX_INPUT_MB, select_engine
+
+# Destino en Cassandra (los benchmarks lo apuntan a su propio keyspace)
+CASSANDRA_HOST = os.environ.get("FINTECH_CASSANDRA_HOST", "localhost")
+CASSANDRA_PORT = int(os.environ.get("FINTECH_CASSANDRA_PORT", "9042"))
+CASSANDRA_KEYSPACE = os.environ.get("FINTECH_CASSANDRA_KEYSPACE", "fintech_analytics")
+METRICS_TABLE = "user_onboarding_metrics_clean"
+ROLLUP_TABLE = "user_onboarding_rollup"
+# Misma tabla de métricas con la forma de las consultas de "Datos Raw"
+BY_GROUP_TABLE = "user_onboarding_metrics_by_group"
+RUN_METADATA_TABLE = "etl_run_metadata"
+# Respaldo CSV: particionado por cohorte (week_year) en los dos modos (full
+# reescribe todas las cohortes, incremental solo las recalculadas) y una copia
+# plana del dataset completo que se regenera en cada corrida
+METRICS_CSV_PATH = "artifacts/user_onboarding_metrics_clean_by_cohort"
+METRICS_FLAT_CSV_PATH = "artifacts/user_onboarding_metrics_clean"
+# Métricas enriquecidas (--enrich-users), con el mismo layout por cohorte
+ENRICHED_PATH = "artifacts/user_onboarding_metrics_enriched_by_cohort"
+
+parser = argparse.ArgumentParser(description="ETL de onboarding - Fintech Analytics")
+parser.add_argument(
+    "--write-mode",
+    choices=["partition", "driver"],
+    default="partition",
+    help="partition: cada partición de Spark escribe en Cassandra desde su executor; "
+         "driver: se recolecta todo con toPandas() y se escribe desde el driver",
+)
+parser.add_argument(
+    "--mode",
+    choices=["full", "incremental"],
+    default="full",
+    help="full: recalcula todo y recarga la tabla (TRUNCATE); "
+         "incremental: recalcula solo las cohortes (week_year) afectadas y hace upsert",
+)
+parser.add_argument(
+    "--profile-stages",
+    action="store_true",
+    help="persiste y cuenta el resultado de cada etapa para que su costo no se "
+         "mezcle con el de la siguiente (acciones y cache extra; solo para diagnóstico)",
+)
+parser.add_argument(
+    "--engine",
+    choices=["auto", "spark", "pandas"],
+    default="auto",
+    help="spark: SparkSession; pandas: en memoria, sin JVM (solo --mode full); "
+         "auto: pandas si los CSV de entrada suman hasta --pandas-max-mb",
+)
+parser.add_argument(
+    "--pandas-max-mb",
+    type=float,
+    default=DEFAULT_MAX_INPUT_MB,
+    help="tamaño máximo de los CSV de entrada para que --engine auto elija pandas",
+)
+parser.add_argument(
+    "--enrich-users",
+    action="store_true",
+    help="agrega el tipo y rubro de dim_users a las métricas (broadcast) y las "
+         "guarda en artifacts/user_onboarding_metrics_enriched_by_cohort; sin esta opción "
+         "dim_users no se lee",
+)
+args = parser.parse_args()
+
+# Salidas pedidas: el registro solo carga los inputs que estas usan
+outputs = ["metrics"] + (["user_enrichment"] if args.enrich_users else [])
+
+# Motor de cálculo: con inputs chicos levantar la JVM cuesta más que el cálculo
+engine = select_engine(args.engine, args.pandas_max_mb)
+if engine == "pandas" and args.mode == "incremental":
+    if args.engine == "pandas":
+        parser.error("el motor pandas solo soporta --mode full")
+    engine = "spark"
+if engine == "pandas":
+    # Sin Spark las métricas ya están en el driver
+    args.write_mode = "driver"
+
+spark = None
+if engine == "spark":
+    # Configurar Spark
+    spark = SparkSession.builder \
+        .appName("Fintech ETL Clean") \
+        .getOrCreate()
+
+    # Los executors necesitan el escritor de Cassandra para el modo por partición
+    spark.sparkContext.addPyFile(os.path.join(os.path.dirname(os.path.abspath(__file__)), "cassandra_writer.py"))
 
 print("🚀 ETL LIMPIO - FINANCIAL TECHNOLOGY")
 print("=" * 50)
+print(f"Motor de cálculo: {engine}")
+
+# Conteos y estadísticas de filtros se observan durante la ejecución real
+report = RunReport(mode=args.mode, write_mode=args.write_mode, engine=engine)
+# Tiempo, tareas, shuffle y spill por etapa lógica (job groups de Spark)
+profiler = StageProfiler(spark, materialize=args.profile_stages)
+# Cada input se carga la primera vez que se pide, y solo si una salida pedida lo usa
+registry = DatasetRegistry(outputs, spark)
+print(f"Salidas: {', '.join(outputs)} (inputs: {', '.join(registry.datasets)})")
 
 # 1. CARGAR DATASETS
 print("\n📊 ETAPA 1: CARGA DE DATOS")
+profiler.start("load")
+
+if engine == "spark":
+    # Cargar datasets leyendo solo las columnas que usa el ETL (las
+    # transacciones incluyen transaction_date, la partición ya parseada en
+    # staging). Cada dataset se convierte a Parquet (solo si cambió desde la
+    # última corrida) al pedirlo por primera vez: dim_users recién en el
+    # enriquecimiento, y nunca si el modo incremental termina antes.
+    df_onboarding = registry.get("onboarding")
+    df_transactions = registry.get("transactions")
+
+    if args.mode == "incremental":
+        # El modo incremental necesita el watermark antes de elegir cohortes
+        watermark = transaction_watermark(df_transactions)
+        checkpoint = load_checkpoint()
+        cohorts_to_process, all_cohorts = affected_cohorts(df_onboarding, df_transactions, checkpoint, watermark)
+        print(f"\n♻️ MODO INCREMENTAL (watermark anterior: "
+              f"{checkpoint['last_transaction_dt'] if checkpoint else 'ninguno'}, actual: {watermark})")
+        print(f"- Cohortes afectadas: {sorted(cohorts_to_process)} de {len(all_cohorts)}")
+
+        if not cohorts_to_process:
+            print("✅ No hay cohortes afectadas, nada que recalcular")
+            save_checkpoint(watermark, all_cohorts)
+            profiler.stop()
+            spark.stop()
+            raise SystemExit(0)
+
+        # Solo los usuarios de las cohortes afectadas (y todas sus transacciones,
+        # que hacen falta para resolver su segmento)
+        df_onboarding = df_onboarding.filter(col("week_year").isin(sorted(cohorts_to_process)))
+        df_transactions = df_transactions.join(df_onboarding.select("user_id"), "user_id", "left_semi")
+
+    # Conteos de entrada como métricas observadas (sin acciones extra)
+    # Los usuarios únicos se cuentan exactos en el filtro de segmento (etapa
+    # 6), después de deduplicar: las métricas observadas no admiten DISTINCT
+    df_onboarding = report.observe(df_onboarding, "onboarding", rows=count(lit(1)))
+    df_transactions = report.observe(
+        df_transactions, "transactions",
+        rows=count(lit(1)),
+        # Como texto (yyyy-MM-dd): Observation.get no convierte fechas a Python
+        max_transaction_dt=F_max("transaction_date").cast("string"),
+    )
 
-# Cargar datasets
-df_onboarding = spark.read.option("header", True).option("inferSchema", True).csv("lk_onboarding.csv")
-df_users = spark.read.option("header", True).option("inferSchema", True).csv("dim_users.csv")
-df_transactions = spark.read.option("header", True).option("inferSchema", True).csv("bt_users_transactions.csv")
-
-print(f"Datasets cargados:")
-print(f"- Onboarding: {df_onboarding.count()} registros")
-print(f"- Users: {df_users.count()} registros")
-print(f"- Transactions: {df_transactions.count()} registros")
-
-# Análisis inicial de usuarios
-onboarding_users = df_onboarding.select("user_id").distinct()
-transaction_users = df_transactions.select("user_id").distinct()
-
-print(f"\n📈 ANÁLISIS INICIAL DE USUARIOS:")
-print(f"- Usuarios únicos en onboarding: {onboarding_users.count()}")
-print(f"- Usuarios únicos con transacciones: {transaction_users.count()}")
-
-# Usuarios sin transacciones (importante para el funnel)
-users_without_transactions = onboarding_users.join(transaction_users, "user_id", "left_anti")
-print(f"- Usuarios sin transacciones: {users_without_transactions.count()}")
+    df_onboarding = profiler.checkpoint(df_onboarding)
+    df_transactions = profiler.checkpoint(df_transactions)
+else:
+    # Sin JVM: se leen los CSV directamente (el staging a Parquet es de Spark)
+    df_onboarding = registry.get("onboarding")
+    df_transactions = registry.get("transactions")
+    max_transaction_dt = df_transactions["transaction_dt"].max()
+    report.record("onboarding", rows=len(df_onboarding))
+    report.record("transactions", rows=len(df_transactions),
+                  max_transaction_dt=None if pd.isna(max_transaction_dt) else max_transaction_dt.date().isoformat())
 
 # 2. LIMPIEZA Y PREPARACIÓN
 print("\n🧹 ETAPA 2: LIMPIEZA Y PREPARACIÓN")
+profiler.start("clean")
 
 # Mantener TODOS los usuarios de onboarding (incluyendo los sin transacciones)
 df_onboarding_clean = df_onboarding
@@ -46,129 +179,185 @@ df_onboarding_clean = df_onboarding
 # Para transacciones, solo limpiar inconsistencias de segmentos
 df_transactions_clean = df_transactions
 
-# Resolver inconsistencias de segmentos (solo para usuarios con transacciones)
-segment_fix = df_transactions_clean.groupBy("user_id", "segment").agg(
-    count("*").alias("segment_count")
-).orderBy("user_id", col("segment_count").desc())
-
-from pyspark.sql.window import Window
-from pyspark.sql.functions import row_number
-
-window_spec = Window.partitionBy("user_id").orderBy(col("segment_count").desc())
-segment_fix = segment_fix.withColumn("rn", row_number().over(window_spec))
-segment_fix = segment_fix.filter(col("rn") == 1).select("user_id", "segment")
+# Las inconsistencias de segmentos se resuelven en la etapa de métricas, con
+# una agregación por usuario sobre todo su historial (habit_engine)
 
 # 3. FORMATEAR FECHAS
 print("\n📅 FORMATEANDO FECHAS...")
-
-for colname in ["first_login_dt", "activacion_dt", "habito_dt", "setup_dt"]:
-    df_onboarding_clean = df_onboarding_clean.withColumn(colname, to_date(col(colname), "yyyy-MM-dd"))
-
-df_transactions_clean = df_transactions_clean.withColumn("transaction_dt", to_date(col("transaction_dt"), "yyyy-MM-dd"))
+profiler.start("dates")
+
+# Solo first_login_dt se usa aguas abajo (ventana de hábito); el resto de
+# las fechas ya no se leen del staging
+if engine == "spark":
+    df_onboarding_clean = df_onboarding_clean.withColumn("first_login_dt", to_date(col("first_login_dt"), "yyyy-MM-dd"))
+
+    # La fecha de la transacción es la columna de partición: no se parsea en
+    # cada corrida y los filtros por fecha descartan directorios
+    df_transactions_clean = df_transactions_clean.withColumn("transaction_dt", col("transaction_date")) \
+        .drop("transaction_date")
+    df_transactions_clean = profiler.checkpoint(df_transactions_clean)
+else:
+    df_onboarding_clean, df_transactions_clean = pandas_engine.format_dates(
+        df_onboarding_clean, df_transactions_clean
+    )
 
 # 4. ASIGNAR GRUPOS A/B TESTING
 print("\n🔬 ASIGNANDO GRUPOS A/B TESTING...")
+profiler.start("ab_assignment")
 
-# Crear grupos: 5% control, 95% tratamiento
-df_onboarding_clean = df_onboarding_clean.withColumn("random", rand())
-df_onboarding_clean = df_onboarding_clean.withColumn(
-    "ab_group", 
-    when(col("random") <= 0.05, "control").otherwise("treatment")
-)
+# Grupos determinísticos por hash del user_id (5% control, 95% tratamiento):
+# la misma asignación en cada corrida, partición y modo incremental
+if engine == "spark":
+    df_onboarding_clean = profiler.checkpoint(assign_groups(df_onboarding_clean))
+else:
+    df_onboarding_clean = pandas_engine.assign_groups(df_onboarding_clean)
+for experiment in EXPERIMENTS:
+    print(f"- {experiment.name} ({experiment.column}): {experiment.describe()}")
 
-ab_distribution = df_onboarding_clean.groupBy("ab_group").count()
-print("Distribución A/B Testing:")
-ab_distribution.show()
+# La distribución A/B se muestra en el análisis A/B (etapa 7), sobre el cache
 
 # 5. CALCULAR MÉTRICAS DE NEGOCIO
 print("\n📈 ETAPA 3: TRANSFORMACIÓN Y CÁLCULO DE MÉTRICAS")
-
-# Unir datos - LEFT JOIN para mantener todos los usuarios de onboarding
-df = df_onboarding_clean.join(
-    segment_fix, 
-    on="user_id", 
-    how="left"
-)
+profiler.start("habit")
+
+# Segmento (mayoritario, con desempate determinístico) y hábito en una sola
+# agregación por usuario sobre sus transacciones (habit_engine)
+if engine == "spark":
+    # El hábito solo lee las particiones de fecha dentro de alguna ventana
+    # abierta (en modo incremental, las de las cohortes afectadas)
+    date_ranges = habit_window_ranges(df_onboarding_clean)
+    print(f"- Ventanas de hábito: {', '.join(f'{start} a {end}' for start, end in date_ranges) or 'ninguna'}")
+    user_metrics = compute_user_metrics(df_onboarding_clean, df_transactions_clean, date_ranges=date_ranges)
+
+    # Una fila por usuario con transacciones
+    user_metrics = report.observe(user_metrics, "transaction_users", unique_users=count(lit(1)))
+    user_metrics = profiler.checkpoint(user_metrics)
+
+    # Unir datos - LEFT JOIN para mantener todos los usuarios de onboarding
+    df = df_onboarding_clean.join(
+        user_metrics, 
+        on="user_id", 
+        how="left"
+    )
+else:
+    user_metrics = pandas_engine.compute_user_metrics(df_onboarding_clean, df_transactions_clean)
+    report.record("transaction_users", unique_users=len(user_metrics))
 
 # FILTRAR USUARIOS SIN SEGMENTO
+# Sin segmento == sin transacciones (user_metrics solo tiene usuarios con transacciones)
 print(f"\n🔍 FILTRANDO USUARIOS SIN SEGMENTO...")
-total_before = df.count()
-df = df.filter(col("segment").isNotNull())
-total_after = df.count()
-filtered_out = total_before - total_after
-
-print(f"Usuarios antes del filtro: {total_before:,}")
-print(f"Usuarios después del filtro: {total_after:,}")
-print(f"Usuarios filtrados (sin segmento): {filtered_out:,}")
-
-# Calcular métricas
-df = df.withColumn("drop", when(col("return") == 0, 1).otherwise(0))
-
-# Análisis de distribución por segmento después del filtrado
-print(f"\n📊 DISTRIBUCIÓN POR SEGMENTO (después del filtrado):")
-segment_distribution = df.groupBy("segment").count().orderBy("segment")
-segment_distribution.show()
-
-# Preparar transacciones para hábito (solo usuarios con transacciones)
-df_tx = df_transactions_clean.join(
-    df.select("user_id", "first_login_dt", "segment", "ab_group").withColumnRenamed("segment", "user_segment"), 
-    on="user_id", how="inner"
-)
-df_tx = df_tx.withColumn("diff_days", (col("transaction_dt").cast(DateType()) - col("first_login_dt").cast(DateType())).cast("int"))
-df_tx = df_tx.filter((col("diff_days") >= 0) & (col("diff_days") <= 30))
-
-# Hábito individuals: ≥5 días distintos
-habit_indiv = df_tx.filter(col("user_segment") == 1) \
-    .groupBy("user_id", "ab_group").agg(countDistinct("transaction_dt").alias("active_days")) \
-    .withColumn("habito_calc", when(col("active_days") >= 5, 1).otherwise(0)) \
-    .select("user_id", "ab_group", "habito_calc")
-
-# Hábito sellers: ≥5 cobros (type 8 o 9)
-habit_seller = df_tx.filter((col("user_segment") == 2) & (col("type").isin(8, 9))) \
-    .groupBy("user_id", "ab_group").agg(count("*").alias("cobros")) \
-    .withColumn("habito_calc", when(col("cobros") >= 5, 1).otherwise(0)) \
-    .select("user_id", "ab_group", "habito_calc")
-
-# Unir resultados de hábito
-habit_all = habit_indiv.unionByName(habit_seller)
-
-# Merge con datos finales - LEFT JOIN para mantener todos los usuarios
-df_final = df.join(habit_all.select("user_id", "habito_calc"), on="user_id", how="left")
-df_final = df_final.withColumn("habito_calc", when(col("habito_calc").isNull(), 0).otherwise(col("habito_calc")))
+profiler.start("metrics")
 
 # 6. SELECCIÓN FINAL - SOLO HÁBITO CALCULADO
-df_metrics = df_final.select(
-    "user_id", "segment", "ab_group", "drop", "activacion", "setup", "habito_calc"
-)
-
-print(f"\n✅ MÉTRICAS CALCULADAS: {df_metrics.count()} registros")
-print(f"Usuarios únicos finales: {df_metrics.select('user_id').distinct().count()}")
+metric_columns = ["user_id", "segment", "ab_group", "drop", "activacion", "setup", "habito_calc"]
+
+if engine == "spark":
+    # Una fila por usuario: onboarding repite algunos usuarios (el mismo
+    # registro con otro formato de fecha) y las tablas de Cassandra tienen
+    # user_id como clave; así el rollup, los resúmenes y la metadata cuentan
+    # lo mismo que la tabla. La entrada ya está particionada por user_id
+    # (staging bucketizado), el dropDuplicates no agrega shuffle.
+    df = df.dropDuplicates(["user_id"])
+
+    # Conteos exactos: una fila == un usuario de onboarding, y sin segmento
+    # == sin transacciones
+    df = report.observe(
+        df, "segment_filter",
+        users=count(lit(1)),
+        users_without_segment=count(when(col("segment").isNull(), 1)),
+    )
+    df = df.filter(col("segment").isNotNull())
+
+    # Calcular métricas
+    df_final = df.withColumn("drop", when(col("return") == 0, 1).otherwise(0))
+
+    # week_year se conserva para particionar el respaldo por cohorte en modo incremental.
+    df_metrics = df_final.select(*metric_columns, "week_year")
+    # Después de deduplicar, filas == usuarios
+    df_metrics = report.observe(df_metrics, "metrics", rows=count(lit(1)))
+
+    # Punto de persistencia: el linaje completo se ejecuta una sola vez (en la
+    # primera acción de la etapa 7, que dispara todas las observaciones) y los
+    # análisis, Cassandra y el CSV leen del cache.
+    df_metrics = profiler.checkpoint(df_metrics.persist())
+else:
+    # week_year se conserva igual que en Spark
+    df_metrics, users, users_without_segment = pandas_engine.final_metrics(
+        df_onboarding_clean, user_metrics
+    )
+    report.record("segment_filter", users=users, users_without_segment=users_without_segment)
+    report.record("metrics", rows=len(df_metrics))
 
 # 7. ANÁLISIS A/B TESTING
 print("\n🔬 ANÁLISIS A/B TESTING")
-
-# Métricas por grupo
-ab_metrics = df_metrics.groupBy("ab_group").agg(
-    count("*").alias("total_users"),
-    (F_sum("drop") / count("*") * 100).alias("drop_rate"),
-    (F_sum("activacion") / count("*") * 100).alias("activation_rate"),
-    (F_sum("setup") / count("*") * 100).alias("setup_rate"),
-    (F_sum("habito_calc") / count("*") * 100).alias("habit_rate")
-)
+profiler.start("analysis")
+
+rollup_columns = ["segment", "ab_group", "week_year", "total_users", "activated_users",
+                  "setup_users", "habit_users", "drop_users"]
+
+# Resúmenes sobre las métricas (en Spark leen del cache)
+if engine == "spark":
+    # Métricas por grupo
+    ab_metrics = df_metrics.groupBy("ab_group").agg(
+        count("*").alias("total_users"),
+        (F_sum("drop") / count("*") * 100).alias("drop_rate"),
+        (F_sum("activacion") / count("*") * 100).alias("activation_rate"),
+        (F_sum("setup") / count("*") * 100).alias("setup_rate"),
+        (F_sum("habito_calc") / count("*") * 100).alias("habit_rate")
+    )
+    ab_groups = [r.asDict() for r in ab_metrics.collect()]
+
+    # Ya se ejecutó el linaje: leer las métricas observadas
+    report.collect()
+
+    segment_counts = [tuple(r) for r in df_metrics.groupBy("segment").count().orderBy("segment").collect()]
+
+    funnel_analysis = df_metrics.agg(
+        count("*").alias("total_users"),
+        F_sum("activacion").alias("activated_users"),
+        F_sum("setup").alias("setup_users"),
+        F_sum("habito_calc").alias("habit_users")
+    ).collect()[0]
+
+    # Rollup compacto para el dashboard: conteos por segmento × grupo A/B × cohorte
+    rollup_rows = df_metrics.groupBy("segment", "ab_group", "week_year").agg(
+        count("*").alias("total_users"),
+        F_sum("activacion").alias("activated_users"),
+        F_sum("setup").alias("setup_users"),
+        F_sum("habito_calc").alias("habit_users"),
+        F_sum("drop").alias("drop_users")
+    ).select(*rollup_columns).collect()
+else:
+    ab_groups = pandas_engine.ab_group_summary(df_metrics)
+    segment_counts = pandas_engine.segment_distribution(df_metrics)
+    funnel_analysis = pandas_engine.funnel(df_metrics)
+    rollup_rows = pandas_engine.rollup(df_metrics, rollup_columns)
 
 print("Métricas por grupo A/B:")
-ab_metrics.show()
+print(pd.DataFrame(ab_groups).to_string(index=False))
+
+filtered_out = report.get("segment_filter", "users_without_segment")
+
+print(f"\n📈 ANÁLISIS DE USUARIOS:")
+print(f"- Onboarding: {report.get('onboarding', 'rows'):,} registros "
+      f"({report.get('segment_filter', 'users'):,} usuarios únicos)")
+if registry.requires("users"):
+    print("- Users: se lee para el enriquecimiento (etapa 11)")
+else:
+    print("- Users: no se lee (ninguna salida pedida lo usa)")
+print(f"- Transactions: {report.get('transactions', 'rows'):,} registros "
+      f"({report.get('transaction_users', 'unique_users'):,} usuarios de onboarding con transacciones)")
+print(f"- Usuarios sin transacciones / sin segmento (filtrados): {filtered_out:,}")
+print(f"\n✅ MÉTRICAS CALCULADAS: {report.get('metrics', 'rows'):,} registros (uno por usuario)")
+
+# Distribución por segmento
+print(f"\n📊 DISTRIBUCIÓN POR SEGMENTO (después del filtrado):")
+for segment, users in segment_counts:
+    print(f"- Segmento {segment}: {users:,} usuarios")
 
 # 8. ANÁLISIS DEL FUNNEL COMPLETO
 print("\n🔄 ANÁLISIS DEL FUNNEL COMPLETO")
 
-funnel_analysis = df_metrics.agg(
-    count("*").alias("total_users"),
-    F_sum("activacion").alias("activated_users"),
-    F_sum("setup").alias("setup_users"),
-    F_sum("habito_calc").alias("habit_users")
-).collect()[0]
-
 total = funnel_analysis["total_users"]
 activated = funnel_analysis["activated_users"]
 setup = funnel_analysis["setup_users"]
@@ -180,21 +369,46 @@ print(f"2. Activación: {activated:,} ({activated/total*100:.1f}%)")
 print(f"3. Setup: {setup:,} ({setup/total*100:.1f}%)")
 print(f"4. Hábito: {habit:,} ({habit/total*100:.1f}%)")
 
+report.record(
+    "funnel",
+    total_users=total, activated_users=activated, setup_users=setup, habit_users=habit,
+)
+print(f"Rollup para el dashboard: {len(rollup_rows)} filas (segmento × grupo A/B × cohorte)")
+
+# Significancia del A/B (complemento de la etapa 7): test z de dos
+# proporciones, IC de Newcombe y bootstrap sobre los conteos del rollup
+print("\n📐 SIGNIFICANCIA A/B (tratamiento - control, IC 95%)")
+profiler.start("significance")
+try:
+    significance = ab_significance(pd.DataFrame(rollup_rows, columns=rollup_columns))
+    for r in significance.itertuples(index=False):
+        print(f"- Segmento {r.segment} / {r.metric}: {r.diff * 100:+.2f} pp "
+              f"(IC [{r.ci_low * 100:+.2f}, {r.ci_high * 100:+.2f}], "
+              f"bootstrap [{r.boot_low * 100:+.2f}, {r.boot_high * 100:+.2f}], "
+              f"p={r.p_value:.3f}){' ✅ significativo' if r.significant else ''}")
+    report.record("ab_significance", **{
+        f"{r['segment']}_{r['metric']}": r for r in significance.to_dict("records")
+    })
+except ValueError as e:
+    print(f"⚠️ No se pudo calcular la significancia: {e}")
+
+report.record("ab_groups", **{r["ab_group"]: r for r in ab_groups})
+
 # 9. GUARDAR EN CASSANDRA
 print("\n💾 GUARDANDO EN CASSANDRA...")
+profiler.start("cassandra_write")
 
-# Convertir a pandas
-pandas_df = df_metrics.toPandas()
+cassandra_ok = False
 
 try:
-    cluster = Cluster(['localhost'], port=9042)
+    cluster = build_cluster(CASSANDRA_HOST, CASSANDRA_PORT)
     session = cluster.connect()
     
-    session.execute("USE fintech_analytics")
+    session.execute(f"USE {CASSANDRA_KEYSPACE}")
     
     # Crear tabla limpia con solo hábito calculado
-    create_table_query = """
-    CREATE TABLE IF NOT EXISTS user_onboarding_metrics_clean (
+    create_table_query = f"""
+    CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
         user_id TEXT,
         segment INT,
         ab_group TEXT,
@@ -207,31 +421,143 @@ try:
     """
     
     session.execute(create_table_query)
+
+    # Copia particionada por (segment, ab_group) y ordenada por user_id: el
+    # dashboard filtra y pagina "Datos Raw" directamente en Cassandra
+    session.execute(f"""
+    CREATE TABLE IF NOT EXISTS {BY_GROUP_TABLE} (
+        segment INT,
+        ab_group TEXT,
+        user_id TEXT,
+        "drop" INT,
+        activacion INT,
+        setup INT,
+        habito_calc INT,
+        PRIMARY KEY ((segment, ab_group), user_id)
+    )
+    """)
     
-    # Limpiar tabla anterior
-    session.execute("TRUNCATE user_onboarding_metrics_clean")
-    
-    # Insertar datos
-    insert_query = """
-    INSERT INTO user_onboarding_metrics_clean 
-    (user_id, segment, ab_group, "drop", activacion, setup, habito_calc) 
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """
-    
-    prepared = session.prepare(insert_query)
-    
-    for index, row in pandas_df.iterrows():
-        session.execute(prepared, (
-            str(row['user_id']),
-            int(row['segment']) if pd.notna(row['segment']) else None,
-            str(row['ab_group']),
-            int(row['drop']) if pd.notna(row['drop']) else None,
-            int(row['activacion']) if pd.notna(row['activacion']) else None,
-            int(row['setup']) if pd.notna(row['setup']) else None,
-            int(row['habito_calc']) if pd.notna(row['habito_calc']) else None
-        ))
+    if args.mode == "full":
+        # Limpiar tablas anteriores
+        session.execute(f"TRUNCATE {METRICS_TABLE}")
+        session.execute(f"TRUNCATE {BY_GROUP_TABLE}")
+    # En modo incremental los INSERT son upserts de las cohortes afectadas
+    # (el grupo A/B es determinístico; un usuario que cambia de segmento
+    # queda también en su partición anterior hasta la próxima corrida full)
     
-    print("✅ Datos cargados en Cassandra con éxito")
+    if args.write_mode == "driver":
+        # Convertir a pandas una sola vez para las dos tablas
+        profiler.start("to_pandas")
+        pandas_df = df_metrics.toPandas() if engine == "spark" else df_metrics
+        pandas_df["user_id"] = pandas_df["user_id"].astype(str)
+        pandas_df["ab_group"] = pandas_df["ab_group"].astype(str)
+        profiler.start("cassandra_write")
+
+    table_stats = {}
+    for table, report_section in [(METRICS_TABLE, "cassandra_write"),
+                                  (BY_GROUP_TABLE, "cassandra_write_by_group")]:
+        if args.write_mode == "partition":
+            # Cada partición escribe su porción desde el executor (sin collect al driver)
+            stats = write_dataframe_by_partition(
+                df_metrics, CASSANDRA_HOST, CASSANDRA_PORT, CASSANDRA_KEYSPACE,
+                table, metric_columns
+            )
+        else:
+            # Insertar desde el driver con escrituras asíncronas
+            writer = CassandraWriter(session, table, metric_columns)
+            stats = writer.write_rows(pandas_df[metric_columns].itertuples(index=False, name=None))
+
+        print(f"Escritura {table}: {stats.summary()}")
+        report.record(report_section, **stats.as_dict())
+        for error in stats.errors:
+            print(f"   ⚠️ {error}")
+        table_stats[table] = stats
+
+    rows_failed = sum(stats.rows_failed for stats in table_stats.values())
+    profiler.stages["cassandra_write"]["rows"] = sum(stats.rows_written for stats in table_stats.values())
+
+    # Tabla de rollup que leen las vistas agregadas del dashboard
+    session.execute(f"""
+    CREATE TABLE IF NOT EXISTS {ROLLUP_TABLE} (
+        segment INT,
+        ab_group TEXT,
+        week_year INT,
+        total_users INT,
+        activated_users INT,
+        setup_users INT,
+        habit_users INT,
+        drop_users INT,
+        PRIMARY KEY ((segment), ab_group, week_year)
+    )
+    """)
+    if args.mode == "full":
+        session.execute(f"TRUNCATE {ROLLUP_TABLE}")
+    else:
+        # En modo incremental se reemplazan las filas de las cohortes
+        # recalculadas: primero se borran todas las de esas cohortes, así una
+        # combinación segmento × grupo que quedó sin usuarios no sobrevive
+        delete_rollup = session.prepare(
+            f"DELETE FROM {ROLLUP_TABLE} WHERE segment = ? AND ab_group = ? AND week_year = ?"
+        )
+        stale_rows = [
+            (r.segment, r.ab_group, r.week_year)
+            for r in session.execute(f"SELECT segment, ab_group, week_year FROM {ROLLUP_TABLE}")
+            if r.week_year in cohorts_to_process
+        ]
+        for key in stale_rows:
+            session.execute(delete_rollup, key)
+        print(f"Rollup: {len(stale_rows)} filas de las cohortes recalculadas borradas")
+    rollup_writer = CassandraWriter(session, ROLLUP_TABLE, rollup_columns)
+    rollup_stats = rollup_writer.write_rows(tuple(r) for r in rollup_rows)
+    print(f"Rollup: {rollup_stats.summary()}")
+
+    if rows_failed or rollup_stats.rows_failed:
+        print(f"⚠️ {rows_failed + rollup_stats.rows_failed:,} filas no pudieron cargarse en Cassandra")
+    else:
+        print("✅ Datos cargados en Cassandra con éxito")
+        cassandra_ok = True
+
+    # Metadatos de la corrida: el dashboard los lee con una consulta a una
+    # sola partición en lugar de un SELECT COUNT(*) sobre toda la tabla
+    session.execute(f"""
+    CREATE TABLE IF NOT EXISTS {RUN_METADATA_TABLE} (
+        table_name TEXT,
+        completed_at TIMESTAMP,
+        run_id TEXT,
+        mode TEXT,
+        row_count BIGINT,
+        ab_group_counts MAP<TEXT, BIGINT>,
+        segment_counts MAP<INT, BIGINT>,
+        PRIMARY KEY ((table_name), completed_at)
+    ) WITH CLUSTERING ORDER BY (completed_at DESC)
+    """)
+    if cassandra_ok:
+        # Totales de la tabla completa, una fila por usuario como la tabla
+        if args.mode == "full":
+            # La corrida escribió la tabla entera: salen de los resúmenes de
+            # la etapa 7, calculados sobre las métricas sin duplicados
+            table_ab_group_counts = Counter({r["ab_group"]: r["total_users"] for r in ab_groups})
+            table_segment_counts = Counter(dict(segment_counts))
+        else:
+            # Solo se recalcularon algunas cohortes: se suman desde el rollup
+            # (chico, una fila por usuario y ya sin las filas viejas de esas cohortes)
+            table_ab_group_counts = Counter()
+            table_segment_counts = Counter()
+            for r in session.execute(f"SELECT segment, ab_group, total_users FROM {ROLLUP_TABLE}"):
+                table_ab_group_counts[r.ab_group] += r.total_users
+                table_segment_counts[r.segment] += r.total_users
+
+        session.execute(
+            session.prepare(f"""
+            INSERT INTO {RUN_METADATA_TABLE}
+            (table_name, completed_at, run_id, mode, row_count, ab_group_counts, segment_counts)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """),
+            (METRICS_TABLE, datetime.now(timezone.utc), report.run_id, args.mode,
+             sum(table_ab_group_counts.values()), {k: int(v) for k, v in table_ab_group_counts.items()},
+             {int(k): int(v) for k, v in table_segment_counts.items()})
+        )
+        print(f"Metadatos de la corrida {report.run_id} guardados en {RUN_METADATA_TABLE}")
     
 except Exception as e:
     print(f"❌ Error al cargar en Cassandra: {e}")
@@ -243,14 +569,106 @@ finally:
         cluster.shutdown()
 
 # 10. GUARDAR EN CSV
-df_metrics.write \
-    .mode("overwrite") \
-    .option("header", "true") \
-    .csv("artifacts/user_onboarding_metrics_clean")
+profiler.start("csv_write")
+# El mismo layout por cohorte en los dos modos, así los dos directorios
+# tienen siempre el dataset completo y vigente
+if engine == "pandas":
+    # Mismos layouts que el CSV de Spark (un part-*.csv por directorio)
+    pandas_engine.write_csv_by_cohort(df_metrics[metric_columns + ["week_year"]], METRICS_CSV_PATH)
+    pandas_engine.write_csv(df_metrics[metric_columns], METRICS_FLAT_CSV_PATH)
+else:
+    # full reemplaza todas las cohortes; incremental solo las recalculadas
+    spark.conf.set("spark.sql.sources.partitionOverwriteMode",
+                   "static" if args.mode == "full" else "dynamic")
+    df_metrics.select(*metric_columns, "week_year").write \
+        .mode("overwrite") \
+        .partitionBy("week_year") \
+        .option("header", "true") \
+        .csv(METRICS_CSV_PATH)
+
+    if args.mode == "full":
+        df_flat = df_metrics.select(*metric_columns)
+    else:
+        # La copia plana se regenera desde el layout por cohorte, que ya
+        # combina las cohortes recalculadas con las que no cambiaron
+        df_flat = spark.read.option("header", "true").csv(METRICS_CSV_PATH).select(*metric_columns)
+    df_flat.write \
+        .mode("overwrite") \
+        .option("header", "true") \
+        .csv(METRICS_FLAT_CSV_PATH)
+
+# 11. ENRIQUECIMIENTO CON DIM_USERS (solo con --enrich-users)
+if registry.requires("users"):
+    print("\n👤 ENRIQUECIENDO MÉTRICAS CON DIM_USERS...")
+    profiler.start("user_enrichment")
+    enriched_columns = metric_columns + ["user_type", "rubro"]
+    df_users = registry.get("users")
+
+    if engine == "spark":
+        # Un registro por usuario y tres columnas: se broadcastea y las
+        # métricas cacheadas no se vuelven a particionar
+        df_users = df_users.select(
+            "user_id",
+            col("type").cast("int").alias("user_type"),
+            col("rubro").cast("int").alias("rubro"),
+        )
+        df_enriched = report.observe(
+            df_metrics.join(broadcast(df_users), on="user_id", how="left"),
+            "user_enrichment",
+            rows=count(lit(1)),
+            with_user_type=count("user_type"),
+            with_rubro=count("rubro"),
+        )
+        # partitionOverwriteMode ya quedó configurado en la etapa 10: full
+        # reemplaza todas las cohortes, incremental solo las recalculadas
+        df_enriched.select(*enriched_columns, "week_year").write \
+            .mode("overwrite") \
+            .partitionBy("week_year") \
+            .option("header", "true") \
+            .csv(ENRICHED_PATH)
+        report.collect()
+    else:
+        df_enriched, enrichment_stats = pandas_engine.enrich_users(df_metrics, df_users)
+        report.record("user_enrichment", **enrichment_stats)
+        pandas_engine.write_csv_by_cohort(df_enriched[enriched_columns + ["week_year"]], ENRICHED_PATH)
+
+    print(f"- {report.get('user_enrichment', 'rows'):,} registros: "
+          f"{report.get('user_enrichment', 'with_user_type'):,} con tipo, "
+          f"{report.get('user_enrichment', 'with_rubro'):,} con rubro")
+
+# Checkpoint para la próxima corrida incremental (solo si Cassandra quedó al día)
+profiler.start("checkpoint")
+if args.mode == "full":
+    # En modo full el watermark sale de la observación sobre las transacciones
+    watermark = report.get("transactions", "max_transaction_dt")
+
+if cassandra_ok:
+    if engine == "pandas":
+        all_cohorts = {int(w) for w in df_onboarding["week_year"].dropna().unique()}
+    elif args.mode == "full":
+        all_cohorts = {
+            r["week_year"] for r in df_onboarding.select("week_year").distinct().collect()
+            if r["week_year"] is not None
+        }
+    save_checkpoint(watermark, all_cohorts)
+
+profiler.stop()
+profiler.release()
+
+# Perfil por etapa: métricas de los stages de Spark de cada etapa
+report.record("stages", **profiler.collect())
+print("\n⏱️ PERFIL POR ETAPA")
+for line in profiler.summary_lines():
+    print(line)
 
 print("\n✅ ETL LIMPIO COMPLETADO")
-print(f"Total de registros procesados: {df_metrics.count()}")
+print(f"Total de registros procesados: {report.get('metrics', 'rows'):,}")
 print(f"Usuarios sin segmento filtrados: {filtered_out:,}")
-print("Archivos guardados en artifacts/user_onboarding_metrics_clean")
+print(f"Archivos guardados en {METRICS_CSV_PATH} y {METRICS_FLAT_CSV_PATH}")
+if registry.requires("users"):
+    print(f"Métricas enriquecidas en {ENRICHED_PATH}")
+
+print(f"Reporte de la corrida: {report.write()}")
 
-spark.stop() 
\ No newline at end of file
+if spark is not None:
+    spark.stop() 
\ No newline at end of file
@@ -0,0 +1,395 @@
+"""
+ETL en streaming para las transacciones.
+
+Vigila un directorio de llegada (``landing/transactions``) y procesa cada
+archivo CSV nuevo de transacciones apenas aparece. Por usuario se mantiene
+un estado incremental con ``applyInPandasWithState``:
+
+- transacciones por segmento (para resolver el segmento, igual que el batch)
+- por cada regla de ``HABIT_RULES``: una máscara de bits con los días de la
+  ventana que tuvieron transacciones (``DISTINCT_DAYS``) o un contador
+  (``COUNT``)
+
+Solo se emite un usuario cuando cambia su segmento o su ``habito_calc``. En
+cada micro-batch, para esos usuarios:
+
+- se lee su fila actual de la tabla de métricas: si cambió de segmento se
+  borra su fila vieja de la tabla por (segment, ab_group), y la diferencia
+  entre la fila nueva y la guardada se acumula como delta del rollup,
+- se hace upsert de las filas nuevas en las dos tablas de métricas,
+- se aplican los deltas al rollup (que leen todas las vistas agregadas) y se
+  publica una fila en ``etl_run_metadata`` con un run_id nuevo, así el cache
+  del dashboard detecta la versión nueva y recarga.
+
+El estado de un usuario se descarta cuando el watermark pasa el cierre de su
+ventana de hábito (``first_login_dt`` + ventana más larga de las reglas).
+
+Los usuarios repetidos en onboarding cuentan una sola vez, igual que en el
+batch. A diferencia del batch, el segmento se resuelve solo con las
+transacciones hasta el cierre de la ventana, y los deltas del rollup no son idempotentes
+(si Spark reintenta un micro-batch se aplican dos veces).
+``etl_pipeline_clean.py`` sigue siendo la fuente de verdad: reconcilia con
+el historial completo y reescribe el rollup.
+
+Para sembrar el estado con el historial, copiar ``bt_users_transactions.csv``
+al directorio de llegada antes del primer arranque (el checkpoint registra
+los archivos ya procesados).
+
+Uso:
+    python etl_streaming.py --landing-dir landing/transactions --trigger-seconds 10
+"""
+import argparse
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import col, datediff, to_date, when
+from pyspark.sql.streaming.state import GroupStateTimeout
+from pyspark.sql.types import IntegerType, LongType, StringType, StructField, StructType
+
+from cassandra.concurrent import execute_concurrent_with_args
+
+from ab_assignment import assign_groups
+from cassandra_loader import METRIC_COLUMNS
+from cassandra_writer import _prepare_cached, get_pooled_session, write_dataframe_by_partition
+from habit_engine import DISTINCT_DAYS, HABIT_RULES, SEGMENTS
+from schemas import TRANSACTIONS_SCHEMA
+from staging import load_dataset
+
+CASSANDRA_HOST = "localhost"
+CASSANDRA_PORT = 9042
+CASSANDRA_KEYSPACE = "fintech_analytics"
+METRICS_TABLE = "user_onboarding_metrics_clean"
+BY_GROUP_TABLE = "user_onboarding_metrics_by_group"
+ROLLUP_TABLE = "user_onboarding_rollup"
+RUN_METADATA_TABLE = "etl_run_metadata"
+ROLLUP_COUNTS = ["total_users", "activated_users", "setup_users", "habit_users", "drop_users"]
+# Las filas de metadatos del streaming (una por micro-batch con cambios) expiran solas
+STREAM_METADATA_TTL = 7 * 24 * 3600
+
+# Ventana más larga entre las reglas: después de su cierre el hábito ya no cambia
+WINDOW_DAYS = max(rule.window_days for rule in HABIT_RULES)
+DAY_MS = 24 * 60 * 60 * 1000
+
+OUTPUT_SCHEMA = StructType([
+    StructField("user_id", StringType()),
+    StructField("segment", IntegerType()),
+    StructField("ab_group", StringType()),
+    StructField("drop", IntegerType()),
+    StructField("activacion", IntegerType()),
+    StructField("setup", IntegerType()),
+    StructField("habito_calc", IntegerType()),
+    StructField("week_year", IntegerType()),
+])
+
+# Estado por usuario: conteos por segmento, un valor por regla y lo último emitido
+STATE_SCHEMA = StructType(
+    [StructField(f"segment_{segment}_tx", LongType()) for segment in SEGMENTS]
+    + [StructField(rule.name, LongType()) for rule in HABIT_RULES]
+    + [StructField("emitted_segment", IntegerType()), StructField("emitted_habit", IntegerType())]
+)
+
+
+def _rule_increment(rule, pdf, in_window):
+    """
+    Aporte de un bloque de transacciones al estado de la regla
+    """
+    mask = in_window
+    if rule.transaction_types:
+        mask = mask & pdf["type"].isin(rule.transaction_types)
+    if rule.measure == DISTINCT_DAYS:
+        days = pdf.loc[mask, "diff_days"].to_numpy(dtype=np.int64)
+        return int(np.bitwise_or.reduce(np.left_shift(1, days))) if len(days) else 0
+    return int(mask.sum())
+
+
+def _rule_value(rule, state_value):
+    if rule.measure == DISTINCT_DAYS:
+        return bin(state_value).count("1")
+    return state_value
+
+
+def _flag(value):
+    return None if pd.isna(value) else int(value)
+
+
+def _resolve_segment(segment_counts):
+    # Segmento mayoritario; ante empate gana el menor (igual que habit_engine)
+    best = max(SEGMENTS, key=lambda segment: (segment_counts[segment], -segment))
+    return best if segment_counts[best] > 0 else None
+
+
+def update_user_state(key, pdf_iter, state):
+    """
+    Actualiza el estado de un usuario con sus transacciones nuevas y emite
+    su fila de métricas si cambió el segmento o el hábito
+    """
+    if state.hasTimedOut:
+        # Se cerró la ventana de hábito del usuario
+        state.remove()
+        return
+
+    if state.exists:
+        values = state.get
+    else:
+        values = (0,) * (len(SEGMENTS) + len(HABIT_RULES)) + (None, None)
+    segment_counts = dict(zip(SEGMENTS, values[:len(SEGMENTS)]))
+    rule_state = list(values[len(SEGMENTS):len(SEGMENTS) + len(HABIT_RULES)])
+    emitted_segment, emitted_habit = values[-2:]
+
+    user = None
+    for pdf in pdf_iter:
+        if user is None:
+            user = pdf.iloc[0]
+        for segment in SEGMENTS:
+            segment_counts[segment] += int((pdf["segment"] == segment).sum())
+        for i, rule in enumerate(HABIT_RULES):
+            in_window = pdf["diff_days"].between(0, rule.window_days)
+            increment = _rule_increment(rule, pdf, in_window)
+            if rule.measure == DISTINCT_DAYS:
+                rule_state[i] |= increment
+            else:
+                rule_state[i] += increment
+
+    segment = _resolve_segment(segment_counts)
+    habit = int(any(
+        rule.segment == segment and _rule_value(rule, rule_state[i]) >= rule.threshold
+        for i, rule in enumerate(HABIT_RULES)
+    ))
+
+    changed = segment is not None and (segment, habit) != (emitted_segment, emitted_habit)
+    if changed:
+        emitted_segment, emitted_habit = segment, habit
+
+    state.update(tuple(segment_counts[s] for s in SEGMENTS) + tuple(rule_state)
+                 + (emitted_segment, emitted_habit))
+
+    # Expirar el estado al cierre de la ventana (según el watermark)
+    window_close_ms = int(pd.Timestamp(user["first_login_dt"]).value // 10 ** 6) + (WINDOW_DAYS + 1) * DAY_MS
+    if window_close_ms > state.getCurrentWatermarkMs():
+        state.setTimeoutTimestamp(window_close_ms)
+    else:
+        state.remove()
+
+    if changed:
+        yield pd.DataFrame([{
+            "user_id": key[0],
+            "segment": segment,
+            "ab_group": user["ab_group"],
+            "drop": _flag(user["drop"]),
+            "activacion": _flag(user["activacion"]),
+            "setup": _flag(user["setup"]),
+            "habito_calc": habit,
+            "week_year": _flag(user["week_year"]),
+        }])
+
+
+def _rollup_contribution(row):
+    # Clave (segment, ab_group) y conteos con que una fila de métricas entra al rollup
+    counts = (1, row["activacion"] or 0, row["setup"] or 0, row["habito_calc"] or 0, row["drop"] or 0)
+    return (row["segment"], row["ab_group"]), counts
+
+
+def rollup_deltas(new_row, stored_row, week_year):
+    """
+    Cambio en el rollup por reemplazar ``stored_row`` (la fila del usuario en
+    la tabla de métricas, None si no estaba) por ``new_row``. Devuelve
+    {(segment, ab_group, week_year): [delta por columna de ROLLUP_COUNTS]}
+    sin las claves que no cambian. Sin cohorte no hay fila de rollup.
+    """
+    if week_year is None:
+        return {}
+    deltas = {}
+    for row, sign in ((new_row, 1), (stored_row, -1)):
+        if row is None:
+            continue
+        key, counts = _rollup_contribution(row)
+        delta = deltas.setdefault(key + (week_year,), [0] * len(ROLLUP_COUNTS))
+        for i, value in enumerate(counts):
+            delta[i] += sign * value
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def merge_deltas(target, deltas):
+    for key, delta in deltas.items():
+        current = target.setdefault(key, [0] * len(ROLLUP_COUNTS))
+        for i, value in enumerate(delta):
+            current[i] += value
+    return target
+
+
+def reconcile_previous_rows(rows):
+    """
+    Para cada fila emitida (en el executor): lee la fila guardada del
+    usuario, borra su fila vieja de la tabla por grupo si cambió de
+    (segment, ab_group) y devuelve los deltas del rollup de la partición
+    """
+    session = get_pooled_session(CASSANDRA_HOST, CASSANDRA_PORT, CASSANDRA_KEYSPACE)
+    column_list = ", ".join(f'"{c}"' for c in METRIC_COLUMNS)
+    select = _prepare_cached(session, f"SELECT {column_list} FROM {METRICS_TABLE} WHERE user_id = ?")
+    delete = _prepare_cached(
+        session, f"DELETE FROM {BY_GROUP_TABLE} WHERE segment = ? AND ab_group = ? AND user_id = ?"
+    )
+
+    rows = [row.asDict() for row in rows]
+    results = execute_concurrent_with_args(session, select, [(row["user_id"],) for row in rows],
+                                           concurrency=64, raise_on_first_error=True)
+    stale = []
+    deltas = {}
+    for row, (_, result) in zip(rows, results):
+        stored = result.one()
+        stored = stored._asdict() if stored is not None else None
+        if stored is not None and (stored["segment"], stored["ab_group"]) != (row["segment"], row["ab_group"]):
+            stale.append((stored["segment"], stored["ab_group"], row["user_id"]))
+        merge_deltas(deltas, rollup_deltas(row, stored, row["week_year"]))
+
+    execute_concurrent_with_args(session, delete, stale, concurrency=64, raise_on_first_error=True)
+    yield len(stale), deltas
+
+
+def apply_rollup_deltas(session, deltas):
+    """
+    Suma los deltas a las filas del rollup (en el driver: una fila por
+    segmento × grupo × cohorte afectado). Una fila que queda sin usuarios se borra.
+    """
+    key_filter = "WHERE segment = ? AND ab_group = ? AND week_year = ?"
+    select = session.prepare(f"SELECT {', '.join(ROLLUP_COUNTS)} FROM {ROLLUP_TABLE} {key_filter}")
+    insert = session.prepare(
+        f"INSERT INTO {ROLLUP_TABLE} (segment, ab_group, week_year, {', '.join(ROLLUP_COUNTS)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' for _ in ROLLUP_COUNTS)})"
+    )
+    delete = session.prepare(f"DELETE FROM {ROLLUP_TABLE} {key_filter}")
+
+    for key, delta in deltas.items():
+        row = session.execute(select, key).one()
+        counts = [(getattr(row, c) if row is not None else 0) + d for c, d in zip(ROLLUP_COUNTS, delta)]
+        if counts[0] <= 0:
+            session.execute(delete, key)
+        else:
+            session.execute(insert, key + tuple(counts))
+
+
+def publish_run_metadata(session):
+    """
+    Fila nueva en etl_run_metadata con los totales del rollup: el run_id
+    nuevo es la señal de versión que usa el cache del dashboard
+    """
+    ab_group_counts = Counter()
+    segment_counts = Counter()
+    for r in session.execute(f"SELECT segment, ab_group, total_users FROM {ROLLUP_TABLE}"):
+        ab_group_counts[r.ab_group] += r.total_users
+        segment_counts[r.segment] += r.total_users
+
+    run_id = f"stream-{uuid.uuid4()}"
+    session.execute(
+        session.prepare(f"""
+        INSERT INTO {RUN_METADATA_TABLE}
+        (table_name, completed_at, run_id, mode, row_count, ab_group_counts, segment_counts)
+        VALUES (?, ?, ?, ?, ?, ?, ?) USING TTL {STREAM_METADATA_TTL}
+        """),
+        (METRICS_TABLE, datetime.now(timezone.utc), run_id, "streaming",
+         sum(ab_group_counts.values()), dict(ab_group_counts), dict(segment_counts))
+    )
+    return run_id
+
+
+def upsert_batch(batch_df, batch_id):
+    """
+    Upsert de los usuarios que cambiaron en el micro-batch (desde los
+    executors) y actualización del rollup y la versión publicada
+    """
+    batch_df = batch_df.persist()
+    try:
+        # Antes de los upserts: las filas guardadas son el estado anterior
+        deltas = {}
+        stale_rows = 0
+        for partition_stale, partition_deltas in batch_df.rdd.mapPartitions(reconcile_previous_rows).collect():
+            stale_rows += partition_stale
+            merge_deltas(deltas, partition_deltas)
+
+        for table in (METRICS_TABLE, BY_GROUP_TABLE):
+            stats = write_dataframe_by_partition(
+                batch_df, CASSANDRA_HOST, CASSANDRA_PORT, CASSANDRA_KEYSPACE, table, METRIC_COLUMNS
+            )
+            if stats.rows_written or stats.rows_failed:
+                print(f"⚡ Batch {batch_id} -> {table}: {stats.summary()}")
+        if stale_rows:
+            print(f"⚡ Batch {batch_id} -> {BY_GROUP_TABLE}: {stale_rows} filas de usuarios que cambiaron de segmento borradas")
+
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        if deltas:
+            session = get_pooled_session(CASSANDRA_HOST, CASSANDRA_PORT, CASSANDRA_KEYSPACE)
+            apply_rollup_deltas(session, deltas)
+            run_id = publish_run_metadata(session)
+            print(f"⚡ Batch {batch_id} -> {ROLLUP_TABLE}: {len(deltas)} filas actualizadas (versión {run_id})")
+    finally:
+        batch_df.unpersist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ETL de transacciones en streaming - Fintech Analytics")
+    parser.add_argument("--landing-dir", default="landing/transactions",
+                        help="directorio donde llegan los CSV nuevos de transacciones")
+    parser.add_argument("--checkpoint-dir", default="checkpoints/streaming",
+                        help="checkpoint de Structured Streaming (archivos procesados y estado)")
+    parser.add_argument("--trigger-seconds", type=int, default=10, help="intervalo entre micro-batches")
+    parser.add_argument("--watermark", default="2 days",
+                        help="demora tolerada de las transacciones respecto del máximo visto")
+    args = parser.parse_args()
+
+    spark = SparkSession.builder \
+        .appName("Fintech ETL Streaming") \
+        .getOrCreate()
+
+    # Los executors necesitan el escritor de Cassandra y las reglas de hábito
+    spark.sparkContext.addPyFile("cassandra_writer.py")
+    spark.sparkContext.addPyFile("habit_engine.py")
+
+    print("⚡ ETL STREAMING - FINANCIAL TECHNOLOGY")
+    print("=" * 50)
+
+    # Usuarios de onboarding (estático): fecha de login, cohorte, grupo A/B y
+    # flags. Una fila por usuario, como la tabla de métricas y el hábito del
+    # batch (habit_engine también deduplica por user_id).
+    df_users = load_dataset(spark, "onboarding",
+                            ["user_id", "first_login_dt", "week_year", "activacion", "setup", "return"])
+    df_users = assign_groups(df_users.dropDuplicates(["user_id"])) \
+        .withColumn("first_login_dt", to_date(col("first_login_dt"), "yyyy-MM-dd")) \
+        .withColumn("drop", when(col("return") == 0, 1).otherwise(0)) \
+        .drop("return")
+
+    transactions = spark.readStream \
+        .option("header", True) \
+        .schema(TRANSACTIONS_SCHEMA) \
+        .csv(args.landing_dir) \
+        .select("user_id", "transaction_dt", "type", "segment") \
+        .withWatermark("transaction_dt", args.watermark)
+
+    # Transacciones hasta el cierre de la ventana: las posteriores no cambian el hábito
+    events = transactions.join(df_users, "user_id", "inner") \
+        .withColumn("diff_days", datediff(to_date(col("transaction_dt")), col("first_login_dt"))) \
+        .filter(col("diff_days") <= WINDOW_DAYS)
+
+    user_updates = events.groupBy("user_id").applyInPandasWithState(
+        update_user_state,
+        outputStructType=OUTPUT_SCHEMA,
+        stateStructType=STATE_SCHEMA,
+        outputMode="update",
+        timeoutConf=GroupStateTimeout.EventTimeTimeout,
+    )
+
+    query = user_updates.writeStream \
+        .foreachBatch(upsert_batch) \
+        .option("checkpointLocation", args.checkpoint_dir) \
+        .trigger(processingTime=f"{args.trigger_seconds} seconds") \
+        .start()
+
+    print(f"👀 Esperando transacciones en {args.landing_dir} (cada {args.trigger_seconds}s)")
+    query.awaitTermination()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Motor de cálculo del segmento y del hábito por usuario.
+
+Las reglas de hábito por segmento se declaran como configuración
+(``HABIT_RULES``) y se evalúan con agregados condicionales en una única
+agregación por usuario. Agregar un segmento o una regla nueva suma columnas
+a esa agregación, no otro filtro + groupBy + join sobre las transacciones.
+
+El segmento del usuario (las transacciones pueden traer segmentos
+inconsistentes) se resuelve con todo su historial, pero leyendo solo
+``user_id`` y ``segment``. El hábito solo mira los primeros días desde
+``first_login_dt``: las transacciones se unen a los usuarios con un join
+acotado por rango de fechas y, con ``date_ranges``, se leen solo las
+particiones de fecha que caen en alguna ventana abierta.
+"""
+from datetime import timedelta
+from functools import reduce
+
+from pyspark.sql.functions import (
+    col,
+    collect_set,
+    count,
+    date_add,
+    datediff,
+    greatest,
+    lit,
+    size,
+    struct,
+    when,
+)
+
+# Medidas soportadas por una regla
+DISTINCT_DAYS = "distinct_days"
+COUNT = "count"
+
+# Ventana máxima de una regla DISTINCT_DAYS: el streaming guarda los días
+# 0..window_days como bits de un entero de 64 bits con signo
+MAX_DISTINCT_DAYS_WINDOW = 62
+
+# Segmentos válidos que pueden resolverse desde las transacciones
+SEGMENTS = (1, 2)
+
+
+class HabitRule:
+    """
+    Regla de hábito para un segmento: el usuario tiene hábito si la medida
+    calculada sobre sus transacciones de los primeros ``window_days`` días
+    desde ``first_login_dt`` alcanza ``threshold``.
+
+    - ``measure``: ``DISTINCT_DAYS`` (días distintos con transacciones) o
+      ``COUNT`` (cantidad de transacciones)
+    - ``transaction_types``: si se indica, solo cuentan esos ``type``
+    - ``window_days``: con ``DISTINCT_DAYS``, hasta ``MAX_DISTINCT_DAYS_WINDOW``
+    """
+
+    def __init__(self, name, segment, threshold, measure=DISTINCT_DAYS,
+                 window_days=30, transaction_types=None):
+        if measure not in (DISTINCT_DAYS, COUNT):
+            raise ValueError(f"Medida de hábito desconocida: {measure}")
+        if window_days < 0:
+            raise ValueError(f"Ventana de hábito negativa: {window_days}")
+        if measure == DISTINCT_DAYS and window_days > MAX_DISTINCT_DAYS_WINDOW:
+            raise ValueError(
+                f"La regla {name} cuenta días distintos en {window_days} días; el máximo "
+                f"es {MAX_DISTINCT_DAYS_WINDOW} (máscara de bits del estado del streaming)"
+            )
+        self.name = name
+        self.segment = segment
+        self.threshold = threshold
+        self.measure = measure
+        self.window_days = window_days
+        self.transaction_types = list(transaction_types) if transaction_types else None
+
+    def condition(self):
+        cond = (col("diff_days") >= 0) & (col("diff_days") <= self.window_days)
+        if self.transaction_types:
+            cond = cond & col("type").isin(self.transaction_types)
+        return cond
+
+    def aggregate(self):
+        cond = self.condition()
+        if self.measure == DISTINCT_DAYS:
+            value = size(collect_set(when(cond, col("transaction_dt"))))
+        else:
+            value = count(when(cond, lit(1)))
+        return value.alias(self.name)
+
+
+HABIT_RULES = [
+    # Individuals: ≥5 días distintos con transacciones en los primeros 30 días
+    HabitRule("individuals", segment=1, threshold=5, measure=DISTINCT_DAYS),
+    # Sellers: ≥5 cobros (type 8 o 9) en los primeros 30 días
+    HabitRule("sellers", segment=2, threshold=5, measure=COUNT, transaction_types=[8, 9]),
+]
+
+
+def _segment_count_column(segment):
+    return f"segment_{segment}_tx"
+
+
+def segment_aggregates(segments=SEGMENTS):
+    """
+    Cantidad de transacciones del usuario en cada segmento
+    """
+    return [
+        count(when(col("segment") == segment, lit(1))).alias(_segment_count_column(segment))
+        for segment in segments
+    ]
+
+
+def resolved_segment(segments=SEGMENTS):
+    """
+    Segmento mayoritario del usuario a partir de los conteos por segmento.
+    Desempate determinístico: ante igual cantidad gana el segmento menor.
+    Es null si el usuario no tiene transacciones en segmentos válidos.
+    """
+    candidates = [
+        struct(col(_segment_count_column(segment)).alias("n"), lit(-segment).alias("neg_segment"))
+        for segment in segments
+    ]
+    best = candidates[0] if len(candidates) == 1 else greatest(*candidates)
+    return when(best["n"] > 0, -best["neg_segment"])
+
+
+def max_window_days(rules=HABIT_RULES):
+    return max(rule.window_days for rule in rules)
+
+
+def habit_window_ranges(df_users, rules=HABIT_RULES):
+    """
+    Unión de las ventanas de hábito ``[first_login_dt, first_login_dt +
+    ventana]`` de los usuarios, como rangos de fechas (inicio, fin)
+    disjuntos y ordenados. Solo trae al driver las fechas distintas.
+    """
+    window = timedelta(days=max_window_days(rules))
+    dates = sorted(
+        r["first_login_dt"] for r in df_users.select("first_login_dt").distinct().collect()
+        if r["first_login_dt"] is not None
+    )
+    ranges = []
+    for start in dates:
+        end = start + window
+        if ranges and start <= ranges[-1][1] + timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def in_date_ranges(column, ranges):
+    """
+    Condición ``column`` dentro de alguno de los rangos (sobre la columna de
+    partición, Spark la usa para descartar directorios)
+    """
+    conditions = [col(column).between(lit(start), lit(end)) for start, end in ranges]
+    return reduce(lambda a, b: a | b, conditions) if conditions else lit(False)
+
+
+def resolve_segments(df_transactions, segments=SEGMENTS):
+    """
+    Resolución de segmento sola (una agregación, sin ventana ni sort).
+    Devuelve (user_id, segment).
+    """
+    return df_transactions.groupBy("user_id").agg(*segment_aggregates(segments)) \
+        .select("user_id", resolved_segment(segments).alias("segment")) \
+        .filter(col("segment").isNotNull())
+
+
+def compute_user_metrics(df_users, df_transactions, rules=HABIT_RULES, segments=SEGMENTS,
+                         date_ranges=None):
+    """
+    Resuelve el segmento y calcula ``habito_calc`` de cada usuario.
+
+    ``df_users`` debe tener ``user_id`` y ``first_login_dt`` (fecha);
+    ``df_transactions`` ``user_id``, ``transaction_dt`` (fecha), ``type`` y
+    ``segment``. Con ``date_ranges`` (ver ``habit_window_ranges``) el hábito
+    se calcula solo con las transacciones de esas fechas. Devuelve
+    (user_id, segment, habito_calc) para los usuarios con transacciones en
+    un segmento válido.
+    """
+    # Un usuario repetido en onboarding (mismo registro con otro formato de
+    # fecha) cuenta una sola vez; si no, el join duplica sus transacciones
+    users = df_users.select("user_id", "first_login_dt").dropDuplicates(["user_id"])
+
+    # Segmento con todo el historial: solo user_id y segment, una agregación
+    segments_df = resolve_segments(df_transactions, segments) \
+        .join(users.select("user_id"), on="user_id", how="left_semi")
+
+    # Hábito: solo las transacciones dentro de la ventana de cada usuario
+    df_tx = df_transactions.select("user_id", "transaction_dt", "type")
+    if date_ranges is not None:
+        df_tx = df_tx.filter(in_date_ranges("transaction_dt", date_ranges))
+    tx, user = df_tx.alias("tx"), users.alias("u")
+    df_tx = tx.join(
+        user,
+        (col("tx.user_id") == col("u.user_id"))
+        & col("tx.transaction_dt").between(
+            col("u.first_login_dt"), date_add(col("u.first_login_dt"), max_window_days(rules))
+        ),
+        how="inner",
+    ).select("tx.user_id", "tx.transaction_dt", "tx.type", "u.first_login_dt")
+    df_tx = df_tx.withColumn("diff_days", datediff(col("transaction_dt"), col("first_login_dt")))
+    habits = df_tx.groupBy("user_id").agg(*[rule.aggregate() for rule in rules])
+
+    # Cada regla aplica solo al segmento resuelto del usuario (sin
+    # transacciones en la ventana el valor es null y la regla no se cumple)
+    flags = [
+        when((col("segment") == rule.segment) & (col(rule.name) >= rule.threshold), 1).otherwise(0)
+        for rule in rules
+    ]
+    habit = flags[0] if len(flags) == 1 else greatest(*flags)
+
+    return segments_df.join(habits, on="user_id", how="left") \
+        .select("user_id", "segment", habit.alias("habito_calc"))
@@ -0,0 +1,98 @@
+"""
+Modo incremental del ETL por cohorte (week_year).
+
+El hábito se mide en los 30 días posteriores a ``first_login_dt``, así que
+una cohorte solo puede cambiar si:
+
+- su ventana sigue abierta respecto de la fecha de datos actual (la última
+  ``transaction_dt`` observada),
+- recibió transacciones nuevas desde la última corrida (watermark), o
+- es una cohorte que todavía no se procesó.
+
+El checkpoint persiste el watermark y las cohortes procesadas; el resto de
+las cohortes quedan intactas en Cassandra y solo se hace upsert de las
+afectadas.
+"""
+import json
+import os
+from datetime import date, datetime, timedelta
+
+from pyspark.sql.functions import col, lit, max as F_max, to_date
+
+HABIT_WINDOW_DAYS = 30
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_PATH = os.path.join(CHECKPOINT_DIR, "etl_watermark.json")
+
+
+def load_checkpoint():
+    """
+    Devuelve el último checkpoint o None si nunca corrió el ETL
+    """
+    if not os.path.exists(CHECKPOINT_PATH):
+        return None
+    with open(CHECKPOINT_PATH) as f:
+        return json.load(f)
+
+
+def save_checkpoint(watermark, cohorts):
+    """
+    Persiste el watermark de transacciones y las cohortes procesadas
+    """
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    checkpoint = {
+        "last_transaction_dt": watermark,
+        "processed_cohorts": sorted(cohorts),
+        "updated_at": datetime.now().isoformat(timespec="seconds"),
+    }
+    tmp_path = CHECKPOINT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_PATH)
+
+
+def transaction_watermark(df_transactions):
+    """
+    Fecha de la última transacción (yyyy-MM-dd) o None si no hay datos.
+    Usa la columna de partición ``transaction_date`` del staging.
+    """
+    row = df_transactions.agg(F_max("transaction_date").alias("max_dt")).collect()[0]
+    return row["max_dt"].isoformat() if row["max_dt"] else None
+
+
+def affected_cohorts(df_onboarding, df_transactions, checkpoint, watermark):
+    """
+    Calcula las cohortes (week_year) que hay que recalcular.
+    Devuelve (cohortes afectadas, todas las cohortes).
+    """
+    cohorts = df_onboarding.groupBy("week_year").agg(
+        F_max(to_date(col("first_login_dt"), "yyyy-MM-dd")).alias("last_login")
+    )
+    cohort_rows = cohorts.collect()
+    all_cohorts = {r["week_year"] for r in cohort_rows if r["week_year"] is not None}
+
+    if checkpoint is None:
+        return all_cohorts, all_cohorts
+
+    affected = all_cohorts - set(checkpoint["processed_cohorts"])
+
+    # Cohortes con la ventana de hábito todavía abierta
+    if watermark is not None:
+        as_of = date.fromisoformat(watermark)
+        affected |= {
+            r["week_year"] for r in cohort_rows
+            if r["week_year"] is not None and r["last_login"] is not None
+            and r["last_login"] + timedelta(days=HABIT_WINDOW_DAYS) >= as_of
+        }
+
+    # Cohortes con transacciones posteriores al watermark anterior
+    previous = checkpoint.get("last_transaction_dt")
+    if previous is not None:
+        # Filtro sobre la partición: solo se leen los días posteriores
+        new_tx_users = df_transactions.filter(
+            col("transaction_date") > to_date(lit(previous))
+        ).select("user_id").distinct()
+        touched = df_onboarding.join(new_tx_users, "user_id", "left_semi") \
+            .select("week_year").distinct().collect()
+        affected |= {r["week_year"] for r in touched if r["week_year"] is not None}
+
+    return affected, all_cohorts
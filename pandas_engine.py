@@ -0,0 +1,261 @@
+"""
+Motor pandas/NumPy del ETL para inputs chicos.
+
+Con los volúmenes del repo casi todo el tiempo de ``etl_pipeline_clean.py``
+se va en levantar la JVM y la SparkSession, no en el cálculo. Este módulo
+implementa los mismos pasos que el camino de Spark, en memoria y
+vectorizados: lectura de los CSV, fechas, asignación A/B, segmento + hábito
+(``HABIT_RULES``) y las métricas finales y sus resúmenes.
+
+Cada paso replica la semántica de su equivalente en Spark para que
+``user_onboarding_metrics_clean`` salga idéntica:
+
+- los CSV se leen como los lee Spark con los esquemas de ``schemas.py``
+  (vacío -> null, fechas ISO con o sin hora, enteros inválidos -> null),
+- el join transacciones ⨝ onboarding conserva los usuarios duplicados de
+  onboarding (sus transacciones cuentan una vez por fila, igual que en Spark),
+- los nulls no cuentan en los agregados condicionales y el empate de
+  segmento lo gana el menor.
+
+``benchmarks/compare_engines.py`` corre los dos motores sobre los mismos
+datos y verifica que la salida coincida.
+"""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from pyspark.sql.types import DoubleType, IntegerType, TimestampType
+
+from ab_assignment import EXPERIMENTS
+from habit_engine import DISTINCT_DAYS, HABIT_RULES, SEGMENTS
+from staging import SOURCES, source_path
+
+# Por debajo de este tamaño total de los CSV, ``--engine auto`` usa pandas
+DEFAULT_MAX_INPUT_MB = 256
+
+METRIC_COLUMNS = ["user_id", "segment", "ab_group", "drop", "activacion", "setup", "habito_calc"]
+
+
+def input_size_bytes(names=None):
+    return sum(os.path.getsize(source_path(name)) for name in (names or SOURCES))
+
+
+def select_engine(engine, max_input_mb=DEFAULT_MAX_INPUT_MB):
+    """
+    Resuelve ``auto``: pandas si los CSV de entrada suman hasta
+    ``max_input_mb`` MB, Spark si no
+    """
+    if engine != "auto":
+        return engine
+    return "pandas" if input_size_bytes() <= max_input_mb * 1024 ** 2 else "spark"
+
+
+def _to_int(series):
+    # Como IntegerType en el lector CSV de Spark: lo que no es entero es null
+    values = pd.to_numeric(series, errors="coerce")
+    values = values.where(values == values.round())
+    return values.astype("Int64")
+
+
+def read_dataset(name, columns):
+    """
+    Lee las columnas ``columns`` del CSV fuente con los tipos del esquema
+    declarado en ``staging.SOURCES``
+    """
+    types = {field.name: field.dataType for field in SOURCES[name][1].fields}
+    df = pd.read_csv(source_path(name), usecols=columns, dtype=str,
+                     keep_default_na=False, na_values=[""])
+    for column in columns:
+        if isinstance(types[column], TimestampType):
+            df[column] = pd.to_datetime(df[column], format="ISO8601", errors="coerce")
+        elif isinstance(types[column], IntegerType):
+            df[column] = _to_int(df[column])
+        elif isinstance(types[column], DoubleType):
+            df[column] = pd.to_numeric(df[column], errors="coerce")
+    return df
+
+
+def format_dates(df_onboarding, df_transactions):
+    """
+    Equivalente a ``to_date(...)``: fecha sin hora
+    """
+    df_onboarding = df_onboarding.assign(first_login_dt=df_onboarding["first_login_dt"].dt.normalize())
+    df_transactions = df_transactions.assign(transaction_dt=df_transactions["transaction_dt"].dt.normalize())
+    return df_onboarding, df_transactions
+
+
+def assign_groups(df, experiments=EXPERIMENTS, user_col="user_id"):
+    """
+    Agrega una columna de grupo por experimento (misma asignación que
+    ``Experiment.spark_column``): un crc32 por usuario distinto y los grupos
+    por búsqueda binaria sobre los límites de buckets
+    """
+    users = df[user_col]
+    unique = users.dropna().unique()
+    df = df.copy()
+    for experiment in experiments:
+        buckets = np.fromiter((experiment.bucket(u) for u in unique), dtype=np.int64, count=len(unique))
+        uppers = np.array([upper for _, upper in experiment.bounds])
+        labels = np.array([group for group, _ in experiment.bounds], dtype=object)
+        index = np.minimum(np.searchsorted(uppers, buckets, side="right"), len(uppers) - 1)
+        groups = pd.Series(labels[index], index=unique)
+        # Un user_id null no tiene bucket: cae en el último grupo (otherwise)
+        df[experiment.column] = users.map(groups).fillna(experiment.bounds[-1][0])
+    return df
+
+
+def compute_user_metrics(df_users, df_transactions, rules=HABIT_RULES, segments=SEGMENTS):
+    """
+    Resuelve el segmento y calcula ``habito_calc`` por usuario (misma
+    semántica que ``habit_engine.compute_user_metrics``). Devuelve
+    (user_id, segment, habito_calc) para los usuarios con transacciones en un
+    segmento válido.
+    """
+    df_tx = df_transactions[df_transactions["user_id"].notna()].merge(
+        # Un usuario repetido en onboarding cuenta una sola vez (como habit_engine)
+        df_users.loc[df_users["user_id"].notna(), ["user_id", "first_login_dt"]].drop_duplicates("user_id"),
+        on="user_id", how="inner",
+    )
+    codes, user_ids = pd.factorize(df_tx["user_id"])
+    n_users = len(user_ids)
+    diff_days = (df_tx["transaction_dt"] - df_tx["first_login_dt"]).dt.days.to_numpy(dtype=float)
+
+    # Conteo por segmento (columnas en orden creciente: argmax desempata por el menor)
+    ordered = sorted(segments)
+    segment_counts = np.column_stack([
+        np.bincount(codes, weights=df_tx["segment"].eq(segment).fillna(False).to_numpy(bool),
+                    minlength=n_users)
+        for segment in ordered
+    ])
+    best = segment_counts.argmax(axis=1)
+    valid = segment_counts[np.arange(n_users), best] > 0
+    segment = np.asarray(ordered)[best]
+
+    habit = np.zeros(n_users, dtype=bool)
+    for rule in rules:
+        mask = (diff_days >= 0) & (diff_days <= rule.window_days)
+        if rule.transaction_types:
+            mask &= df_tx["type"].isin(rule.transaction_types).to_numpy(bool)
+        if rule.measure == DISTINCT_DAYS:
+            days = pd.DataFrame({"user": codes[mask], "day": df_tx["transaction_dt"].to_numpy()[mask]})
+            days = days.dropna().drop_duplicates()
+            value = np.bincount(days["user"].to_numpy(), minlength=n_users)
+        else:
+            value = np.bincount(codes[mask], minlength=n_users)
+        # Cada regla aplica solo al segmento resuelto del usuario
+        habit |= (segment == rule.segment) & (value >= rule.threshold)
+
+    return pd.DataFrame({
+        "user_id": np.asarray(user_ids, dtype=object)[valid],
+        "segment": segment[valid],
+        "habito_calc": habit[valid].astype(np.int64),
+    })
+
+
+def _like_to_pandas(series):
+    # Mismos dtypes que ``toPandas()``: float con NaN si hay nulls, int si no
+    return series.astype("float64") if series.isna().any() else series.astype("int64")
+
+
+def final_metrics(df_onboarding, user_metrics):
+    """
+    LEFT JOIN onboarding ⨝ métricas por usuario, una fila por usuario (como
+    la tabla de Cassandra), filtro de usuarios sin segmento y ``drop``.
+    Devuelve (métricas + ``week_year``, usuarios únicos de onboarding,
+    usuarios sin segmento).
+    """
+    df = df_onboarding.merge(user_metrics, on="user_id", how="left").drop_duplicates("user_id")
+    users = len(df)
+    without_segment = int(df["segment"].isna().sum())
+
+    df = df[df["segment"].notna()].copy()
+    df["drop"] = df["return"].eq(0).fillna(False).astype(np.int64)
+    for column in ("segment", "habito_calc", "activacion", "setup", "week_year"):
+        df[column] = _like_to_pandas(df[column])
+    return df[METRIC_COLUMNS + ["week_year"]].reset_index(drop=True), users, without_segment
+
+
+def enrich_users(df_metrics, df_users):
+    """
+    LEFT JOIN métricas ⨝ dim_users con ``type`` (como ``user_type``) y
+    ``rubro`` enteros, igual que el enriquecimiento del ETL en Spark.
+    Devuelve (métricas enriquecidas, estadísticas del join).
+    """
+    users = pd.DataFrame({
+        "user_id": df_users["user_id"],
+        "user_type": _to_int(df_users["type"]),
+        "rubro": _to_int(df_users["rubro"]),
+    })
+    df = df_metrics.merge(users, on="user_id", how="left")
+    stats = {
+        "rows": len(df),
+        "with_user_type": int(df["user_type"].notna().sum()),
+        "with_rubro": int(df["rubro"].notna().sum()),
+    }
+    return df, stats
+
+
+def ab_group_summary(df_metrics):
+    """
+    Usuarios y tasas (%) por grupo A/B, como el análisis A/B del ETL
+    """
+    grouped = df_metrics.groupby("ab_group")
+    summary = grouped.size().rename("total_users").to_frame()
+    for rate, column in (("drop_rate", "drop"), ("activation_rate", "activacion"),
+                         ("setup_rate", "setup"), ("habit_rate", "habito_calc")):
+        summary[rate] = grouped[column].sum() / summary["total_users"] * 100
+    return summary.reset_index().to_dict("records")
+
+
+def segment_distribution(df_metrics):
+    return [(int(segment), int(n)) for segment, n in df_metrics["segment"].value_counts().sort_index().items()]
+
+
+def funnel(df_metrics):
+    return {
+        "total_users": len(df_metrics),
+        "activated_users": int(df_metrics["activacion"].sum()),
+        "setup_users": int(df_metrics["setup"].sum()),
+        "habit_users": int(df_metrics["habito_calc"].sum()),
+    }
+
+
+def rollup(df_metrics, columns):
+    """
+    Conteos por segmento × grupo A/B × cohorte (``week_year`` null incluido,
+    como el groupBy de Spark). Devuelve tuplas en el orden de ``columns``.
+    """
+    grouped = df_metrics.groupby(["segment", "ab_group", "week_year"], dropna=False)
+    counts = grouped.agg(
+        total_users=("user_id", "size"),
+        activated_users=("activacion", "sum"),
+        setup_users=("setup", "sum"),
+        habit_users=("habito_calc", "sum"),
+        drop_users=("drop", "sum"),
+    ).reset_index()
+    return list(counts[columns].itertuples(index=False, name=None))
+
+
+def write_csv(df, directory):
+    """
+    Reemplaza ``directory`` con un único ``part-00000.csv`` (mismo layout y
+    formato que ``df.write.csv`` de Spark: enteros sin decimales, null vacío)
+    """
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    integral = {c: "Int64" for c in df.columns if df[c].dtype.kind == "f"}
+    df.astype(integral).to_csv(os.path.join(directory, "part-00000.csv"), index=False)
+
+
+def write_csv_by_cohort(df, directory, partition_column="week_year"):
+    """
+    Reemplaza ``directory`` con un ``<partition_column>=<valor>/part-00000.csv``
+    por valor (mismo layout que ``partitionBy`` de Spark; null va a
+    ``__HIVE_DEFAULT_PARTITION__``)
+    """
+    shutil.rmtree(directory, ignore_errors=True)
+    for value, group in df.groupby(partition_column, dropna=False):
+        name = "__HIVE_DEFAULT_PARTITION__" if pd.isna(value) else str(int(value))
+        write_csv(group.drop(columns=partition_column),
+                  os.path.join(directory, f"{partition_column}={name}"))
@@ -0,0 +1,70 @@
+"""
+Reporte estructurado de una corrida del ETL.
+
+Los conteos de filas y las estadísticas de filtros se registran como
+métricas observadas (``DataFrame.observe``): Spark las calcula durante la
+ejecución real que ya hace el pipeline (el cache de las métricas y las
+escrituras), en lugar de disparar un ``count()`` que recalcula todo el
+linaje por cada número que se imprime.
+
+Importante: ``Observation.get`` bloquea hasta que se ejecute alguna acción
+sobre el DataFrame observado, así que solo deben observarse DataFrames que
+alimentan las salidas del ETL, y ``collect()`` se llama después de ellas.
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+
+from pyspark.sql import Observation
+
+REPORT_PATH = os.path.join("artifacts", "run_report.json")
+
+
+class RunReport:
+    """
+    Acumula secciones del reporte (valores observados y registrados a mano)
+    """
+
+    def __init__(self, **metadata):
+        self.run_id = str(uuid.uuid4())
+        self.metadata = {
+            "run_id": self.run_id,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            **metadata,
+        }
+        self.sections = {}
+        self._observations = []
+
+    def observe(self, df, section, **metrics):
+        """
+        Devuelve ``df`` instrumentado con las métricas dadas (nombre -> expresión
+        de agregación). Los valores quedan en ``section`` al llamar ``collect()``.
+        """
+        observation = Observation(section)
+        self._observations.append((section, observation))
+        return df.observe(observation, *[expr.alias(name) for name, expr in metrics.items()])
+
+    def record(self, section, **values):
+        self.sections.setdefault(section, {}).update(values)
+
+    def get(self, section, name, default=None):
+        return self.sections.get(section, {}).get(name, default)
+
+    def collect(self):
+        """
+        Trae al reporte los valores de todas las observaciones pendientes
+        """
+        for section, observation in self._observations:
+            self.record(section, **observation.get)
+        self._observations = []
+
+    def as_dict(self):
+        return {**self.metadata, **self.sections}
+
+    def write(self, path=REPORT_PATH):
+        self.metadata["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2, default=str)
+        return path
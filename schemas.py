@@ -0,0 +1,56 @@
+"""
+Esquemas declarados de los datasets de entrada.
+
+Evitan ``inferSchema=True`` (que obliga a una pasada extra completa sobre
+cada CSV). Spark aplica el esquema por posición, por eso se declaran todas
+las columnas del archivo, incluida la columna de índice sin nombre que dejó
+pandas al exportar.
+
+Las fechas se declaran como timestamp (igual que las infería Spark): el
+lector CSV acepta tanto ``yyyy-MM-dd`` como ``yyyy-MM-dd HH:mm:ss[.n]``, que
+aparecen mezclados en ``first_login_dt`` y ``transaction_dt``.
+"""
+from pyspark.sql.types import (
+    DoubleType,
+    IntegerType,
+    StringType,
+    StructField,
+    StructType,
+    TimestampType,
+)
+
+ONBOARDING_SCHEMA = StructType([
+    StructField("row_index", IntegerType()),
+    StructField("unnamed_0", DoubleType()),
+    StructField("first_login_dt", TimestampType()),
+    StructField("week_year", IntegerType()),
+    StructField("user_id", StringType()),
+    StructField("habito", DoubleType()),
+    StructField("habito_dt", TimestampType()),
+    StructField("activacion", IntegerType()),
+    StructField("activacion_dt", TimestampType()),
+    StructField("setup", IntegerType()),
+    StructField("setup_dt", TimestampType()),
+    StructField("return", IntegerType()),
+    StructField("return_dt", TimestampType()),
+])
+
+USERS_SCHEMA = StructType([
+    StructField("row_index", IntegerType()),
+    StructField("user_id", StringType()),
+    StructField("name", StringType()),
+    StructField("email", StringType()),
+    StructField("address", StringType()),
+    StructField("birth_dt", StringType()),
+    StructField("phone", StringType()),
+    StructField("type", DoubleType()),
+    StructField("rubro", DoubleType()),
+])
+
+TRANSACTIONS_SCHEMA = StructType([
+    StructField("row_index", IntegerType()),
+    StructField("user_id", StringType()),
+    StructField("transaction_dt", TimestampType()),
+    StructField("type", IntegerType()),
+    StructField("segment", IntegerType()),
+])
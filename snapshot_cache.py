@@ -0,0 +1,127 @@
+"""
+Cache stale-while-revalidate para los datos del dashboard.
+
+``SnapshotCache`` guarda la última versión buena de los datos y la sigue
+sirviendo mientras un thread en segundo plano verifica si hay una versión
+nueva (el run_id de la última corrida del ETL) y, solo en ese caso, recarga.
+Ningún usuario espera una recarga salvo la primera vez (y esa carga la
+hace una sola sesión: las demás esperan su resultado); si la verificación
+o la recarga fallan se sigue sirviendo el snapshot anterior y el error queda
+en ``last_error``.
+
+Los loaders corren fuera del thread del script de Streamlit: no deben usar
+funciones ``st.*``.
+"""
+import threading
+import time
+
+
+class SnapshotCache:
+    """
+    - ``loader()``: carga el snapshot completo
+    - ``version_fn()``: versión actual de los datos (consulta liviana); si
+      devuelve None la versión es desconocida y se recarga cada ``max_age``
+      segundos; si lanza una excepción no se recarga (se reintenta en la
+      próxima verificación)
+    - ``check_interval``: segundos mínimos entre verificaciones de versión
+    """
+
+    def __init__(self, loader, version_fn, check_interval=30, max_age=300):
+        self._loader = loader
+        self._version_fn = version_fn
+        self.check_interval = check_interval
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        # Serializa la primera carga entre sesiones concurrentes
+        self._load_lock = threading.Lock()
+        self._snapshot = None
+        self._version = None
+        self._loaded_at = None
+        self._last_check = 0.0
+        self._refreshing = False
+
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.last_error = None
+
+    def get(self):
+        """
+        Devuelve el snapshot actual. Solo bloquea si todavía no hay ninguno;
+        si no, dispara (como mucho) una verificación en segundo plano.
+        """
+        with self._lock:
+            if self._snapshot is not None:
+                self.hits += 1
+                self._maybe_refresh()
+                return self._snapshot
+            self.misses += 1
+
+        # Primera carga: sincrónica (no hay nada viejo para servir). Una sola
+        # sesión corre el loader; las que esperaban reciben su snapshot.
+        with self._load_lock:
+            with self._lock:
+                if self._snapshot is not None:
+                    return self._snapshot
+            try:
+                version = self._version_fn()
+            except Exception as e:
+                # Versión desconocida: la próxima verificación que funcione recarga
+                version = None
+                error = str(e)
+            else:
+                error = None
+            snapshot = self._loader()
+            with self._lock:
+                self._store(snapshot, version)
+                self.last_error = error
+                return self._snapshot
+
+    @property
+    def age(self):
+        """
+        Segundos desde la última carga (None si nunca cargó)
+        """
+        return None if self._loaded_at is None else time.time() - self._loaded_at
+
+    @property
+    def refreshing(self):
+        return self._refreshing
+
+    @property
+    def version(self):
+        return self._version
+
+    def _store(self, snapshot, version):
+        self._snapshot = snapshot
+        self._version = version
+        self._loaded_at = time.time()
+        self._last_check = self._loaded_at
+        self.last_error = None
+
+    def _maybe_refresh(self):
+        # Se llama con el lock tomado
+        now = time.time()
+        if self._refreshing or now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        self._refreshing = True
+        threading.Thread(target=self._refresh, name="snapshot-refresh", daemon=True).start()
+
+    def _refresh(self):
+        try:
+            version = self._version_fn()
+            stale = version != self._version or (
+                version is None and time.time() - self._loaded_at >= self.max_age
+            )
+            if stale:
+                snapshot = self._loader()
+                with self._lock:
+                    self._store(snapshot, version)
+                    self.refreshes += 1
+        except Exception as e:
+            # Verificación o recarga fallida: se sigue sirviendo el snapshot actual
+            self.last_error = str(e)
+        finally:
+            self._refreshing = False
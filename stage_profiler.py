@@ -0,0 +1,172 @@
+"""
+Perfil por etapa de una corrida del ETL.
+
+Cada etapa lógica empieza con ``profiler.start("habit")`` (y termina la
+anterior). Dentro de la etapa los jobs de Spark corren con su propio job
+group, y al terminar la corrida ``collect()`` lee del status store del
+driver (el listener de Spark que alimenta la UI, vía su API REST) las
+métricas de los stages de esos jobs y las suma por etapa:
+
+- ``wall_s``: tiempo de reloj medido en el driver (incluye el trabajo del
+  driver en Python: ``toPandas()``, los inserts en Cassandra, etc.)
+- ``task_s`` / ``cpu_s``: tiempo de las tareas en los executors
+- ``shuffle_read_bytes`` / ``shuffle_write_bytes``
+- ``spill_memory_bytes`` / ``spill_disk_bytes``
+- ``input_rows`` / ``output_rows``: filas leídas de las fuentes y escritas
+
+Spark es lazy: las transformaciones se ejecutan en la etapa que dispara la
+acción. Con ``materialize=True`` cada ``checkpoint()`` persiste y cuenta el
+resultado de la etapa, así el costo queda en la etapa que lo genera (a
+cambio de acciones y cache extra; es para diagnosticar, no para producción).
+
+Con el motor pandas (sin SparkSession, ``spark=None``) solo se mide el
+tiempo de reloj de cada etapa.
+"""
+import json
+import time
+from urllib.request import urlopen
+
+# Métricas de StageData (API REST de Spark) -> nombre en el reporte
+STAGE_METRICS = {
+    "executorRunTime": "task_s",
+    "executorCpuTime": "cpu_s",
+    "shuffleReadBytes": "shuffle_read_bytes",
+    "shuffleWriteBytes": "shuffle_write_bytes",
+    "memoryBytesSpilled": "spill_memory_bytes",
+    "diskBytesSpilled": "spill_disk_bytes",
+    "inputRecords": "input_rows",
+    "outputRecords": "output_rows",
+}
+# Unidades de la API: executorRunTime en ms, executorCpuTime en ns
+TIME_SCALES = {"task_s": 1e-3, "cpu_s": 1e-9}
+
+JOB_GROUP_PREFIX = "etl-stage:"
+
+
+class StageProfiler:
+    def __init__(self, spark, materialize=False):
+        self.sc = spark.sparkContext if spark is not None else None
+        self.materialize = materialize
+        self.stages = {}
+        self._current = None
+        self._checkpoints = []
+
+    def start(self, name):
+        """
+        Empieza la etapa ``name`` (y termina la anterior, si había una).
+        Devuelve el dict de la etapa, donde se pueden agregar valores propios
+        (por ejemplo ``rows``).
+        """
+        self.stop()
+        entry = self.stages.setdefault(name, {"wall_s": 0.0})
+        if self.sc is not None:
+            self.sc.setJobGroup(JOB_GROUP_PREFIX + name, name)
+        self._current = (name, time.perf_counter())
+        return entry
+
+    def stop(self):
+        """
+        Termina la etapa en curso
+        """
+        if self._current is None:
+            return
+        name, started = self._current
+        entry = self.stages[name]
+        entry["wall_s"] = round(entry["wall_s"] + time.perf_counter() - started, 3)
+        if self.sc is not None:
+            self.sc.setLocalProperty("spark.jobGroup.id", None)
+            self.sc.setLocalProperty("spark.job.description", None)
+        self._current = None
+
+    def checkpoint(self, df):
+        """
+        Con ``materialize`` activo persiste y cuenta ``df`` dentro de la
+        etapa actual (y guarda la cantidad de filas en ``rows``). Si no,
+        devuelve ``df`` sin tocarlo.
+        """
+        if not self.materialize or self.sc is None:
+            return df
+        if not df.is_cached:
+            df = df.persist()
+        self._checkpoints.append(df)
+        rows = df.count()
+        if self._current is not None:
+            self.stages[self._current[0]]["rows"] = rows
+        return df
+
+    def release(self):
+        """
+        Libera el cache de los checkpoints
+        """
+        for df in self._checkpoints:
+            df.unpersist()
+        self._checkpoints = []
+
+    def _fetch(self, resource):
+        url = f"{self.sc.uiWebUrl}/api/v1/applications/{self.sc.applicationId}/{resource}"
+        with urlopen(url, timeout=10) as response:
+            return json.load(response)
+
+    def collect(self):
+        """
+        Agrega a cada etapa las métricas de sus stages de Spark y devuelve
+        el perfil completo (etapa -> métricas), en el orden de ejecución
+        """
+        if self.sc is None:
+            return self.stages
+        if not self.sc.uiWebUrl:
+            for entry in self.stages.values():
+                entry["spark_metrics"] = "no disponibles (spark.ui.enabled=false)"
+            return self.stages
+
+        try:
+            jobs = self._fetch("jobs")
+            stage_data = self._fetch("stages")
+        except Exception as e:
+            for entry in self.stages.values():
+                entry["spark_metrics"] = f"no disponibles ({e})"
+            return self.stages
+
+        # Cada stage de Spark se asigna a la etapa del job que lo ejecutó
+        stage_owner = {}
+        job_counts = {}
+        for job in sorted(jobs, key=lambda j: j["jobId"]):
+            group = job.get("jobGroup") or ""
+            if not group.startswith(JOB_GROUP_PREFIX):
+                continue
+            name = group[len(JOB_GROUP_PREFIX):]
+            job_counts[name] = job_counts.get(name, 0) + 1
+            for stage_id in job["stageIds"]:
+                stage_owner.setdefault(stage_id, name)
+
+        for name, entry in self.stages.items():
+            entry["jobs"] = job_counts.get(name, 0)
+            entry["spark_stages"] = 0
+            for metric in STAGE_METRICS.values():
+                entry[metric] = 0
+
+        for stage in stage_data:
+            name = stage_owner.get(stage["stageId"])
+            if name is None or stage.get("status") == "SKIPPED":
+                continue
+            entry = self.stages[name]
+            entry["spark_stages"] += 1
+            for source, metric in STAGE_METRICS.items():
+                entry[metric] += stage.get(source, 0) * TIME_SCALES.get(metric, 1)
+
+        for entry in self.stages.values():
+            for metric in TIME_SCALES:
+                entry[metric] = round(entry[metric], 3)
+        return self.stages
+
+    def summary_lines(self):
+        for name, entry in self.stages.items():
+            line = f"- {name}: {entry['wall_s']:.2f}s"
+            if "task_s" in entry:
+                line += (f" (tareas {entry['task_s']:.2f}s, shuffle "
+                         f"{entry['shuffle_read_bytes'] / 1024 ** 2:.1f}/"
+                         f"{entry['shuffle_write_bytes'] / 1024 ** 2:.1f} MB, spill "
+                         f"{(entry['spill_memory_bytes'] + entry['spill_disk_bytes']) / 1024 ** 2:.1f} MB)")
+            if "rows" in entry:
+                line += f", {entry['rows']:,} filas"
+            yield line
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repo (sin paquete)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def spark(tmp_path_factory):
+    """
+    SparkSession local compartida por los tests que usan Spark
+    """
+    from pyspark.sql import SparkSession
+
+    session = SparkSession.builder \
+        .master("local[2]") \
+        .appName("fintech-tests") \
+        .config("spark.sql.shuffle.partitions", 2) \
+        .config("spark.sql.warehouse.dir", str(tmp_path_factory.mktemp("warehouse"))) \
+        .getOrCreate()
+    session.sparkContext.setLogLevel("ERROR")
+    yield session
+    session.stop()
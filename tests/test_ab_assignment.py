@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+import pandas_engine
+from ab_assignment import BUCKETS, ONBOARDING_EXPERIMENT, Experiment, assign_groups
+
+USER_IDS = [f"MLB{i:011d}" for i in range(0, 3000 * 7919, 7919)]
+
+
+def test_split_must_sum_one():
+    with pytest.raises(ValueError):
+        Experiment("roto", [("control", 0.5), ("treatment", 0.6)])
+
+
+def test_assignment_is_deterministic_and_follows_the_split():
+    groups = [ONBOARDING_EXPERIMENT.assign(u) for u in USER_IDS]
+    assert groups == [ONBOARDING_EXPERIMENT.assign(u) for u in USER_IDS]
+    control_rate = groups.count("control") / len(groups)
+    assert 0.03 < control_rate < 0.07
+    assert set(groups) == {"control", "treatment"}
+
+
+def test_salt_makes_experiments_independent():
+    other = Experiment("otro", [("control", 0.05), ("treatment", 0.95)])
+    assert [ONBOARDING_EXPERIMENT.bucket(u) for u in USER_IDS] != [other.bucket(u) for u in USER_IDS]
+    assert all(0 <= other.bucket(u) < BUCKETS for u in USER_IDS)
+
+
+def test_pandas_matches_python():
+    df = pandas_engine.assign_groups(pd.DataFrame({"user_id": USER_IDS + USER_IDS[:10]}))
+    assert df["ab_group"].tolist() == [ONBOARDING_EXPERIMENT.assign(u) for u in USER_IDS + USER_IDS[:10]]
+
+
+def test_spark_matches_python(spark):
+    three_way = Experiment("tres", [("a", 0.2), ("b", 0.3), ("c", 0.5)], column="ab_tres")
+    experiments = [ONBOARDING_EXPERIMENT, three_way]
+    df = assign_groups(spark.createDataFrame([(u,) for u in USER_IDS], ["user_id"]), experiments)
+    rows = {r["user_id"]: (r["ab_group"], r["ab_tres"]) for r in df.collect()}
+    assert rows == {u: (ONBOARDING_EXPERIMENT.assign(u), three_way.assign(u)) for u in USER_IDS}
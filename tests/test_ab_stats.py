@@ -0,0 +1,101 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ab_stats import (
+    METRICS,
+    ab_significance,
+    bootstrap_diff_ci,
+    two_proportion_test,
+    two_sided_p_value,
+    wilson_interval,
+)
+
+
+def test_p_value_matches_the_normal_distribution():
+    z = np.array([0.0, 0.5, 1.0, 1.959963984540054, 3.0, -2.0])
+    expected = [math.erfc(abs(v) / math.sqrt(2)) for v in z]
+    assert np.allclose(two_sided_p_value(z), expected, atol=2e-7)
+
+
+def test_two_proportion_test_known_values():
+    result = two_proportion_test(50, 100, 60, 100)
+    assert result["diff"] == pytest.approx(0.10)
+    assert result["z"] == pytest.approx(0.10 / math.sqrt(0.55 * 0.45 * 0.02))
+    assert result["p_value"] == pytest.approx(0.1552, abs=1e-3)
+
+
+@pytest.mark.parametrize("x_t, n_t, x_c, n_c, expected", [
+    # Ejemplos de Newcombe (1998), método 10
+    (56, 70, 48, 80, (0.0524, 0.3339)),
+    (9, 10, 3, 10, (0.1705, 0.8090)),
+    (0, 10, 0, 20, (-0.1611, 0.2775)),
+])
+def test_newcombe_interval_matches_published_values(x_t, n_t, x_c, n_c, expected):
+    result = two_proportion_test(x_c, n_c, x_t, n_t)
+    assert (result["ci_low"], result["ci_high"]) == pytest.approx(expected, abs=1e-4)
+
+
+def test_interval_does_not_collapse_at_zero_or_full_rates():
+    # Control con x=0 y tratamiento con x=n; después ambos grupos en 0
+    result = two_proportion_test([0, 0], [40], [800, 0], [800])
+    low, high = result["ci_low"], result["ci_high"]
+    assert np.all(high - low > 0)
+    assert np.all((low <= result["diff"]) & (result["diff"] <= high))
+    assert result["diff"][0] == pytest.approx(1.0) and high[0] == pytest.approx(1.0)
+    assert 0.9 < low[0] < 1
+    # Sin diferencia observada, el intervalo contiene el 0 (como p ≈ 1)
+    assert low[1] < 0 < high[1] and result["p_value"][1] == pytest.approx(1.0, abs=1e-6)
+
+    boot_low, boot_high = bootstrap_diff_ci([0, 0], [40], [800, 0], [800], n_resamples=2000)
+    assert np.all(boot_high - boot_low > 0)
+    assert boot_low[1] < 0 < boot_high[1]
+
+
+def test_wilson_interval_stays_inside_zero_one():
+    low, high = wilson_interval([0, 5, 20], [20])
+    assert low[0] == pytest.approx(0.0) and high[2] == pytest.approx(1.0)
+    assert np.all((0 <= low) & (low < high) & (high <= 1))
+
+
+def test_two_proportion_test_broadcasts():
+    result = two_proportion_test([[5, 10]], [[100]], [[50, 100]], [[1000]])
+    assert result["diff"].shape == (1, 2)
+    assert np.allclose(result["diff"], [[0.0, 0.0]])
+    assert np.allclose(result["p_value"], [[1.0, 1.0]], atol=1e-6)
+
+
+def test_bootstrap_is_reproducible_and_brackets_the_difference():
+    low, high = bootstrap_diff_ci([50], [100], [60], [100], n_resamples=2000, seed=3)
+    again = bootstrap_diff_ci([50], [100], [60], [100], n_resamples=2000, seed=3)
+    assert (low, high) == again
+    assert low[0] < 0.10 < high[0]
+
+
+def rollup():
+    rows = []
+    for segment, (control, treatment) in {1: (40, 800), 2: (60, 1200)}.items():
+        for group, users in (("control", control), ("treatment", treatment)):
+            rows.append({"segment": segment, "ab_group": group, "week_year": 202401, "total_users": users,
+                         "activated_users": users // 2, "setup_users": users // 4,
+                         "habit_users": users // 10, "drop_users": users // 5})
+    return pd.DataFrame(rows)
+
+
+def test_ab_significance_has_total_and_segments_for_every_metric():
+    table = ab_significance(rollup(), n_resamples=500)
+    assert len(table) == 3 * len(METRICS)
+    assert list(table["segment"].unique()) == ["Total", 1, 2]
+    assert list(table["metric"][:len(METRICS)]) == list(METRICS)
+    total = table[(table["segment"] == "Total") & (table["metric"] == "activacion")].iloc[0]
+    assert total["control_users"] == 100 and total["treatment_users"] == 2000
+    assert total["diff"] == pytest.approx(0.0)
+    assert not table["significant"].any()
+
+
+def test_ab_significance_requires_both_groups():
+    counts = rollup()
+    with pytest.raises(ValueError):
+        ab_significance(counts[counts["ab_group"] == "treatment"])
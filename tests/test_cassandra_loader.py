@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import cassandra_loader
+from cassandra_loader import METRIC_COLUMNS
+
+
+class NumpyHandler:
+    """Reemplaza a ``NumpyProtocolHandler`` (el driver puede no tener las extensiones)"""
+
+
+class StubResult:
+    def __init__(self, pages):
+        self._pages = pages
+        self._index = 0
+
+    @property
+    def current_rows(self):
+        return self._pages[self._index]
+
+    @property
+    def has_more_pages(self):
+        return self._index + 1 < len(self._pages)
+
+    @property
+    def paging_state(self):
+        return self._index + 1 if self.has_more_pages else None
+
+    def fetch_next_page(self):
+        self._index += 1
+
+
+class StubSession:
+    """Sesión que devuelve páginas fijas; registra el paging_state pedido"""
+
+    def __init__(self, pages, handler=None):
+        self.pages = pages
+        self.client_protocol_handler = handler
+        self.paging_states = []
+
+    def execute(self, statement, parameters=None, paging_state=None):
+        self.paging_states.append(paging_state)
+        result = StubResult(self.pages)
+        result._index = paging_state or 0
+        return result
+
+
+class StubStatement:
+    def bind(self, parameters):
+        return self
+
+
+def numpy_page(user_ids, segment, ab_group, flags):
+    # Como NumpyProtocolHandler: current_rows = [dict columna -> array]
+    page = {"user_id": np.array(user_ids, dtype=object), "segment": segment,
+            "ab_group": np.array(ab_group, dtype=object)}
+    for c in ("drop", "activacion", "setup", "habito_calc"):
+        page[c] = flags
+    return [page]
+
+
+@pytest.fixture
+def numpy_session(monkeypatch):
+    monkeypatch.setattr(cassandra_loader, "NumpyProtocolHandler", NumpyHandler)
+    pages = [
+        numpy_page(["a", "b"], np.array([1, 2], dtype=np.int32), ["control", "treatment"],
+                   np.array([1, 0], dtype=np.int32)),
+        numpy_page(["c"], np.ma.masked_array([2], mask=[True]), ["treatment"],
+                   np.ma.masked_array(np.array([1], dtype=np.int32), mask=[True])),
+    ]
+    return StubSession(pages, handler=NumpyHandler)
+
+
+def test_fetch_columns_concatenates_numpy_pages(numpy_session):
+    chunks, pages = cassandra_loader.fetch_columns(numpy_session, StubStatement(), METRIC_COLUMNS)
+    df = cassandra_loader.to_compact_frame(chunks)
+
+    assert pages == 2
+    assert list(df["user_id"]) == ["a", "b", "c"]
+    assert list(df["ab_group"]) == ["control", "treatment", "treatment"]
+    # Celda null del segmento -> NaN; flag null -> 0
+    assert df["segment"].isna().tolist() == [False, False, True]
+    assert df["activacion"].tolist() == [1, 0, 0]
+    assert df["activacion"].dtype == np.int8
+
+
+def test_tuple_pages_give_the_same_frame(numpy_session):
+    rows = [
+        [("a", 1, "control", 1, 1, 1, 1), ("b", 2, "treatment", 0, 0, 0, 0)],
+        [("c", None, "treatment", None, None, None, None)],
+    ]
+    chunks, _ = cassandra_loader.fetch_columns(StubSession(rows), StubStatement(), METRIC_COLUMNS)
+    from_tuples = cassandra_loader.to_compact_frame(chunks)
+
+    chunks, _ = cassandra_loader.fetch_columns(numpy_session, StubStatement(), METRIC_COLUMNS)
+    from_numpy = cassandra_loader.to_compact_frame(chunks)
+
+    pd.testing.assert_frame_equal(from_tuples, from_numpy, check_categorical=False)
+
+
+def test_fetch_page_and_iter_pages_with_numpy_pages(numpy_session):
+    first, state = cassandra_loader.fetch_page(numpy_session, StubStatement(), ())
+    assert list(first["user_id"]) == ["a", "b"]
+    assert state == 1
+
+    pages = list(cassandra_loader.iter_pages(numpy_session, StubStatement(), ()))
+    assert [list(p["user_id"]) for p in pages] == [["a", "b"], ["c"]]
+    assert numpy_session.paging_states[-2:] == [None, 1]
+
+
+@pytest.mark.parametrize("splits", [1, 7, 32])
+def test_token_ranges_cover_the_ring_once(splits):
+    ranges = cassandra_loader.token_ranges(splits)
+
+    assert len(ranges) == splits
+    assert ranges[0][0] == cassandra_loader.MIN_TOKEN
+    assert ranges[-1][1] == cassandra_loader.MAX_TOKEN
+    assert all(start < end for start, end in ranges)
+    # Contiguos: cada rango empieza donde termina el anterior
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+class TokenStatement:
+    """Statement preparado: ``bind`` devuelve un bound con los parámetros"""
+
+    def bind(self, parameters):
+        return TokenBound(parameters)
+
+
+class TokenBound:
+    def __init__(self, parameters):
+        self.parameters = parameters
+        self.fetch_size = None
+
+
+class TokenSession(StubSession):
+    """
+    Cada fila tiene un token fijo; la consulta devuelve las filas con
+    ``start < token <= end``, de a ``fetch_size`` por página
+    """
+
+    def __init__(self, rows_by_token):
+        super().__init__(pages=None)
+        self.rows_by_token = rows_by_token
+        self.bound = []
+
+    def prepare(self, query):
+        return TokenStatement()
+
+    def execute(self, statement, parameters=None, paging_state=None):
+        self.bound.append(statement)
+        start, end = statement.parameters
+        rows = [row for token, row in sorted(self.rows_by_token.items()) if start < token <= end]
+        size = statement.fetch_size
+        pages = [rows[i:i + size] for i in range(0, len(rows), size)] or [[]]
+        self.paging_states.append(paging_state)
+        result = StubResult(pages)
+        result._index = paging_state or 0
+        return result
+
+
+@pytest.fixture
+def token_session():
+    tokens = [cassandra_loader.MIN_TOKEN + 1, -10 ** 18, -1, 0, 1, 10 ** 18, cassandra_loader.MAX_TOKEN]
+    return TokenSession({
+        token: (f"u{i}", 1 + i % 2, "treatment", 1, 0, 1, i % 2) for i, token in enumerate(tokens)
+    })
+
+
+def test_parallel_load_reads_every_row_once(token_session):
+    df = cassandra_loader.load_metrics_frame_parallel(
+        token_session, "t", workers=3, splits_per_worker=2, fetch_size=1
+    )
+
+    assert sorted(df["user_id"]) == [f"u{i}" for i in range(7)]
+    assert df.attrs["token_ranges"] == 6
+    assert df.attrs["pages"] >= 7
+    assert {b.fetch_size for b in token_session.bound} == {1}
+
+
+def test_fetch_page_follows_the_paging_state(token_session):
+    statement = TokenStatement()
+    ring = (cassandra_loader.MIN_TOKEN, cassandra_loader.MAX_TOKEN)
+    user_ids, state, calls = [], None, 0
+    while True:
+        page, state = cassandra_loader.fetch_page(token_session, statement, ring, page_size=3, paging_state=state)
+        user_ids += list(page["user_id"])
+        calls += 1
+        if state is None:
+            break
+
+    assert calls == 3
+    assert user_ids == [f"u{i}" for i in range(7)]
+    assert token_session.paging_states == [None, 1, 2]
+    assert token_session.bound[-1].fetch_size == 3
@@ -0,0 +1,115 @@
+import random
+import threading
+from collections import Counter
+
+import numpy as np
+from cassandra import InvalidRequest, OperationTimedOut, WriteTimeout
+
+from cassandra_writer import CassandraWriter, WriteStats, combine_partition_stats
+
+
+def partition_result(latencies):
+    stats = WriteStats()
+    stats.latencies = latencies
+    stats.rows_written = len(latencies)
+    result = stats.as_dict()
+    result["errors"] = []
+    result["latency_histogram"] = dict(stats.latency_histogram())
+    return result
+
+
+def test_combined_percentiles_use_every_row():
+    rng = random.Random(7)
+    partitions = [[rng.lognormvariate(-6 + i * 0.2, 0.5) for _ in range(2000)] for i in range(6)]
+    combined = combine_partition_stats([partition_result(p) for p in partitions], elapsed=1.0)
+
+    exact = WriteStats()
+    exact.latencies = [latency for p in partitions for latency in p]
+    assert combined.rows_written == len(exact.latencies)
+    for pct in (50, 99):
+        assert abs(combined.latency_percentile(pct) / exact.latency_percentile(pct) - 1) < 0.011
+
+
+def test_combined_p50_is_not_a_partition_p99():
+    fast = partition_result([0.001] * 980 + [0.050] * 20)
+    combined = combine_partition_stats([fast, fast], elapsed=1.0)
+    assert round(combined.latency_percentile(50), 4) == 0.001
+    assert round(combined.latency_percentile(99), 2) == 0.05
+
+
+class StubFuture:
+    def __init__(self, error):
+        self.error = error
+
+    def add_callbacks(self, callback, callback_args=(), errback=None, errback_args=()):
+        if self.error is None:
+            callback(None, *callback_args)
+        else:
+            errback(self.error, *errback_args)
+
+
+class FlakySession:
+    """
+    Sesión stub: cada fila falla con ``errors[user_id]`` (lista de errores
+    por intento) y después se escribe
+    """
+
+    def __init__(self, errors=None):
+        self.errors = {key: list(values) for key, values in (errors or {}).items()}
+        self.attempts = Counter()
+        self.written = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, query):
+        return query
+
+    def execute_async(self, statement, parameters=None):
+        user_id = parameters[0]
+        with self._lock:
+            self.attempts[user_id] += 1
+            pending = self.errors.get(user_id)
+            error = pending.pop(0) if pending else None
+            if error is None:
+                self.written[user_id] = parameters
+        return StubFuture(error)
+
+
+def write(session, rows, **kwargs):
+    writer = CassandraWriter(session, "metrics", ["user_id", "segment", "habito_calc"],
+                             base_backoff=0.001, max_backoff=0.005, **kwargs)
+    return writer.write_rows(rows)
+
+
+ROWS = [(f"u{i}", np.int64(1), np.float64("nan") if i % 2 else np.int64(0)) for i in range(20)]
+
+
+def test_writes_every_row_with_native_values():
+    session = FlakySession()
+    stats = write(session, ROWS, max_in_flight=4)
+    assert stats.rows_written == 20 and stats.rows_failed == 0 and stats.retries == 0
+    assert session.written["u0"] == ("u0", 1, 0) and type(session.written["u0"][1]) is int
+    assert session.written["u1"] == ("u1", 1, None)
+    assert len(stats.latencies) == 20
+
+
+def test_transient_errors_are_retried_and_counted():
+    session = FlakySession({"u3": [WriteTimeout("timeout", write_type=0)] * 2, "u7": [OperationTimedOut("timeout")]})
+    stats = write(session, ROWS)
+    assert stats.rows_written == 20 and stats.rows_failed == 0
+    assert stats.retries == 3
+    assert session.attempts["u3"] == 3 and session.attempts["u7"] == 2
+
+
+def test_retries_stop_at_max_retries():
+    session = FlakySession({"u5": [WriteTimeout("timeout", write_type=0)] * 10})
+    stats = write(session, ROWS, max_retries=2)
+    assert stats.rows_written == 19 and stats.rows_failed == 1
+    assert stats.retries == 2 and session.attempts["u5"] == 3
+    assert stats.errors and stats.errors[0].startswith("u5:")
+
+
+def test_non_retryable_errors_fail_immediately():
+    session = FlakySession({"u2": [InvalidRequest("columna desconocida")]})
+    stats = write(session, ROWS)
+    assert stats.rows_failed == 1 and stats.retries == 0
+    assert session.attempts["u2"] == 1
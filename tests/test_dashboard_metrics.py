@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+from dashboard_metrics import ROLLUP_COLUMNS, compute_cube, rollup_from_rows
+
+# segment, ab_group, week_year, total, activados, setup, hábito, drop
+ROLLUP = pd.DataFrame([
+    (1, 'control', 1, 10, 8, 6, 2, 1),
+    (1, 'control', 2, 10, 6, 4, 2, 3),
+    (1, 'treatment', 1, 100, 90, 70, 40, 5),
+    (2, 'control', 2, 20, 10, 10, 5, 2),
+    (2, 'treatment', 2, 200, 150, 120, 80, 20),
+], columns=ROLLUP_COLUMNS)
+
+
+def test_cube_sums_cohorts_and_computes_rates():
+    cube = compute_cube(ROLLUP)
+
+    assert cube['totals'] == {'total_users': 340, 'activated_users': 264, 'setup_users': 210,
+                              'habit_users': 129, 'drop_users': 31}
+    assert cube['cohorts'] == 2
+
+    by_segment = cube['by_segment'].set_index('Segmento')
+    assert by_segment.loc['Individuals', 'Total_Usuarios'] == 120
+    assert by_segment.loc['Sellers', 'Tasa_Habito'] == pytest.approx(85 / 220 * 100)
+
+    cell = cube['by_segment_group'].set_index(['Segmento', 'Grupo']).loc[('Individuals', 'control')]
+    assert cell['Total_Usuarios'] == 20
+    assert cell['Tasa_Activacion'] == pytest.approx(70)
+
+
+def test_ab_diff_and_significance_cover_total_and_segments():
+    cube = compute_cube(ROLLUP)
+
+    by_group = cube['by_group'].set_index('Grupo')
+    expected = by_group.loc['treatment', 'Tasa_Habito'] - by_group.loc['control', 'Tasa_Habito']
+    assert cube['ab_diff']['Tasa_Habito'] == pytest.approx(expected)
+    assert set(cube['significance']['segment_nombre']) == {'Total', 'Individuals', 'Sellers'}
+
+
+def test_without_control_there_is_no_comparison():
+    cube = compute_cube(ROLLUP[ROLLUP['ab_group'] == 'treatment'])
+    assert cube['ab_diff'] is None
+    assert cube['significance'] is None
+
+
+def test_rollup_from_rows_matches_the_etl_rollup():
+    rows = pd.DataFrame({
+        'user_id': ['a', 'b', 'c'],
+        'segment': [1, 1, 2],
+        'ab_group': ['control', 'control', 'treatment'],
+        'activacion': [1, 0, 1],
+        'setup': [1, 0, 0],
+        'habito_calc': [1, 0, 0],
+        'drop': [0, 1, 1],
+    })
+    rollup = rollup_from_rows(rows)
+
+    assert list(rollup.columns) == ROLLUP_COLUMNS
+    assert rollup.set_index(['segment', 'ab_group']).loc[(1, 'control')].tolist() == [0, 2, 1, 1, 1, 1]
@@ -0,0 +1,81 @@
+import gzip
+import os
+
+import pandas as pd
+import pytest
+
+from data_export import CSV, CSV_GZIP, PARQUET, available_formats, export_chunks, remove_expired
+
+COLUMNS = ["user_id", "segment_nombre", "habito_calc"]
+
+
+def pages():
+    # Cada página con sus propias categorías, como las de Cassandra
+    yield pd.DataFrame({"user_id": ["a", "b"], "segment_nombre": pd.Categorical(["Individuals", "Sellers"]),
+                        "habito_calc": [1, 0], "extra": [9, 9]})
+    yield pd.DataFrame({"user_id": ["c"], "segment_nombre": pd.Categorical(["Sellers"]),
+                        "habito_calc": [1], "extra": [9]})
+
+
+EXPECTED = pd.DataFrame({"user_id": ["a", "b", "c"],
+                         "segment_nombre": ["Individuals", "Sellers", "Sellers"],
+                         "habito_calc": [1, 0, 1]})
+
+
+def test_compact_formats_come_first():
+    formats = available_formats()
+    assert formats[-2:] == [CSV_GZIP, CSV]
+    assert formats[0] in (PARQUET, CSV_GZIP)
+
+
+@pytest.mark.parametrize("fmt", [CSV, CSV_GZIP])
+def test_csv_export_writes_every_page(tmp_path, fmt):
+    path, rows = export_chunks(pages(), COLUMNS, fmt, directory=tmp_path)
+    assert rows == 3 and path.endswith(f".{fmt}")
+    if fmt == CSV_GZIP:
+        with gzip.open(path, "rt") as f:
+            assert f.readline().strip() == ",".join(COLUMNS)
+    pd.testing.assert_frame_equal(pd.read_csv(path), EXPECTED)
+
+
+def test_parquet_export(tmp_path):
+    if PARQUET not in available_formats():
+        pytest.skip("pyarrow no está instalado")
+    path, rows = export_chunks(pages(), COLUMNS, PARQUET, directory=tmp_path)
+    assert rows == 3
+    pd.testing.assert_frame_equal(pd.read_parquet(path), EXPECTED)
+
+
+def test_empty_export_keeps_the_header(tmp_path):
+    path, rows = export_chunks(iter([]), COLUMNS, CSV, directory=tmp_path)
+    assert rows == 0
+    assert list(pd.read_csv(path).columns) == COLUMNS
+
+
+def test_failed_export_removes_the_file(tmp_path):
+    def broken():
+        yield from pages()
+        raise RuntimeError("se cortó la lectura")
+
+    with pytest.raises(RuntimeError):
+        export_chunks(broken(), COLUMNS, CSV_GZIP, directory=tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        export_chunks(pages(), COLUMNS, "xlsx", directory=tmp_path)
+
+
+def test_remove_expired_only_deletes_old_exports(tmp_path):
+    old, _ = export_chunks(pages(), COLUMNS, CSV, directory=tmp_path)
+    recent, _ = export_chunks(pages(), COLUMNS, CSV, directory=tmp_path)
+    other = tmp_path / "notas.txt"
+    other.write_text("no es una exportación")
+    now = os.stat(recent).st_mtime + 60
+    os.utime(old, (now - 3600, now - 3600))
+    os.utime(other, (now - 3600, now - 3600))
+
+    assert remove_expired(tmp_path, max_age_seconds=600, now=now) == 1
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(recent), "notas.txt"])
+    assert remove_expired(tmp_path / "no_existe", max_age_seconds=600) == 0
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+import staging
+from conftest import ROOT
+from datasets import DatasetRegistry, required_columns
+
+SAMPLE_ROWS = 50
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    Primeras filas de onboarding y transacciones; dim_users no existe, así
+    que cualquier intento de leerlo falla
+    """
+    for file_name in ("lk_onboarding.csv", "bt_users_transactions.csv"):
+        with open(os.path.join(ROOT, file_name)) as source:
+            lines = [next(source) for _ in range(SAMPLE_ROWS + 1)]
+        (tmp_path / file_name).write_text("".join(lines))
+    staging_dir = tmp_path / "staging"
+    monkeypatch.setattr(staging, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(staging, "STAGING_DIR", str(staging_dir))
+    monkeypatch.setattr(staging, "MANIFEST_PATH", str(staging_dir / "_manifest.json"))
+    return tmp_path
+
+
+def test_columns_are_the_union_of_the_requested_outputs():
+    columns = required_columns(["metrics", "user_enrichment"])
+    assert list(columns) == ["onboarding", "transactions", "users"]
+    assert columns["users"] == ["user_id", "type", "rubro"]
+    assert "users" not in required_columns(["metrics"])
+
+
+def test_unknown_outputs_and_unused_datasets_fail():
+    with pytest.raises(ValueError):
+        DatasetRegistry(["metrics", "otra"])
+    registry = DatasetRegistry(["metrics"])
+    assert not registry.requires("users")
+    with pytest.raises(KeyError):
+        registry.get("users")
+
+
+def test_pandas_registry_reads_each_dataset_once(data_dir):
+    registry = DatasetRegistry(["metrics"])
+    df = registry.get("onboarding")
+
+    assert registry.get("onboarding") is df
+    assert sorted(df.columns) == sorted(registry.columns["onboarding"])
+    assert len(df) == SAMPLE_ROWS
+
+
+def test_spark_registry_stages_on_first_access(spark, data_dir, capsys):
+    registry = DatasetRegistry(["metrics", "user_enrichment"], spark)
+    assert not os.path.exists(staging.MANIFEST_PATH)
+
+    df = registry.get("onboarding")
+    assert registry.get("onboarding") is df
+    assert df.count() == SAMPLE_ROWS
+    # Solo se convirtió lo pedido: ni transacciones ni dim_users
+    assert not os.path.exists(staging.staged_path("transactions"))
+    assert not os.path.exists(staging.staged_path("users"))
+    assert "onboarding: CSV convertido a Parquet" in capsys.readouterr().out
+
+    # La partición se lee de los directorios del staging
+    assert "transaction_date" in registry.get("transactions").columns
+    assert "transactions: CSV convertido a Parquet" in capsys.readouterr().out
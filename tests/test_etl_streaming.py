@@ -0,0 +1,116 @@
+from etl_streaming import (
+    METRICS_TABLE,
+    ROLLUP_COUNTS,
+    ROLLUP_TABLE,
+    RUN_METADATA_TABLE,
+    apply_rollup_deltas,
+    merge_deltas,
+    publish_run_metadata,
+    rollup_deltas,
+)
+
+
+def metrics_row(segment, ab_group="A", habit=0, activacion=1, setup=0, drop=0):
+    return {"user_id": "u1", "segment": segment, "ab_group": ab_group, "drop": drop,
+            "activacion": activacion, "setup": setup, "habito_calc": habit}
+
+
+def test_new_user_adds_one_row_to_its_group():
+    assert rollup_deltas(metrics_row(1, habit=1), None, 202401) == {
+        (1, "A", 202401): [1, 1, 0, 1, 0],
+    }
+
+
+def test_segment_change_moves_the_user_between_rollup_rows():
+    deltas = rollup_deltas(metrics_row(2), metrics_row(1, habit=1), 202401)
+    assert deltas == {
+        (2, "A", 202401): [1, 1, 0, 0, 0],
+        (1, "A", 202401): [-1, -1, 0, -1, 0],
+    }
+
+
+def test_habit_change_only_touches_the_habit_count():
+    deltas = rollup_deltas(metrics_row(1, habit=1), metrics_row(1, habit=0), 202401)
+    assert deltas == {(1, "A", 202401): [0, 0, 0, 1, 0]}
+
+
+def test_unchanged_row_and_missing_cohort_give_no_deltas():
+    assert rollup_deltas(metrics_row(1), metrics_row(1), 202401) == {}
+    assert rollup_deltas(metrics_row(1), None, None) == {}
+
+
+def test_merge_deltas_sums_per_key():
+    total = {}
+    merge_deltas(total, rollup_deltas(metrics_row(1), None, 202401))
+    merge_deltas(total, rollup_deltas(metrics_row(2), metrics_row(1), 202401))
+    assert total == {(1, "A", 202401): [0, 0, 0, 0, 0], (2, "A", 202401): [1, 1, 0, 0, 0]}
+
+
+class Row:
+    def __init__(self, **columns):
+        self.__dict__.update(columns)
+
+
+class StubResult(list):
+    def one(self):
+        return self[0] if self else None
+
+
+class StubSession:
+    """
+    Rollup en memoria: interpreta las sentencias preparadas de
+    apply_rollup_deltas y publish_run_metadata por su prefijo
+    """
+
+    def __init__(self, rollup=None):
+        self.rollup = dict(rollup or {})
+        self.metadata = []
+
+    def prepare(self, query):
+        return " ".join(query.split())
+
+    def execute(self, statement, parameters=None):
+        if statement.startswith("SELECT total_users"):
+            counts = self.rollup.get(tuple(parameters))
+            return StubResult([Row(**dict(zip(ROLLUP_COUNTS, counts)))] if counts else [])
+        if statement.startswith(f"INSERT INTO {ROLLUP_TABLE}"):
+            self.rollup[tuple(parameters[:3])] = list(parameters[3:])
+        elif statement.startswith("DELETE"):
+            self.rollup.pop(tuple(parameters), None)
+        elif statement.startswith("SELECT segment, ab_group, total_users"):
+            return StubResult(Row(segment=s, ab_group=g, total_users=counts[0])
+                              for (s, g, _), counts in self.rollup.items())
+        elif statement.startswith(f"INSERT INTO {RUN_METADATA_TABLE}"):
+            self.metadata.append(parameters)
+        return StubResult()
+
+
+def test_apply_rollup_deltas_adds_creates_and_deletes_rows():
+    session = StubSession({
+        (1, "A", 202401): [2, 2, 1, 1, 0],
+        (2, "A", 202401): [1, 1, 0, 0, 0],
+    })
+    apply_rollup_deltas(session, {
+        (1, "A", 202401): [1, 0, 0, 1, 0],
+        (2, "A", 202401): [-1, -1, 0, 0, 0],
+        (2, "B", 202402): [1, 1, 1, 0, 0],
+    })
+    assert session.rollup == {
+        (1, "A", 202401): [3, 2, 1, 2, 0],
+        (2, "B", 202402): [1, 1, 1, 0, 0],
+    }
+
+
+def test_publish_run_metadata_totals_the_rollup():
+    session = StubSession({
+        (1, "A", 202401): [3, 0, 0, 0, 0],
+        (2, "A", 202402): [2, 0, 0, 0, 0],
+        (2, "B", 202402): [5, 0, 0, 0, 0],
+    })
+    run_id = publish_run_metadata(session)
+
+    (table, _, published_run_id, mode, row_count, ab_group_counts, segment_counts), = session.metadata
+    assert run_id == published_run_id and run_id.startswith("stream-")
+    assert (table, mode, row_count) == (METRICS_TABLE, "streaming", 10)
+    assert ab_group_counts == {"A": 5, "B": 5}
+    assert segment_counts == {1: 3, 2: 7}
@@ -0,0 +1,100 @@
+"""
+Reglas de hábito de habit_engine sobre casos armados a mano
+"""
+from datetime import date, timedelta
+
+import pytest
+
+from habit_engine import (
+    COUNT,
+    DISTINCT_DAYS,
+    MAX_DISTINCT_DAYS_WINDOW,
+    HabitRule,
+    compute_user_metrics,
+    habit_window_ranges,
+)
+
+LOGIN = date(2024, 1, 1)
+
+
+def days(*offsets):
+    return [LOGIN + timedelta(days=offset) for offset in offsets]
+
+
+USERS = ["ind_habit", "ind_late", "ind_few", "sell_habit", "sell_wrong_type", "before_login", "no_segment"]
+TRANSACTIONS = (
+    # Individuals: 5 días distintos en la ventana (uno repetido)
+    [("ind_habit", d, 1, 1) for d in days(0, 3, 3, 10, 20, 30)]
+    # El quinto día cae fuera de la ventana de 30 días
+    + [("ind_late", d, 1, 1) for d in days(0, 1, 2, 3, 31)]
+    + [("ind_few", d, 1, 1) for d in days(1, 1, 1, 1, 1, 2)]
+    # Sellers: 5 cobros (type 8/9) en la ventana
+    + [("sell_habit", d, t, 2) for d, t in zip(days(0, 0, 5, 9, 29), (8, 9, 8, 9, 8))]
+    + [("sell_wrong_type", d, 7, 2) for d in days(0, 1, 2, 3, 4, 5)]
+    + [("before_login", d, 8, 2) for d in days(-5, -4, -3, -2, -1)]
+    + [("no_segment", d, 1, None) for d in days(0, 1)]
+    # Transacción de un usuario que no está en onboarding
+    + [("ghost", LOGIN, 1, 1)]
+)
+# user_id -> (segmento, hábito); sin segmento ni usuarios fuera de onboarding
+EXPECTED = {
+    "ind_habit": (1, 1), "ind_late": (1, 0), "ind_few": (1, 0), "sell_habit": (2, 1),
+    "sell_wrong_type": (2, 0), "before_login": (2, 0),
+}
+
+
+def spark_metrics(spark, users, transactions, **kwargs):
+    df_users = spark.createDataFrame([(u, LOGIN) for u in users], "user_id string, first_login_dt date")
+    df_tx = spark.createDataFrame(transactions, "user_id string, transaction_dt date, type int, segment int")
+    metrics = compute_user_metrics(df_users, df_tx, **kwargs)
+    return {r["user_id"]: (r["segment"], r["habito_calc"]) for r in metrics.collect()}
+
+
+def test_habit_rules(spark):
+    assert spark_metrics(spark, USERS, TRANSACTIONS) == EXPECTED
+
+
+def test_segment_is_the_majority_and_ties_go_to_the_lowest(spark):
+    transactions = (
+        # Mayoría de segmento 2 aunque la primera transacción sea del 1
+        [("majority", d, 8, s) for d, s in zip(days(0, 1, 2, 3, 4), (1, 2, 2, 2, 1))]
+        # Empate: gana el menor
+        + [("tie", d, 8, s) for d, s in zip(days(0, 1, 2, 3), (2, 1, 2, 1))]
+    )
+    # majority es seller con 5 cobros; tie se evalúa como individual
+    assert spark_metrics(spark, ["majority", "tie"], transactions) == {
+        "majority": (2, 1), "tie": (1, 0),
+    }
+
+
+def test_window_ranges_merge_overlapping_logins(spark):
+    logins = [(LOGIN,), (LOGIN + timedelta(days=10),), (LOGIN + timedelta(days=100),), (None,)]
+    df_users = spark.createDataFrame(logins, "first_login_dt date")
+    assert habit_window_ranges(df_users) == [
+        (LOGIN, LOGIN + timedelta(days=40)),
+        (LOGIN + timedelta(days=100), LOGIN + timedelta(days=130)),
+    ]
+
+
+def test_pruning_to_the_windows_keeps_the_results(spark):
+    df_users = spark.createDataFrame([(u, LOGIN) for u in USERS], "user_id string, first_login_dt date")
+    ranges = habit_window_ranges(df_users)
+    # before_login solo tiene transacciones fuera de la ventana y conserva
+    # su segmento: se resuelve sobre todo el historial
+    assert spark_metrics(spark, USERS, TRANSACTIONS, date_ranges=ranges) == EXPECTED
+
+
+def test_duplicated_onboarding_rows_count_once(spark):
+    # 3 cobros: con la fila de onboarding repetida no deben contar como 6
+    transactions = [("seller", d, 8, 2) for d in days(0, 1, 2)]
+    assert spark_metrics(spark, ["seller", "seller"], transactions) == {"seller": (2, 0)}
+
+
+def test_distinct_days_window_fits_the_streaming_bitmask():
+    HabitRule("ok", segment=1, threshold=5, window_days=MAX_DISTINCT_DAYS_WINDOW)
+    HabitRule("count", segment=1, threshold=5, measure=COUNT, window_days=365)
+    with pytest.raises(ValueError):
+        HabitRule("too_long", segment=1, threshold=5, measure=DISTINCT_DAYS,
+                  window_days=MAX_DISTINCT_DAYS_WINDOW + 1)
+    with pytest.raises(ValueError):
+        HabitRule("negative", segment=1, threshold=5, window_days=-1)
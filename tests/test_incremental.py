@@ -0,0 +1,68 @@
+from datetime import date, datetime
+
+import pytest
+
+import incremental
+
+# Cohorte 1: logins viejos (ventana cerrada); 2: ventana abierta; 3: otra vieja
+ONBOARDING = [
+    ("u1", datetime(2022, 1, 3), 1),
+    ("u2", datetime(2022, 1, 4), 1),
+    ("u3", datetime(2022, 3, 20), 2),
+    ("u4", datetime(2022, 1, 10), 3),
+]
+TRANSACTIONS = [
+    ("u1", date(2022, 1, 5)),
+    ("u4", date(2022, 2, 1)),
+    ("u4", date(2022, 4, 1)),
+]
+
+
+@pytest.fixture
+def frames(spark):
+    df_onboarding = spark.createDataFrame(
+        ONBOARDING, "user_id string, first_login_dt timestamp, week_year int"
+    )
+    df_transactions = spark.createDataFrame(
+        TRANSACTIONS, "user_id string, transaction_date date"
+    )
+    return df_onboarding, df_transactions
+
+
+def test_watermark_is_the_last_transaction_date(frames):
+    _, df_transactions = frames
+    assert incremental.transaction_watermark(df_transactions) == "2022-04-01"
+    assert incremental.transaction_watermark(df_transactions.limit(0)) is None
+
+
+def test_without_checkpoint_every_cohort_is_affected(frames):
+    affected, all_cohorts = incremental.affected_cohorts(*frames, None, "2022-04-01")
+    assert affected == all_cohorts == {1, 2, 3}
+
+
+def test_only_open_windows_new_cohorts_and_new_transactions(frames):
+    checkpoint = {"last_transaction_dt": "2022-03-01", "processed_cohorts": [1, 3]}
+    affected, all_cohorts = incremental.affected_cohorts(*frames, checkpoint, "2022-04-01")
+    # 2 es nueva y tiene la ventana abierta; 3 recibió una transacción
+    # posterior al watermark anterior; 1 queda intacta
+    assert all_cohorts == {1, 2, 3}
+    assert affected == {2, 3}
+
+
+def test_nothing_changes_when_the_watermark_does_not_move(frames):
+    checkpoint = {"last_transaction_dt": "2022-04-01", "processed_cohorts": [1, 2, 3]}
+    affected, _ = incremental.affected_cohorts(*frames, checkpoint, "2022-06-01")
+    assert affected == set()
+
+
+def test_checkpoint_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(incremental, "CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(incremental, "CHECKPOINT_PATH", str(tmp_path / "etl_watermark.json"))
+
+    assert incremental.load_checkpoint() is None
+    incremental.save_checkpoint("2022-04-01", {3, 1, 2})
+    checkpoint = incremental.load_checkpoint()
+
+    assert checkpoint["last_transaction_dt"] == "2022-04-01"
+    assert checkpoint["processed_cohorts"] == [1, 2, 3]
+    assert not (tmp_path / "etl_watermark.json.tmp").exists()
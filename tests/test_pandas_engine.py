@@ -0,0 +1,57 @@
+"""
+Motor pandas: mismas reglas y resultados que el motor de Spark
+"""
+import pandas as pd
+
+import pandas_engine
+from test_habit_engine import EXPECTED, LOGIN, TRANSACTIONS, USERS, days, spark_metrics
+
+# Casos de resolución de segmento (ver test_habit_engine)
+SEGMENT_TRANSACTIONS = (
+    [("majority", d, 8, s) for d, s in zip(days(0, 1, 2, 3, 4), (1, 2, 2, 2, 1))]
+    + [("tie", d, 8, s) for d, s in zip(days(0, 1, 2, 3), (2, 1, 2, 1))]
+)
+
+
+def pandas_metrics(users, transactions):
+    df_users = pd.DataFrame({"user_id": users, "first_login_dt": pd.Timestamp(LOGIN)})
+    df_tx = pd.DataFrame(transactions, columns=["user_id", "transaction_dt", "type", "segment"])
+    df_tx["transaction_dt"] = pd.to_datetime(df_tx["transaction_dt"])
+    df_tx["segment"] = df_tx["segment"].astype("Int64")
+    metrics = pandas_engine.compute_user_metrics(df_users, df_tx)
+    return {r.user_id: (int(r.segment), int(r.habito_calc)) for r in metrics.itertuples()}
+
+
+def test_pandas_engine_rules():
+    assert pandas_metrics(USERS, TRANSACTIONS) == EXPECTED
+
+
+def test_pandas_matches_spark(spark):
+    cases = [
+        (USERS, TRANSACTIONS),
+        (["majority", "tie"], SEGMENT_TRANSACTIONS),
+        # Usuario repetido en onboarding
+        (["seller", "seller"], [("seller", d, 8, 2) for d in days(0, 1, 2)]),
+    ]
+    for users, transactions in cases:
+        assert pandas_metrics(users, transactions) == spark_metrics(spark, users, transactions)
+
+
+def test_final_metrics_one_row_per_user():
+    df_onboarding = pd.DataFrame({
+        "user_id": ["a", "a", "b", "c"],
+        "ab_group": "treatment",
+        "activacion": [1, 1, 0, 1],
+        "setup": [1, 1, 0, None],
+        "return": [0, 0, 1, 1],
+        "week_year": 1,
+    })
+    user_metrics = pd.DataFrame({"user_id": ["a", "c"], "segment": [1, 2], "habito_calc": [1, 0]})
+
+    df, users, without_segment = pandas_engine.final_metrics(df_onboarding, user_metrics)
+
+    # "a" está repetido en onboarding; "b" no tiene transacciones
+    assert (users, without_segment) == (3, 1)
+    assert list(df["user_id"]) == ["a", "c"]
+    assert list(df["drop"]) == [1, 0]
+    assert list(df.columns) == pandas_engine.METRIC_COLUMNS + ["week_year"]
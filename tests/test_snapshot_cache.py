@@ -0,0 +1,92 @@
+import threading
+import time
+
+from snapshot_cache import SnapshotCache
+
+
+class Source:
+    """
+    Loader y versión controlables: ``version`` puede ser una excepción
+    """
+
+    def __init__(self, version="run-1", load_delay=0.0):
+        self.version = version
+        self.load_delay = load_delay
+        self.loads = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        time.sleep(self.load_delay)
+        with self._lock:
+            self.loads += 1
+            return {"load": self.loads}
+
+    def read_version(self):
+        if isinstance(self.version, Exception):
+            raise self.version
+        return self.version
+
+
+def wait_refresh(cache):
+    deadline = time.time() + 5
+    while cache.refreshing and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_serves_snapshot_and_reloads_only_on_new_version():
+    source = Source()
+    cache = SnapshotCache(source.load, source.read_version, check_interval=0)
+
+    assert cache.get() == {"load": 1}
+    cache.get()
+    wait_refresh(cache)
+    assert source.loads == 1 and cache.version == "run-1"
+
+    source.version = "run-2"
+    cache.get()
+    wait_refresh(cache)
+    assert cache.get() == {"load": 2}
+    assert cache.version == "run-2" and cache.refreshes == 1
+
+
+def test_failed_version_check_keeps_the_current_snapshot():
+    source = Source()
+    cache = SnapshotCache(source.load, source.read_version, check_interval=0)
+    cache.get()
+
+    source.version = ConnectionError("timeout")
+    for _ in range(3):
+        assert cache.get() == {"load": 1}
+        wait_refresh(cache)
+
+    assert source.loads == 1
+    assert cache.version == "run-1"
+    assert cache.last_error == "timeout"
+
+
+def test_failed_version_check_on_first_load_reloads_once_it_recovers():
+    source = Source(version=ConnectionError("timeout"))
+    cache = SnapshotCache(source.load, source.read_version, check_interval=0)
+    assert cache.get() == {"load": 1}
+    assert cache.version is None and cache.last_error == "timeout"
+
+    source.version = "run-1"
+    cache.get()
+    wait_refresh(cache)
+    cache.get()
+    wait_refresh(cache)
+    assert source.loads == 2 and cache.version == "run-1"
+
+
+def test_concurrent_first_load_runs_the_loader_once():
+    source = Source(load_delay=0.2)
+    cache = SnapshotCache(source.load, source.read_version, check_interval=3600)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert source.loads == 1
+    assert results == [{"load": 1}] * 8
@@ -0,0 +1,109 @@
+import time
+
+from stage_profiler import JOB_GROUP_PREFIX, StageProfiler
+
+
+class StubContext:
+    """SparkContext mínimo: registra los job groups"""
+
+    uiWebUrl = "http://driver:4040"
+    applicationId = "app-1"
+
+    def __init__(self):
+        self.job_groups = []
+
+    def setJobGroup(self, group, description):
+        self.job_groups.append(group)
+
+    def setLocalProperty(self, key, value):
+        pass
+
+
+class StubSpark:
+    def __init__(self):
+        self.sparkContext = StubContext()
+
+
+class CannedProfiler(StageProfiler):
+    """Responde la API REST con jobs y stages fijos"""
+
+    def __init__(self, responses):
+        super().__init__(StubSpark())
+        self.responses = responses
+
+    def _fetch(self, resource):
+        return self.responses[resource]
+
+
+def stage(stage_id, status="COMPLETE", **metrics):
+    return {"stageId": stage_id, "status": status, **metrics}
+
+
+def test_wall_time_only_without_spark():
+    profiler = StageProfiler(None)
+    profiler.start("load")["rows"] = 10
+    time.sleep(0.01)
+    profiler.start("habit")
+    profiler.start("load")
+    profiler.stop()
+
+    stages = profiler.collect()
+    assert list(stages) == ["load", "habit"]
+    assert stages["load"]["wall_s"] >= 0.01
+    assert "task_s" not in stages["load"]
+    assert list(profiler.summary_lines())[0].endswith(", 10 filas")
+
+
+def test_stage_metrics_are_summed_per_job_group():
+    profiler = CannedProfiler({
+        "jobs": [
+            {"jobId": 0, "jobGroup": JOB_GROUP_PREFIX + "load", "stageIds": [0]},
+            {"jobId": 1, "jobGroup": JOB_GROUP_PREFIX + "habit", "stageIds": [1, 2, 0]},
+            {"jobId": 2, "jobGroup": "otro", "stageIds": [3]},
+        ],
+        "stages": [
+            stage(0, executorRunTime=1500, executorCpuTime=10 ** 9, inputRecords=100),
+            stage(1, executorRunTime=500, shuffleWriteBytes=2048),
+            stage(2, status="SKIPPED", executorRunTime=9999),
+            stage(3, executorRunTime=9999),
+        ],
+    })
+    profiler.start("load")
+    profiler.start("habit")
+    profiler.stop()
+
+    stages = profiler.collect()
+    assert profiler.sc.job_groups == [JOB_GROUP_PREFIX + "load", JOB_GROUP_PREFIX + "habit"]
+    # El stage 0 es del primer job que lo ejecutó
+    assert (stages["load"]["jobs"], stages["load"]["spark_stages"]) == (1, 1)
+    assert stages["load"]["task_s"] == 1.5 and stages["load"]["cpu_s"] == 1.0
+    assert stages["load"]["input_rows"] == 100
+    # El stage salteado y el job fuera del profiler no cuentan
+    assert (stages["habit"]["jobs"], stages["habit"]["spark_stages"]) == (1, 1)
+    assert stages["habit"]["task_s"] == 0.5 and stages["habit"]["shuffle_write_bytes"] == 2048
+
+
+def test_unavailable_metrics_keep_the_wall_time():
+    profiler = StageProfiler(StubSpark())
+    profiler.sc.uiWebUrl = None
+    profiler.start("load")
+    profiler.stop()
+    assert "spark.ui.enabled" in profiler.collect()["load"]["spark_metrics"]
+
+
+def test_materialized_stages_with_spark(spark):
+    profiler = StageProfiler(spark, materialize=True)
+    profiler.start("load")
+    df = profiler.checkpoint(spark.range(1000))
+    profiler.start("agg")
+    profiler.checkpoint(df.groupBy((df.id % 10).alias("k")).count())
+    profiler.stop()
+    # Las métricas llegan al status store por el listener (asíncrono)
+    spark.sparkContext._jsc.sc().listenerBus().waitUntilEmpty()
+
+    stages = profiler.collect()
+    profiler.release()
+    assert (stages["load"]["rows"], stages["agg"]["rows"]) == (1000, 10)
+    assert stages["load"]["jobs"] >= 1 and stages["agg"]["jobs"] >= 1
+    assert stages["agg"]["shuffle_write_bytes"] > 0
+    assert not df.is_cached
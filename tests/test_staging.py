@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import staging
+from conftest import ROOT
+
+SAMPLE_ROWS = 200
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    Directorio de datos con las primeras filas de lk_onboarding.csv y el
+    staging dentro de él
+    """
+    with open(os.path.join(ROOT, "lk_onboarding.csv")) as source:
+        lines = [next(source) for _ in range(SAMPLE_ROWS + 1)]
+    (tmp_path / "lk_onboarding.csv").write_text("".join(lines))
+    staging_dir = tmp_path / "staging"
+    monkeypatch.setattr(staging, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(staging, "STAGING_DIR", str(staging_dir))
+    monkeypatch.setattr(staging, "MANIFEST_PATH", str(staging_dir / "_manifest.json"))
+    return tmp_path
+
+
+def manifest():
+    with open(staging.MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def test_stages_once_and_reuses_the_parquet(spark, data_dir):
+    assert staging.stage_dataset(spark, "onboarding")
+    assert not staging.stage_dataset(spark, "onboarding")
+    entry = manifest()["onboarding"]
+    assert entry["buckets"] == staging.BUCKETS and entry["partition_by"] is None
+    assert staging.load_dataset(spark, "onboarding", ["user_id"]).count() == SAMPLE_ROWS
+
+
+def test_touch_keeps_the_parquet_and_updates_the_mtime(spark, data_dir):
+    staging.stage_dataset(spark, "onboarding")
+    source = data_dir / "lk_onboarding.csv"
+    mtime = os.stat(source).st_mtime + 60
+    os.utime(source, (mtime, mtime))
+
+    assert not staging.stage_dataset(spark, "onboarding")
+    assert manifest()["onboarding"]["mtime"] == mtime
+
+
+def test_content_change_with_the_same_size_restages(spark, data_dir):
+    staging.stage_dataset(spark, "onboarding")
+    source = data_dir / "lk_onboarding.csv"
+    lines = source.read_text().splitlines(keepends=True)
+    # Se intercambian dos filas: mismo tamaño, otro contenido
+    lines[1], lines[2] = lines[2], lines[1]
+    source.write_text("".join(lines))
+
+    assert staging.stage_dataset(spark, "onboarding")
+
+
+def test_new_rows_restage(spark, data_dir):
+    staging.stage_dataset(spark, "onboarding")
+    source = data_dir / "lk_onboarding.csv"
+    with open(source, "a") as f:
+        f.write(source.read_text().splitlines(keepends=True)[-1])
+
+    assert staging.stage_dataset(spark, "onboarding")
+    assert staging.load_dataset(spark, "onboarding", ["user_id"]).count() == SAMPLE_ROWS + 1
+
+
+def test_layout_change_or_missing_parquet_restages(spark, data_dir, monkeypatch):
+    staging.stage_dataset(spark, "onboarding")
+    monkeypatch.setattr(staging, "BUCKETS", staging.BUCKETS * 2)
+    assert staging.stage_dataset(spark, "onboarding")
+
+    shutil.rmtree(staging.staged_path("onboarding"))
+    assert staging.stage_dataset(spark, "onboarding")